@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark de subida de fotos de DNI sobre un Google Drive en memoria
+Cuenta las peticiones HTTP por foto con la subida anterior (reanudable más un
+permiso por archivo) y con la actual (multipart, acceso heredado de la carpeta),
+y mide el tiempo con la latencia simulada y el tamaño archivado por foto
+"""
+
+import sys
+import time
+import argparse
+import logging
+import io
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from config import Config
+from utils.drive_manager import DriveManager
+from utils.fake_drive import FakeDrive
+from utils.properties import Property
+
+MODES = {
+    # nombre: (DRIVE_MULTIPART_MAX_BYTES, DRIVE_SHARE_MODE)
+    'anterior (reanudable + permiso por foto)': (0, 'archivo'),
+    'multipart + permiso por foto': (5 * 1024 * 1024, 'archivo'),
+    'multipart + acceso de la carpeta': (5 * 1024 * 1024, 'carpeta'),
+}
+
+def synthetic_photo(index, width, height):
+    """Foto JPEG de cámara simulada (degradado con ruido), distinta en cada llamada"""
+    rng = np.random.default_rng(index)
+    base = np.linspace(0, 255, width)[None, :, None] * np.ones((height, 1, 3))
+    pixels = np.clip(base + rng.normal(0, 25, (height, width, 3)), 0, 255).astype('uint8')
+    output = io.BytesIO()
+    Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(1)).save(output, format='JPEG', quality=95)
+    return output.getvalue()
+
+def run_mode(multipart_max_bytes, share_mode, photos, latency):
+    """Subir las fotos con una configuración; devuelve segundos, métricas y ahorro"""
+    Config.DRIVE_MULTIPART_MAX_BYTES = multipart_max_bytes
+    Config.DRIVE_SHARE_MODE = share_mode
+
+    drive = FakeDrive(latency=latency)
+    folder_id = drive.add_folder('Fotos DNI')
+    hotel = Property(
+        key='benchmark', name='Benchmark', spreadsheet_id=None,
+        drive_folder_id=folder_id, rooms=Config.HABITACIONES, photo_index_path=':memory:'
+    )
+    manager = DriveManager(hotel, http=drive.http())
+
+    start = time.perf_counter()
+    for i, photo in enumerate(photos):
+        manager.upload_dni_photo(photo, f"{10000000 + i}", f"CLIENTE {i}")
+    elapsed = time.perf_counter() - start
+
+    return elapsed, manager.get_api_metrics(), manager.get_storage_savings()
+
+def main():
+    """Función principal del benchmark"""
+    parser = argparse.ArgumentParser(description="Peticiones por foto subida a Google Drive")
+    parser.add_argument('--fotos', type=int, default=50, help="Fotos a subir por modo")
+    parser.add_argument('--resolucion', default='1600x1200', help="Resolución de cada foto (ANCHOxALTO)")
+    parser.add_argument('--latencia', type=float, default=0.1, help="Segundos de latencia por petición")
+    parser.add_argument('--lote', type=int, default=250, help="Fotos a compartir con share_files")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    print("⏱️  BENCHMARK DE SUBIDA A GOOGLE DRIVE - BACKEND EN MEMORIA")
+    print("="*70)
+    width, height = (int(value) for value in args.resolucion.lower().split('x'))
+    photos = [synthetic_photo(i, width, height) for i in range(args.fotos)]
+    average_kb = sum(len(photo) for photo in photos) / len(photos) / 1024
+    print(f"Fotos: {args.fotos} de {args.resolucion} ({average_kb:.0f} KB)  "
+          f"Latencia: {args.latencia * 1000:.0f} ms  Archivo: {Config.DRIVE_ARCHIVE_FORMAT}")
+
+    header = f"\n{'Modo':<44}{'Pet./foto':>10}{'ms/foto':>10}{'KB/foto':>10}"
+    print(f"{header}\n{'-' * (len(header) - 1)}")
+    for name, (multipart_max_bytes, share_mode) in MODES.items():
+        elapsed, metrics, savings = run_mode(multipart_max_bytes, share_mode, photos, args.latencia)
+        print(f"{name:<44}{metrics['requests_per_upload']:>10.2f}{elapsed * 1000 / args.fotos:>10.1f}"
+              f"{savings['archivado'] / max(savings['fotos'], 1) / 1024:>10.0f}")
+
+    # Compartir fotos ya subidas: un permiso por petición contra lotes de 100
+    drive = FakeDrive()
+    folder_id = drive.add_folder('Fotos DNI')
+    file_ids = [drive.add_file(f"DNI_{i}.jpg", folder_id, b'x') for i in range(args.lote)]
+    hotel = Property('benchmark', 'Benchmark', None, folder_id, [], photo_index_path=':memory:')
+    manager = DriveManager(hotel, http=drive.http())
+
+    before = drive.total_requests()
+    shared = manager.share_files(file_ids)
+    print(f"\n🔓 share_files: {shared} fotos compartidas con {drive.total_requests() - before} peticiones "
+          f"(antes: {args.lote})")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark de SheetsManager sobre un backend de gspread en memoria
+Pobla hojas de 1k/10k/100k filas (por defecto) y mide cada operación de
+SheetsManager, con latencia y errores 429 simulados opcionales
+"""
+
+import sys
+import time
+import argparse
+import logging
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from config import Config
+from utils.fake_gspread import FakeClient
+from utils.properties import Property
+from utils.records import Registro
+from utils.sheets_manager import SheetsManager
+from utils.sheets_scheduler import SheetsScheduler
+
+SPREADSHEET_ID = 'benchmark'
+
+def generate_rows(total_rows, days=365):
+    """Generar filas sintéticas repartidas en los últimos días (la mayor parte en meses cerrados)"""
+    today = date.today()
+    rooms = [room for room in Config.HABITACIONES if room.isdigit()] or ['1']
+    for i in range(total_rows):
+        day = today - timedelta(days=(i * days) // total_rows)
+        hour = random.randint(0, 21)
+        yield [
+            day.isoformat(),
+            f"{hour:02d}:{random.choice(['00', '15', '30', '45'])}",
+            f"{hour + 2:02d}:00",
+            random.choice(rooms),
+            f"{random.randint(10000000, 10000000 + total_rows // 3)}",
+            f"CLIENTE DE PRUEBA {i}",
+            "PERUANA",
+            random.choice(Config.DURACION_OPCIONES),
+            random.choice(Config.PRECIO_OPCIONES),
+            random.choice(Config.PAGO_OPCIONES),
+            "",
+            "benchmark",
+            ""
+        ]
+
+def seed_client(total_rows, latency, error_rate):
+    """Crear el cliente en memoria con una partición por mes"""
+    client = FakeClient(seed=total_rows)
+    spreadsheet = client.add_spreadsheet(SPREADSHEET_ID)
+
+    partitions = {}
+    for row in generate_rows(total_rows):
+        name = f"{Config.GOOGLE_SHEETS_WORKSHEET_NAME}-{row[0][:7]}"
+        partitions.setdefault(name, []).append(row)
+
+    for name, rows in sorted(partitions.items()):
+        worksheet = spreadsheet.create_worksheet(name, rows=len(rows) + 1, cols=len(SheetsManager.HEADERS))
+        worksheet.load_rows([SheetsManager.HEADERS])
+        worksheet.load_rows(rows)
+
+    # Latencia y errores solo para las llamadas de SheetsManager
+    client.latency = latency
+    client.error_rate = error_rate
+    return client
+
+def measure(results, name, func, client):
+    """Medir tiempo y llamadas a la API de una operación"""
+    calls = client.total_calls()
+    start = time.perf_counter()
+    detail = func()
+    elapsed = time.perf_counter() - start
+    results[name] = {
+        'seconds': elapsed,
+        'api_calls': client.total_calls() - calls,
+        'detail': detail
+    }
+
+def run_size(total_rows, latency, error_rate, saves):
+    """Medir todas las operaciones de SheetsManager con una hoja de total_rows filas"""
+    client = seed_client(total_rows, latency, error_rate)
+    workdir = tempfile.mkdtemp(prefix='hotelbot-bench-')
+    hotel = Property(
+        key='benchmark', name='Benchmark',
+        spreadsheet_id=SPREADSHEET_ID, drive_folder_id=None,
+        rooms=Config.HABITACIONES,
+        db_path=str(Path(workdir) / 'hotel.db')
+    )
+    scheduler = SheetsScheduler(requests_per_minute=10 ** 6, write_batch_seconds=0)
+    manager = SheetsManager(hotel, scheduler=scheduler, client=client, replicate=False)
+
+    today = date.today()
+    now = datetime.now().strftime('%H:%M')
+    results = {}
+
+    measure(results, 'sync_with_sheets (inicial)', lambda: manager.sync_with_sheets(), client)
+    sample = next(manager.iter_records(), None)
+    dni = sample.dni if sample else '00000000'
+
+    measure(results, 'get_room_availability', lambda: len(manager.get_room_availability()['occupied']), client)
+    measure(results, 'get_daily_summary', lambda: manager.get_daily_summary()['total_clients'], client)
+    measure(results, 'get_client_history', lambda: len(manager.get_client_history(dni)), client)
+    measure(
+        results, 'get_records_by_date_range (30 días)',
+        lambda: len(manager.get_records_by_date_range(today - timedelta(days=29), today)), client
+    )
+    measure(results, 'iter_records (todo)', lambda: sum(1 for _ in manager.iter_records()), client)
+
+    def save_many():
+        for i in range(saves):
+            manager.save_client_data({
+                'fecha': today.isoformat(),
+                'hora_ingreso': now,
+                'hora_salida_estimada': now,
+                'habitacion': Config.HABITACIONES[i % len(Config.HABITACIONES)],
+                'dni': f"{90000000 + i}",
+                'nombre': f"CLIENTE NUEVO {i}",
+                'precio': Config.PRECIO_OPCIONES[0],
+                'forma_pago': Config.PAGO_OPCIONES[0],
+                'registrado_por': 'benchmark'
+            })
+        return saves
+
+    measure(results, f'save_client_data (x{saves})', save_many, client)
+    measure(results, 'sync_with_sheets (réplica)', lambda: manager.sync_with_sheets(), client)
+    measure(
+        results, 'update_room_checkout',
+        lambda: bool(manager.update_room_checkout(Config.HABITACIONES[0])), client
+    )
+    measure(
+        results, 'update_client_checkout',
+        lambda: bool(manager.update_client_checkout(f"{90000001}")), client
+    )
+    measure(results, 'sync_with_sheets (salidas)', lambda: manager.sync_with_sheets(), client)
+
+    # Edición manual en el mes en curso: se detecta por versión y se refleja localmente
+    worksheet = manager.worksheet
+    worksheet.load_rows([Registro.from_client_data({
+        'fecha': today.isoformat(), 'hora_ingreso': now, 'habitacion': '1',
+        'dni': '77777777', 'nombre': 'EDITADO A MANO', 'precio': 'S/30'
+    }).to_row()])
+    manager._revision_checked_at = 0.0
+    measure(results, 'sync_with_sheets (edición manual)', lambda: manager.sync_with_sheets(), client)
+
+    manager.store.close()
+    return results, client
+
+def main():
+    """Función principal del benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark de SheetsManager con un backend en memoria")
+    parser.add_argument('--rows', default='1000,10000,100000', help="Tamaños de hoja separados por comas")
+    parser.add_argument('--latencia', type=float, default=0.0, help="Segundos de latencia por llamada a la API")
+    parser.add_argument('--errores', type=float, default=0.0, help="Probabilidad de error 429 por llamada")
+    parser.add_argument('--registros', type=int, default=100, help="Registros nuevos a guardar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(0)
+    sizes = [int(size) for size in args.rows.split(',') if size.strip()]
+
+    print("⏱️  BENCHMARK DE SHEETSMANAGER - BACKEND EN MEMORIA")
+    print("="*70)
+    print(f"Latencia: {args.latencia * 1000:.0f} ms  Errores 429: {args.errores * 100:.1f}%")
+
+    all_results = {}
+    for size in sizes:
+        print(f"\n📊 {size} filas...")
+        results, client = run_size(size, args.latencia, args.errores, args.registros)
+        all_results[size] = results
+        print(f"   Llamadas a la API: {client.total_calls()}  Errores 429 simulados: {client.quota_errors}")
+
+    operations = list(next(iter(all_results.values())))
+    header = f"{'Operación':<38}" + ''.join(f"{size:>12}" for size in sizes)
+    print(f"\n{header}\n{'-' * len(header)}")
+    for operation in operations:
+        line = f"{operation:<38}"
+        for size in sizes:
+            result = all_results[size][operation]
+            line += f"{result['seconds'] * 1000:>9.1f} ms"
+        print(line)
+
+    print(f"\n{'Llamadas a la API':<38}" + ''.join(f"{size:>12}" for size in sizes))
+    for operation in operations:
+        print(f"{operation:<38}" + ''.join(
+            f"{all_results[size][operation]['api_calls']:>12}" for size in sizes
+        ))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
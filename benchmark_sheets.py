@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark de lectura de Google Sheets para HotelBot
+Compara get_all_records() contra la lectura en streaming por exportación CSV
+sobre una hoja de prueba con muchas filas (100k por defecto)
+"""
+
+import sys
+import time
+import argparse
+import tracemalloc
+import random
+import tempfile
+from pathlib import Path
+from datetime import date, timedelta
+
+from config import Config
+from utils.properties import Property
+from utils.sheets_manager import SheetsManager
+
+SEED_CHUNK_ROWS = 10000
+
+def generate_rows(total_rows):
+    """Generar filas sintéticas con el formato de la hoja de registros"""
+    start = date.today() - timedelta(days=365)
+    for i in range(total_rows):
+        day = start + timedelta(days=i % 365)
+        yield [
+            day.isoformat(),
+            f"{random.randint(0, 23):02d}:{random.choice(['00', '15', '30', '45'])}",
+            f"{random.randint(0, 23):02d}:00",
+            random.choice(Config.HABITACIONES),
+            f"{random.randint(10000000, 99999999)}",
+            f"CLIENTE DE PRUEBA {i}",
+            "PERUANA",
+            random.choice(Config.DURACION_OPCIONES),
+            random.choice(Config.PRECIO_OPCIONES),
+            random.choice(Config.PAGO_OPCIONES),
+            "",
+            "benchmark"
+        ]
+
+def get_benchmark_worksheet(manager, total_rows, seed):
+    """Obtener (y opcionalmente poblar) la hoja de benchmark"""
+    title = f"Benchmark-{total_rows}"
+
+    try:
+        worksheet = manager.spreadsheet.worksheet(title)
+    except Exception:
+        worksheet = None
+
+    if worksheet and not seed:
+        return worksheet
+
+    if worksheet:
+        manager.spreadsheet.del_worksheet(worksheet)
+
+    print(f"📝 Creando hoja {title} con {total_rows} filas...")
+    worksheet = manager.spreadsheet.add_worksheet(
+        title=title,
+        rows=total_rows + 1,
+        cols=len(SheetsManager.HEADERS)
+    )
+    manager._create_headers(worksheet)
+
+    chunk = []
+    for row in generate_rows(total_rows):
+        chunk.append(row)
+        if len(chunk) == SEED_CHUNK_ROWS:
+            worksheet.append_rows(chunk, value_input_option='RAW')
+            chunk = []
+    if chunk:
+        worksheet.append_rows(chunk, value_input_option='RAW')
+
+    return worksheet
+
+def measure(name, func):
+    """Medir tiempo y pico de memoria de una función"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"   {name:<28} {count:>8} filas  {elapsed:>8.2f} s  {peak / 1024 / 1024:>8.1f} MB pico")
+    return {'rows': count, 'seconds': elapsed, 'peak_mb': peak / 1024 / 1024}
+
+def main():
+    """Función principal del benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark de lectura de Google Sheets")
+    parser.add_argument('--rows', type=int, default=100000, help="Filas de la hoja de prueba")
+    parser.add_argument('--seed', action='store_true', help="Volver a crear y poblar la hoja de prueba")
+    args = parser.parse_args()
+
+    print("⏱️  BENCHMARK DE LECTURA - GOOGLE SHEETS")
+    print("="*70)
+
+    # Base local aislada y sin hilo de replicación: el benchmark solo lee la hoja
+    workdir = tempfile.mkdtemp(prefix='hotelbot-bench-')
+    hotel = Property(
+        key='benchmark', name='Benchmark',
+        spreadsheet_id=Config.GOOGLE_SHEETS_SPREADSHEET_ID, drive_folder_id=None,
+        rooms=Config.HABITACIONES,
+        db_path=str(Path(workdir) / 'hotel.db')
+    )
+    manager = SheetsManager(hotel, replicate=False)
+    manager._connect()  # Abrir la hoja de cálculo
+    worksheet = get_benchmark_worksheet(manager, args.rows, args.seed)
+
+    print(f"\n📊 Hoja: {worksheet.title}")
+    results = {
+        'get_all_records': measure(
+            "get_all_records()",
+            lambda: len(worksheet.get_all_records())
+        ),
+        'csv_stream': measure(
+            "streaming CSV (generador)",
+            lambda: sum(1 for _ in manager._stream_worksheet_records(worksheet))
+        )
+    }
+
+    baseline = results['get_all_records']
+    streaming = results['csv_stream']
+    if streaming['seconds'] and streaming['peak_mb']:
+        print(f"\n🚀 Tiempo: {baseline['seconds'] / streaming['seconds']:.1f}x  "
+              f"Memoria: {baseline['peak_mb'] / streaming['peak_mb']:.1f}x menos")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,9 +29,57 @@ class Config:
     # Google Sheets
     GOOGLE_SHEETS_SPREADSHEET_ID = os.getenv('GOOGLE_SHEETS_SPREADSHEET_ID')
     GOOGLE_SHEETS_WORKSHEET_NAME = os.getenv('GOOGLE_SHEETS_WORKSHEET_NAME', 'Registros')
+    # Filas iniciales de cada partición mensual (ej: Registros-2026-10)
+    GOOGLE_SHEETS_PARTITION_ROWS = int(os.getenv('GOOGLE_SHEETS_PARTITION_ROWS', '1000'))
+    # Cada cuántos segundos se consulta en Drive si la hoja fue editada
+    GOOGLE_SHEETS_REVISION_CHECK_SECONDS = float(os.getenv('GOOGLE_SHEETS_REVISION_CHECK_SECONDS', '5'))
+    # Límite de peticiones por minuto a la API (cuota por defecto de Google: 60)
+    GOOGLE_SHEETS_REQUESTS_PER_MINUTE = int(os.getenv('GOOGLE_SHEETS_REQUESTS_PER_MINUTE', '60'))
+    # Ventana para agrupar escrituras simultáneas en una sola petición
+    GOOGLE_SHEETS_WRITE_BATCH_SECONDS = float(os.getenv('GOOGLE_SHEETS_WRITE_BATCH_SECONDS', '0.2'))
+    
+    # Almacén local (SQLite) y replicación en segundo plano hacia Google Sheets
+    LOCAL_DB_PATH = os.getenv('LOCAL_DB_PATH', 'data/hotel.db')
+    SHEETS_REPLICATION_SECONDS = float(os.getenv('SHEETS_REPLICATION_SECONDS', '5'))
     
     # Google Drive
     GOOGLE_DRIVE_FOLDER_ID = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
+    # Fotos de DNI por subir: se guardan en disco y se suben en segundo plano
+    DRIVE_SPOOL_DIR = os.getenv('DRIVE_SPOOL_DIR', 'data/fotos_pendientes')
+    # Fotos que se suben a la vez (cada hilo usa su propia conexión con Drive)
+    DRIVE_UPLOAD_WORKERS = int(os.getenv('DRIVE_UPLOAD_WORKERS', '4'))
+    # Espera antes de reintentar una foto que no se pudo subir: se duplica en
+    # cada intento fallido, hasta el máximo
+    DRIVE_RETRY_BASE_SECONDS = float(os.getenv('DRIVE_RETRY_BASE_SECONDS', '5'))
+    DRIVE_RETRY_MAX_SECONDS = float(os.getenv('DRIVE_RETRY_MAX_SECONDS', '600'))
+    # Intentos antes de apartar una foto en failed/ y avisar al administrador
+    DRIVE_RETRY_MAX_ATTEMPTS = int(os.getenv('DRIVE_RETRY_MAX_ATTEMPTS', '30'))
+    # Hasta este tamaño la foto se sube en una sola petición (multipart); las más grandes, reanudable
+    DRIVE_MULTIPART_MAX_BYTES = int(os.getenv('DRIVE_MULTIPART_MAX_BYTES', str(5 * 1024 * 1024)))
+    # Acceso a las fotos: 'carpeta' (heredan el de la carpeta compartida con el personal)
+    # o 'archivo' (cada foto pública con su enlace, con permisos en lote)
+    DRIVE_SHARE_MODE = os.getenv('DRIVE_SHARE_MODE', 'carpeta').lower()
+    # Copia de archivo de cada foto: 'webp', 'jpeg' u 'original' (sin recodificar),
+    # con tamaño y lado máximos, más una miniatura JPEG para vistas previas en el chat
+    DRIVE_ARCHIVE_FORMAT = os.getenv('DRIVE_ARCHIVE_FORMAT', 'webp').lower()
+    DRIVE_ARCHIVE_MAX_KB = int(os.getenv('DRIVE_ARCHIVE_MAX_KB', '400'))
+    DRIVE_ARCHIVE_MAX_DIMENSION = int(os.getenv('DRIVE_ARCHIVE_MAX_DIMENSION', '2000'))
+    DRIVE_THUMBNAIL_SIZE = int(os.getenv('DRIVE_THUMBNAIL_SIZE', '320'))
+    # Días que se conservan las fotos desde su último uso (0: no se purgan) y
+    # eliminaciones por segundo como máximo durante la purga
+    DRIVE_RETENTION_DAYS = int(os.getenv('DRIVE_RETENTION_DAYS', '0'))
+    DRIVE_PURGE_PER_SECOND = float(os.getenv('DRIVE_PURGE_PER_SECOND', '10'))
+    # El uso de almacenamiento se lleva localmente (subidas y eliminaciones) y se
+    # concilia con la cuota real de Drive cada tantas horas
+    DRIVE_QUOTA_RECONCILE_HOURS = float(os.getenv('DRIVE_QUOTA_RECONCILE_HOURS', '24'))
+    
+    # Varias propiedades (hoteles), ej: centro,playa. Cada una se configura con
+    # HOTEL_<CLAVE>_NOMBRE, _SPREADSHEET_ID, _DRIVE_FOLDER_ID, _HABITACIONES y _USUARIOS.
+    # Vacío: una sola propiedad con GOOGLE_SHEETS_SPREADSHEET_ID y GOOGLE_DRIVE_FOLDER_ID
+    HOTELES = [
+        key.strip().lower() for key in os.getenv('HOTELES', '').split(',')
+        if key.strip()
+    ]
     
     # Configuración general
     TIMEZONE = os.getenv('TIMEZONE', 'America/Lima')
@@ -40,7 +88,10 @@ class Config:
     DURACION_OPCIONES = ['2 horas', '3 horas', 'noche']
     PRECIO_OPCIONES = ['S/25', 'S/30', 'S/40']
     PAGO_OPCIONES = ['Efectivo', 'Yape', 'Plin', 'Transferencia']
-    HABITACIONES = [str(i) for i in range(1, 11)]  # Del 1 al 10
+    HABITACIONES = [
+        room.strip() for room in os.getenv('HABITACIONES', ','.join(str(i) for i in range(1, 11))).split(',')
+        if room.strip()
+    ]  # Por defecto del 1 al 10
     
     @classmethod
     def validate_config(cls):
@@ -48,11 +99,13 @@ class Config:
         required_vars = [
             'TELEGRAM_BOT_TOKEN',
             'OPENAI_API_KEY',
-            'GOOGLE_APPLICATION_CREDENTIALS',
-            'GOOGLE_SHEETS_SPREADSHEET_ID',
-            'GOOGLE_DRIVE_FOLDER_ID'
+            'GOOGLE_APPLICATION_CREDENTIALS'
         ]
         
+        # Con varias propiedades, la hoja y la carpeta se definen por propiedad
+        if not cls.HOTELES:
+            required_vars += ['GOOGLE_SHEETS_SPREADSHEET_ID', 'GOOGLE_DRIVE_FOLDER_ID']
+        
         # GOOGLE_OAUTH_CREDENTIALS es opcional, usa default si no está definida
         
         missing_vars = []
@@ -60,6 +113,12 @@ class Config:
             if not getattr(cls, var):
                 missing_vars.append(var)
         
+        for key in cls.HOTELES:
+            for suffix in ('SPREADSHEET_ID', 'DRIVE_FOLDER_ID'):
+                var = f"HOTEL_{key.upper()}_{suffix}"
+                if not os.getenv(var):
+                    missing_vars.append(var)
+        
         if missing_vars:
             raise ValueError(f"Faltan las siguientes variables de entorno: {', '.join(missing_vars)}")
         
@@ -1,4 +1,10 @@
+import io
 import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ParseMode
@@ -7,7 +13,13 @@ from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, Callb
 from config import Config
 from utils.ocr_processor import OCRProcessor
 from utils.sheets_manager import SheetsManager
+from utils.sheets_scheduler import SheetsScheduler
 from utils.drive_manager import DriveManager
+from utils.upload_queue import PhotoUploadQueue
+from utils.properties import load_properties, map_users
+from utils.reports import ReportEngine
+from utils.exporter import EXPORT_FORMATS, RegistrationExporter
+from utils.records import format_soles
 
 # Configurar logging
 logging.basicConfig(
@@ -20,18 +32,80 @@ class HotelBot:
     """Bot de Telegram para registro de clientes de hotel"""
     
     def __init__(self):
-        self.ocr_processor = OCRProcessor()
-        self.sheets_manager = SheetsManager()
-        self.drive_manager = DriveManager()
+        self.started_at = time.perf_counter()
+        
+        # Propiedades (hoteles) y la propiedad de cada usuario autorizado
+        self.properties = load_properties()
+        self.user_properties = map_users(self.properties)
+        
+        # Todas las propiedades usan la misma cuenta de servicio y, por tanto, la misma cuota
+        sheets_scheduler = SheetsScheduler()
+        
+        # Inicializar los servicios en paralelo; los clientes pesados se crean
+        # recién en su primer uso
+        workers = 1 + 2 * len(self.properties)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='init') as executor:
+            ocr_future = executor.submit(OCRProcessor)
+            sheets_futures = {
+                key: executor.submit(SheetsManager, prop, sheets_scheduler)
+                for key, prop in self.properties.items()
+            }
+            drive_futures = {
+                key: executor.submit(DriveManager, prop)
+                for key, prop in self.properties.items()
+            }
+            
+            self.ocr_processor = ocr_future.result()
+            self.sheets_managers = {key: future.result() for key, future in sheets_futures.items()}
+            self.drive_managers = {key: future.result() for key, future in drive_futures.items()}
+        
+        logger.info(f"Servicios inicializados en {time.perf_counter() - self.started_at:.2f} s")
+        
+        self.report_engines = {
+            key: ReportEngine(manager) for key, manager in self.sheets_managers.items()
+        }
+        # Las fotos de DNI se suben en segundo plano y se vinculan a la fila al terminar
+        self.upload_queues = {
+            key: PhotoUploadQueue(
+                self.drive_managers[key], prop.spool_dir,
+                on_uploaded=self.sheets_managers[key].attach_photo
+            )
+            for key, prop in self.properties.items()
+        }
+        for key, queue in self.upload_queues.items():
+            queue.recover()
+            # Índice local de fotos (DNI, fecha) al día con Drive, sin frenar el arranque
+            queue.run_task(self.drive_managers[key].sync_index)
         self.timezone = pytz.timezone(Config.TIMEZONE)
         
         # Estados del bot
         self.user_states = {}
         self.client_data = {}
+        # Claves de registros ya confirmados (para ignorar toques repetidos en "Confirmar")
+        self.confirmed_registrations = OrderedDict()
     
     def is_authorized(self, user_id):
         """Verificar si el usuario está autorizado"""
-        return user_id in Config.AUTHORIZED_USERS
+        return user_id in self.user_properties
+    
+    def get_property(self, user_id):
+        """Propiedad (hotel) en la que trabaja el usuario"""
+        return self.properties[self.user_properties[user_id]]
+    
+    def get_sheets_manager(self, user_id):
+        return self.sheets_managers[self.user_properties[user_id]]
+    
+    def get_drive_manager(self, user_id):
+        return self.drive_managers[self.user_properties[user_id]]
+    
+    def get_upload_queue(self, user_id):
+        return self.upload_queues[self.user_properties[user_id]]
+    
+    def property_header(self, user_id):
+        """Nombre del hotel para encabezar mensajes, solo si hay varias propiedades"""
+        if len(self.properties) < 2:
+            return ""
+        return f"🏨 *{self.get_property(user_id).name}*\n"
     
     def start(self, update: Update, context: CallbackContext):
         """Comando /start"""
@@ -55,6 +129,11 @@ class HotelBot:
             "• /nuevo - Registrar nuevo cliente\n"
             "• /resumen - Ver resumen del día\n"
             "• /habitaciones - Ver disponibilidad\n"
+            "• /salida - Registrar salida de un cliente\n"
+            "• /reporte - Reporte semanal, mensual o por fechas\n"
+            "• /exportar - Exportar registros a CSV o Parquet (administradores)\n"
+            "• /foto <DNI> - Ver la foto de DNI de un cliente\n"
+            "• /fotos - Fotos de DNI subidas hoy\n"
             "• /ayuda - Obtener ayuda\n\n"
             "Para comenzar, envía una foto del DNI del cliente o usa /nuevo"
         )
@@ -72,6 +151,7 @@ class HotelBot:
         # Inicializar estado del usuario
         self.user_states[user_id] = 'waiting_dni_photo'
         self.client_data[user_id] = {
+            'id_registro': uuid.uuid4().hex,  # Clave de idempotencia de esta sesión
             'hora_ingreso': datetime.now(self.timezone).strftime('%H:%M'),
             'fecha': datetime.now(self.timezone).strftime('%Y-%m-%d'),
             'registrado_por': update.effective_user.first_name or "Usuario"
@@ -93,6 +173,12 @@ class HotelBot:
         
         # Verificar si estamos esperando foto de DNI
         if self.user_states.get(user_id) != 'waiting_dni_photo':
+            if user_id in self.client_data:
+                update.message.reply_text(
+                    "📷 Ya recibí la foto del DNI de este registro.\n"
+                    "Para usar otra foto, pulsa 🔄 Reiniciar y comienza con /nuevo."
+                )
+                return
             update.message.reply_text(
                 "❓ No estoy esperando una foto en este momento.\n"
                 "Usa /nuevo para comenzar un nuevo registro."
@@ -123,16 +209,16 @@ class HotelBot:
             # Guardar datos extraídos
             self.client_data[user_id].update(dni_data)
             
-            # Subir foto a Google Drive
-            drive_result = self.drive_manager.upload_dni_photo(
-                image_bytes, 
+            # Subir foto a Google Drive en segundo plano; el enlace se agrega a la fila al terminar
+            self.get_upload_queue(user_id).submit(
+                image_bytes,
                 dni_data.get('dni', 'unknown'),
-                dni_data.get('nombre')
+                dni_data.get('nombre'),
+                id_registro=self.client_data[user_id].get('id_registro')
             )
-            
-            if drive_result:
-                self.client_data[user_id]['foto_drive_id'] = drive_result['file_id']
-                self.client_data[user_id]['foto_url'] = drive_result['web_view_link']
+            # Una segunda foto reutilizaría el mismo id_registro y dejaría la
+            # primera en Drive sin registro: para cambiarla hay que reiniciar
+            self.user_states[user_id] = 'reviewing_dni_data'
             
             # Eliminar mensaje de procesamiento
             context.bot.delete_message(chat_id=processing_msg.chat.id, message_id=processing_msg.message_id)
@@ -229,7 +315,7 @@ class HotelBot:
             self.handle_payment_selection(query, user_id)
         elif query.data.startswith("room_"):
             self.handle_room_selection(query, user_id)
-        elif query.data == "confirm_registration":
+        elif query.data.startswith("confirm_registration"):
             self.confirm_registration(query, user_id)
         elif query.data == "edit_observations":
             self.ask_observations(query, user_id)
@@ -340,7 +426,7 @@ class HotelBot:
         
         # Obtener disponibilidad de habitaciones
         try:
-            availability = self.sheets_manager.get_room_availability()
+            availability = self.get_sheets_manager(user_id).get_room_availability()
         except Exception:
             # Si hay error, usar habitaciones por defecto
             availability = {'available': ['1','2','3','4','5'], 'occupied': []}
@@ -487,7 +573,7 @@ class HotelBot:
         message += f"📝 **Observaciones:** {data.get('observaciones', 'Ninguna')}\n"
         
         keyboard = [
-            [InlineKeyboardButton("✅ Confirmar y Guardar", callback_data="confirm_registration")],
+            [self.confirm_button(user_id)],
             [InlineKeyboardButton("✏️ Editar", callback_data="edit_data")],
             [InlineKeyboardButton("🔄 Reiniciar", callback_data="restart_registration")],
             [InlineKeyboardButton("❌ Cancelar", callback_data="cancel_registration")]
@@ -529,7 +615,7 @@ class HotelBot:
         message += f"📝 **Observaciones:** {data.get('observaciones', 'Ninguna')}\n"
         
         keyboard = [
-            [InlineKeyboardButton("✅ Confirmar y Guardar", callback_data="confirm_registration")],
+            [self.confirm_button(user_id)],
             [InlineKeyboardButton("✏️ Editar", callback_data="edit_data")],
             [InlineKeyboardButton("🔄 Reiniciar", callback_data="restart_registration")],
             [InlineKeyboardButton("❌ Cancelar", callback_data="cancel_registration")]
@@ -565,7 +651,7 @@ class HotelBot:
     def restart_registration(self, query, user_id):
         """Reiniciar el proceso de registro"""
         self.user_states.pop(user_id, None)
-        self.client_data.pop(user_id, None)
+        self.discard_session_photo(user_id, self.client_data.pop(user_id, None))
         
         query.edit_message_text(
             "🔄 *Proceso reiniciado*\n\n"
@@ -574,17 +660,42 @@ class HotelBot:
             parse_mode=ParseMode.MARKDOWN
         )
     
+    def confirm_button(self, user_id):
+        """Botón de confirmación con la clave de la sesión de registro"""
+        key = self.client_data.get(user_id, {}).get('id_registro', '')
+        return InlineKeyboardButton("✅ Confirmar y Guardar", callback_data=f"confirm_registration:{key}")
+    
     def confirm_registration(self, query, user_id):
-        """Confirmar y guardar registro"""
+        """Confirmar y guardar registro (idempotente por sesión de registro)"""
+        _, _, key = query.data.partition(':')
+        
+        # Un segundo toque en "Confirmar" del mismo registro no vuelve a guardarlo
+        if key and key in self.confirmed_registrations:
+            logger.info(f"Confirmación repetida del registro {key}, se ignora")
+            return
+        
         try:
-            # Guardar en Google Sheets
-            success = self.sheets_manager.save_client_data(self.client_data[user_id])
+            client_data = self.client_data.get(user_id)
+            if not client_data or (key and client_data.get('id_registro') != key):
+                query.edit_message_text(
+                    "❓ Este registro ya no está activo.\n"
+                    "Usa /nuevo para comenzar un nuevo registro."
+                )
+                return
+            
+            # Guardar (almacén local, réplica en Google Sheets en segundo plano)
+            success = self.get_sheets_manager(user_id).save_client_data(client_data)
             
             if success:
+                if key:
+                    self.confirmed_registrations[key] = user_id
+                    while len(self.confirmed_registrations) > 1000:
+                        self.confirmed_registrations.popitem(last=False)
+                
                 query.edit_message_text(
                     "✅ *Registro exitoso*\n\n"
                     "El cliente ha sido registrado correctamente.\n"
-                    "Los datos se han guardado en Google Sheets y la foto en Google Drive.\n\n"
+                    "Los datos se han guardado en Google Sheets y la foto se está subiendo a Google Drive.\n\n"
                     "Usa /nuevo para registrar otro cliente.",
                     parse_mode=ParseMode.MARKDOWN
                 )
@@ -610,7 +721,7 @@ class HotelBot:
     def cancel_registration(self, query, user_id):
         """Cancelar registro"""
         self.user_states.pop(user_id, None)
-        self.client_data.pop(user_id, None)
+        self.discard_session_photo(user_id, self.client_data.pop(user_id, None))
         
         query.edit_message_text(
             "❌ *Registro cancelado*\n\n"
@@ -618,6 +729,32 @@ class HotelBot:
             "Usa /nuevo para comenzar un nuevo registro."
         )
     
+    def discard_session_photo(self, user_id, client_data):
+        """Eliminar de Drive la foto ya subida de un registro que no se guardó"""
+        id_registro = (client_data or {}).get('id_registro')
+        file_id = self.get_sheets_manager(user_id).discard_pending_photo(id_registro)
+        if file_id:
+            key = self.user_properties[user_id]
+            self.upload_queues[key].run_task(self._delete_orphan_photo, key, id_registro, file_id)
+    
+    def _delete_orphan_photo(self, key, id_registro, file_id):
+        try:
+            # La misma foto pudo reutilizarse (mismo SHA-256) en otro registro
+            if self.sheets_managers[key].photo_in_use(file_id):
+                logger.info(f"Foto {file_id} del registro {id_registro} en uso por otro registro, se conserva")
+                return
+            logger.warning(f"Foto {file_id} sin registro ({id_registro}): se elimina de Drive")
+            self.drive_managers[key].delete_dni_photo(file_id)
+            
+        except Exception as e:
+            logger.error(f"Error al eliminar foto sin registro: {str(e)}")
+    
+    def clean_pending_photos(self, context: CallbackContext):
+        """Tarea periódica: eliminar las fotos de registros que nunca se confirmaron"""
+        for key, manager in self.sheets_managers.items():
+            for id_registro, file_id in manager.expire_pending_photos():
+                self.upload_queues[key].run_task(self._delete_orphan_photo, key, id_registro, file_id)
+    
     def resumen_diario(self, update: Update, context: CallbackContext):
         """Comando /resumen - mostrar resumen del día"""
         user_id = update.effective_user.id
@@ -627,16 +764,17 @@ class HotelBot:
             return
         
         try:
-            summary = self.sheets_manager.get_daily_summary()
+            summary = self.get_sheets_manager(user_id).get_daily_summary()
             
-            message = f"📊 *Resumen del día - {summary['date']}*\n\n"
+            message = self.property_header(user_id)
+            message += f"📊 *Resumen del día - {summary['date']}*\n\n"
             message += f"👥 **Total de clientes:** {summary['total_clients']}\n"
             message += f"💰 **Ingresos totales:** S/{summary['total_revenue']}\n\n"
             
             if summary['records']:
                 message += "📋 **Registros del día:**\n"
                 for record in summary['records'][-5:]:  # Últimos 5 registros
-                    message += f"• {record.get('Nombre', 'N/A')} - Hab. {record.get('Habitación', 'N/A')}\n"
+                    message += f"• {record.nombre or 'N/A'} - Hab. {record.habitacion_label or 'N/A'}\n"
             
             update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
             
@@ -653,9 +791,10 @@ class HotelBot:
             return
         
         try:
-            availability = self.sheets_manager.get_room_availability()
+            availability = self.get_sheets_manager(user_id).get_room_availability()
             
-            message = "🏠 *Disponibilidad de Habitaciones*\n\n"
+            message = self.property_header(user_id)
+            message += "🏠 *Disponibilidad de Habitaciones*\n\n"
             
             if availability['available']:
                 message += "🟢 **Disponibles:**\n"
@@ -679,6 +818,382 @@ class HotelBot:
             logger.error(f"Error al obtener disponibilidad: {str(e)}")
             update.message.reply_text("❌ Error al obtener la disponibilidad.")
     
+    def registrar_salida(self, update: Update, context: CallbackContext):
+        """Comando /salida <habitación|DNI> - registrar la salida real de un cliente"""
+        user_id = update.effective_user.id
+        
+        if not self.is_authorized(user_id):
+            update.message.reply_text("❌ No tienes autorización para usar este bot.")
+            return
+        
+        if not context.args:
+            update.message.reply_text("❓ Uso: /salida <habitación> o /salida <DNI>")
+            return
+        
+        target = context.args[0].strip()
+        checkout_at = datetime.now(self.timezone)
+        checkout_time = checkout_at.strftime('%H:%M')
+        
+        try:
+            # Un DNI tiene 7 o más dígitos; lo demás se toma como habitación
+            if target.isdigit() and len(target) >= 7:
+                record = self.get_sheets_manager(user_id).update_client_checkout(target, checkout_at.timestamp())
+            else:
+                record = self.get_sheets_manager(user_id).update_room_checkout(target, checkout_at.timestamp())
+            
+            if record:
+                update.message.reply_text(
+                    "🚪 *Salida registrada*\n\n"
+                    f"👤 **Cliente:** {record.nombre or 'N/A'}\n"
+                    f"🏠 **Habitación:** {record.habitacion_label or 'N/A'}\n"
+                    f"🕐 **Hora de salida:** {checkout_time}",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                
+                # Vista previa del DNI desde la miniatura local, sin descargar de Drive
+                thumbnail = None
+                if record.foto_drive_id:
+                    thumbnail = self.get_drive_manager(user_id).get_thumbnail(record.foto_drive_id)
+                if thumbnail:
+                    update.message.reply_photo(
+                        photo=io.BytesIO(thumbnail),
+                        caption=f"🪪 DNI {record.dni or 'N/A'}"
+                    )
+            else:
+                update.message.reply_text(f"❓ No hay una estancia activa para {target}.")
+            
+        except Exception as e:
+            logger.error(f"Error al registrar salida: {str(e)}")
+            update.message.reply_text("❌ Error al registrar la salida.")
+    
+    def reporte(self, update: Update, context: CallbackContext):
+        """Comando /reporte - ingresos, ocupación y formas de pago de un periodo"""
+        user_id = update.effective_user.id
+        
+        if not self.is_authorized(user_id):
+            update.message.reply_text("❌ No tienes autorización para usar este bot.")
+            return
+        
+        # /reporte todos ... combina todas las propiedades (solo usuarios de AUTHORIZED_USERS)
+        args = list(context.args or [])
+        all_properties = bool(args) and args[0].lower() == 'todos'
+        if all_properties:
+            args = args[1:]
+            if user_id not in Config.AUTHORIZED_USERS:
+                update.message.reply_text("❌ Solo los administradores pueden ver el reporte de todos los hoteles.")
+                return
+        
+        try:
+            today = datetime.now(self.timezone).date()
+            start_date, end_date = ReportEngine.parse_period(args, today=today)
+        except ValueError:
+            update.message.reply_text(
+                "❓ Uso: /reporte [todos] semana | mes | 2026-09-01..2026-09-30"
+            )
+            return
+        
+        try:
+            if all_properties:
+                engines = {
+                    self.properties[key].name: engine
+                    for key, engine in self.report_engines.items()
+                }
+                report = ReportEngine.generate_across(engines, start_date, end_date)
+                message = "🏨 *Todos los hoteles*\n"
+            else:
+                report = self.report_engines[self.user_properties[user_id]].generate(start_date, end_date)
+                message = self.property_header(user_id)
+            
+            message += f"📈 *Reporte {report['start']} al {report['end']}*\n\n"
+            message += f"👥 **Clientes:** {report['total_clients']}\n"
+            message += f"💰 **Ingresos:** S/{format_soles(report['total_revenue_cents'])}\n"
+            message += f"⏱️ **Estancia promedio:** {report['average_stay_hours']:.1f} horas\n\n"
+            
+            if report.get('properties'):
+                message += "🏨 **Por hotel:**\n"
+                for name, totals in report['properties'].items():
+                    message += (
+                        f"• {name}: {totals['total_clients']} clientes, "
+                        f"S/{format_soles(totals['total_revenue_cents'])}, "
+                        f"ocupación {totals['occupancy'] * 100:.0f}%\n"
+                    )
+                message += "\n"
+            
+            if report['occupancy']:
+                message += "🏠 **Ocupación por habitación:**\n"
+                for room, rate in report['occupancy'].items():
+                    message += f"• Hab. {room}: {rate * 100:.0f}%\n"
+                message += "\n"
+            
+            if report['payment_mix']:
+                message += "💳 **Formas de pago:**\n"
+                for method, mix in report['payment_mix'].items():
+                    message += f"• {method}: {mix['count']} (S/{format_soles(mix['revenue_cents'])})\n"
+            
+            update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+            
+        except Exception as e:
+            logger.error(f"Error al generar reporte: {str(e)}")
+            update.message.reply_text("❌ Error al generar el reporte.")
+    
+    def exportar(self, update: Update, context: CallbackContext):
+        """Comando /exportar [csv|parquet] <periodo> - enviar los registros al chat de administración (administradores)"""
+        user_id = update.effective_user.id
+        
+        if not self.is_authorized(user_id):
+            update.message.reply_text("❌ No tienes autorización para usar este bot.")
+            return
+        
+        # El archivo lleva DNI, nombres y fechas de nacimiento de todos los huéspedes
+        if user_id not in Config.AUTHORIZED_USERS:
+            update.message.reply_text("❌ Solo los administradores pueden exportar registros.")
+            return
+        
+        args = list(context.args or [])
+        fmt = 'csv'
+        for arg in list(args):
+            if arg.lower() in EXPORT_FORMATS:
+                fmt = arg.lower()
+                args.remove(arg)
+        
+        try:
+            today = datetime.now(self.timezone).date()
+            start_date, end_date = ReportEngine.parse_period(args, today=today)
+        except ValueError:
+            update.message.reply_text(
+                "❓ Uso: /exportar [csv|parquet] semana | mes | anterior | 2026-09-01..2026-09-30"
+            )
+            return
+        
+        # Sin chat de administración configurado, el archivo va a quien lo pidió
+        chat_id = Config.TELEGRAM_ADMIN_CHAT_ID or update.effective_chat.id
+        hotel = self.get_property(user_id)
+        filename = f"registros_{hotel.key}_{start_date.isoformat()}_{end_date.isoformat()}.{fmt}"
+        
+        update.message.reply_text(f"⏳ Exportando registros del {start_date} al {end_date}...")
+        
+        path = None
+        try:
+            exporter = RegistrationExporter(self.get_sheets_manager(user_id))
+            path, total = exporter.export(start_date, end_date, fmt=fmt)
+            
+            with open(path, 'rb') as document:
+                context.bot.send_document(
+                    chat_id=chat_id,
+                    document=document,
+                    filename=filename,
+                    caption=f"📤 {hotel.name}: {total} registros del {start_date} al {end_date}"
+                )
+            
+            if str(chat_id) != str(update.effective_chat.id):
+                update.message.reply_text("✅ Exportación enviada al chat de administración.")
+            
+        except ImportError as e:
+            logger.error(f"Error al exportar registros: {str(e)}")
+            update.message.reply_text(f"❌ {str(e)}")
+        except Exception as e:
+            logger.error(f"Error al exportar registros: {str(e)}")
+            update.message.reply_text("❌ Error al exportar los registros.")
+        finally:
+            if path and os.path.exists(path):
+                os.remove(path)
+    
+    def foto(self, update: Update, context: CallbackContext):
+        """Comando /foto <DNI> - ver la foto de DNI de un cliente"""
+        user_id = update.effective_user.id
+        
+        if not self.is_authorized(user_id):
+            update.message.reply_text("❌ No tienes autorización para usar este bot.")
+            return
+        
+        if not context.args:
+            update.message.reply_text("❓ Uso: /foto <DNI>")
+            return
+        
+        dni = context.args[0].strip()
+        
+        try:
+            drive = self.get_drive_manager(user_id)
+            photos = drive.find_dni_photos(dni)
+            if not photos:
+                update.message.reply_text(f"❓ No hay fotos del DNI {dni}.")
+                return
+            
+            latest = photos[0]
+            caption = f"🪪 DNI {dni} - {latest['fecha']}"
+            if len(photos) > 1:
+                caption += f" ({len(photos)} fotos)"
+            caption += f"\n{latest['web_view_link']}"
+            
+            thumbnail = drive.get_thumbnail(latest['file_id'])
+            if thumbnail:
+                update.message.reply_photo(photo=io.BytesIO(thumbnail), caption=caption)
+            else:
+                update.message.reply_text(caption)
+            
+        except Exception as e:
+            logger.error(f"Error al buscar foto de DNI: {str(e)}")
+            update.message.reply_text("❌ Error al buscar la foto.")
+    
+    def fotos(self, update: Update, context: CallbackContext):
+        """Comando /fotos - fotos de DNI subidas hoy y almacenamiento ahorrado"""
+        user_id = update.effective_user.id
+        
+        if not self.is_authorized(user_id):
+            update.message.reply_text("❌ No tienes autorización para usar este bot.")
+            return
+        
+        try:
+            today = datetime.now(self.timezone)
+            savings = self.get_drive_manager(user_id).get_storage_savings(today)
+            queue = self.get_upload_queue(user_id)
+            pending = queue.pending_count()
+            retry_in = queue.next_retry_in()
+            
+            message = self.property_header(user_id)
+            message += f"🪪 *Fotos de DNI - {today.strftime('%Y-%m-%d')}*\n\n"
+            message += f"📤 **Subidas hoy:** {savings['fotos']}\n"
+            if pending:
+                message += f"⏳ **Pendientes de subir:** {pending}\n"
+            if retry_in is not None:
+                # Sin conexión solo si Drive no aceptó la subida; si falló el vínculo con la fila, no
+                status = "Sin conexión con Drive" if queue.is_offline() else "Reintentos pendientes"
+                message += (
+                    f"📡 **{status}:** {queue.retrying_count()} en espera, "
+                    f"próximo intento en {retry_in:.0f} s\n"
+                )
+            failed = len(queue.failed_jobs())
+            if failed:
+                message += f"⚠️ **Sin subir (revisar a mano):** {failed}\n"
+            
+            if savings['fotos']:
+                original_mb = savings['original'] / (1024 * 1024)
+                archived_mb = savings['archivado'] / (1024 * 1024)
+                percent = savings['ahorro'] * 100 / savings['original'] if savings['original'] else 0
+                message += f"📦 **Tamaño recibido:** {original_mb:.1f} MB\n"
+                message += f"🗄️ **Tamaño archivado:** {archived_mb:.1f} MB\n"
+                message += (
+                    f"💾 **Ahorro:** {savings['ahorro'] / (1024 * 1024):.1f} MB ({percent:.0f}%), "
+                    f"{savings['ahorro'] // savings['fotos'] // 1024} KB por foto\n"
+                )
+            
+            update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+            
+        except Exception as e:
+            logger.error(f"Error al obtener fotos del día: {str(e)}")
+            update.message.reply_text("❌ Error al obtener las fotos del día.")
+    
+    def almacenamiento(self, update: Update, context: CallbackContext):
+        """Comando /almacenamiento [días] - crecimiento del espacio en Drive (administradores)"""
+        user_id = update.effective_user.id
+        
+        if not self.is_authorized(user_id):
+            update.message.reply_text("❌ No tienes autorización para usar este bot.")
+            return
+        
+        if user_id not in Config.AUTHORIZED_USERS:
+            update.message.reply_text("❌ Solo los administradores pueden ver el almacenamiento.")
+            return
+        
+        args = list(context.args or [])
+        if args and not (args[0].isdigit() and 1 <= int(args[0]) <= 90):
+            update.message.reply_text("❓ Uso: /almacenamiento [días, de 1 a 90]")
+            return
+        days = int(args[0]) if args else 7
+        
+        try:
+            # Solo la cuenta local: ninguna petición a Drive
+            trend = self.get_drive_manager(user_id).get_storage_trend(
+                days, today=datetime.now(self.timezone).date()
+            )
+            mb = 1024 * 1024
+            
+            message = self.property_header(user_id)
+            message += f"💾 *Almacenamiento en Drive - últimos {days} días*\n\n"
+            if trend['limite']:
+                message += (
+                    f"📦 **Uso estimado:** {trend['uso'] / 1024 ** 3:.2f} de "
+                    f"{trend['limite'] / 1024 ** 3:.0f} GB "
+                    f"({trend['uso'] * 100 / trend['limite']:.1f}%)\n"
+                )
+            if trend['conciliado']:
+                message += f"🔄 **Conciliado con Drive:** {trend['conciliado'].replace('T', ' ')}\n"
+            message += (
+                f"📈 **Subido:** {trend['subidos'] / mb:.1f} MB  "
+                f"🗑️ **Eliminado:** {trend['eliminados'] / mb:.1f} MB\n"
+                f"📊 **Crecimiento promedio:** {trend['promedio_diario'] / mb:+.1f} MB/día\n"
+            )
+            if trend['dias_hasta_lleno'] is not None:
+                message += f"⏳ **Espacio para:** ~{trend['dias_hasta_lleno']} días a este ritmo\n"
+            
+            message += "\n📅 **Por día:**\n"
+            for row in trend['dias']:
+                message += (
+                    f"• {row['fecha']}: {row['neto'] / mb:+.1f} MB "
+                    f"({row['fotos_subidas']} subidas, {row['fotos_eliminadas']} eliminadas)\n"
+                )
+            
+            update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+            
+        except Exception as e:
+            logger.error(f"Error al obtener almacenamiento: {str(e)}")
+            update.message.reply_text("❌ Error al obtener el almacenamiento.")
+    
+    def reconcile_storage(self, context: CallbackContext):
+        """Tarea periódica: conciliar la cuenta local de almacenamiento con la cuota de Drive"""
+        for key, queue in self.upload_queues.items():
+            queue.run_task(self.drive_managers[key].get_storage_usage)
+    
+    def report_failed_photos(self, context: CallbackContext):
+        """Tarea periódica: avisar al administrador de las fotos que no se pudieron subir"""
+        if not Config.TELEGRAM_ADMIN_CHAT_ID:
+            return
+        
+        for key, queue in self.upload_queues.items():
+            jobs = queue.failed_jobs(unreported=True)
+            if not jobs:
+                continue
+            
+            message = f"⚠️ Fotos de DNI sin subir a Drive - {self.properties[key].name}\n"
+            for job in jobs[:20]:
+                message += f"• DNI {job.get('dni') or '?'} ({job.get('id_registro') or 'sin registro'}): {job.get('error')}\n"
+            if len(jobs) > 20:
+                message += f"... y {len(jobs) - 20} más\n"
+            message += f"Quedaron en {queue.failed_dir}"
+            
+            try:
+                context.bot.send_message(chat_id=Config.TELEGRAM_ADMIN_CHAT_ID, text=message)
+                queue.mark_reported([job['job_id'] for job in jobs])
+            except Exception as e:
+                logger.error(f"Error al avisar de fotos sin subir: {str(e)}")
+    
+    def purge_photos(self, context: CallbackContext):
+        """Tarea diaria: purgar las fotos de DNI vencidas de cada propiedad"""
+        for key, queue in self.upload_queues.items():
+            # En los hilos de la cola de subida, fuera de la cola de tareas del bot
+            queue.run_task(self._purge_property_photos, key, context.bot)
+    
+    def _purge_property_photos(self, key, bot):
+        # El índice local decide qué se elimina: ponerlo al día con Drive primero
+        self.drive_managers[key].sync_index()
+        report = self.drive_managers[key].purge_expired()
+        if not report['seleccionadas'] or not Config.TELEGRAM_ADMIN_CHAT_ID:
+            return
+        
+        message = (
+            f"🗑️ Purga de fotos de DNI - {self.properties[key].name}\n"
+            f"Fotos sin uso desde antes del {report['corte']}: {report['seleccionadas']}\n"
+            f"Eliminadas: {report['eliminadas']} ({report['bytes'] / (1024 * 1024):.1f} MB)\n"
+            f"Carpetas de día eliminadas: {report['carpetas']}"
+        )
+        if report['fallidas']:
+            message += f"\n⚠️ Con error (se reintentan mañana): {report['fallidas']}"
+        
+        try:
+            bot.send_message(chat_id=Config.TELEGRAM_ADMIN_CHAT_ID, text=message)
+        except Exception as e:
+            logger.error(f"Error al enviar informe de purga: {str(e)}")
+    
     def ayuda(self, update: Update, context: CallbackContext):
         """Comando /ayuda"""
         help_message = (
@@ -688,6 +1203,12 @@ class HotelBot:
             "• /nuevo - Registrar nuevo cliente\n"
             "• /resumen - Ver resumen del día\n"
             "• /habitaciones - Ver disponibilidad\n"
+            "• /salida <habitación|DNI> - Registrar salida\n"
+            "• /reporte [todos] semana|mes|AAAA-MM-DD..AAAA-MM-DD - Ver reporte\n"
+            "• /exportar [csv|parquet] mes|anterior|AAAA-MM-DD..AAAA-MM-DD - Exportar registros (administradores)\n"
+            "• /foto <DNI> - Ver la foto de DNI de un cliente\n"
+            "• /fotos - Fotos de DNI subidas hoy y espacio ahorrado\n"
+            "• /almacenamiento [días] - Crecimiento del espacio en Drive (administradores)\n"
             "• /ayuda - Mostrar esta ayuda\n\n"
             "**Cómo usar:**\n"
             "1. Usa /nuevo o envía una foto del DNI\n"
@@ -718,17 +1239,47 @@ class HotelBot:
             # Agregar manejadores
             dispatcher.add_handler(CommandHandler("start", self.start))
             dispatcher.add_handler(CommandHandler("nuevo", self.nuevo_cliente))
-            dispatcher.add_handler(CommandHandler("resumen", self.resumen_diario))
-            dispatcher.add_handler(CommandHandler("habitaciones", self.ver_habitaciones))
+            # Las consultas de solo lectura corren en paralelo; SheetsManager
+            # agrupa las lecturas idénticas en una sola petición
+            dispatcher.add_handler(CommandHandler("resumen", self.resumen_diario, run_async=True))
+            dispatcher.add_handler(CommandHandler("habitaciones", self.ver_habitaciones, run_async=True))
+            dispatcher.add_handler(CommandHandler("reporte", self.reporte, run_async=True))
+            dispatcher.add_handler(CommandHandler("exportar", self.exportar, run_async=True))
+            dispatcher.add_handler(CommandHandler("foto", self.foto, run_async=True))
+            dispatcher.add_handler(CommandHandler("fotos", self.fotos, run_async=True))
+            dispatcher.add_handler(CommandHandler("almacenamiento", self.almacenamiento, run_async=True))
+            dispatcher.add_handler(CommandHandler("salida", self.registrar_salida))
             dispatcher.add_handler(CommandHandler("ayuda", self.ayuda))
             
             dispatcher.add_handler(MessageHandler(Filters.photo, self.handle_photo))
             dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, self.handle_text_input))
             dispatcher.add_handler(CallbackQueryHandler(self.handle_callback))
             
+            # Conciliar el uso de almacenamiento con Drive (solo si la última conciliación venció)
+            updater.job_queue.run_repeating(
+                self.reconcile_storage,
+                interval=timedelta(hours=Config.DRIVE_QUOTA_RECONCILE_HOURS), first=timedelta(minutes=1)
+            )
+            
+            # Fotos subidas para registros que se abandonaron sin confirmar
+            updater.job_queue.run_repeating(
+                self.clean_pending_photos, interval=timedelta(hours=1), first=timedelta(minutes=2)
+            )
+            
+            # Fotos apartadas por un rechazo de Drive o por agotar los reintentos
+            updater.job_queue.run_repeating(
+                self.report_failed_photos, interval=timedelta(minutes=10), first=timedelta(minutes=1)
+            )
+            
+            # Purga diaria de fotos vencidas (plazo de conservación)
+            if Config.DRIVE_RETENTION_DAYS > 0:
+                updater.job_queue.run_repeating(
+                    self.purge_photos, interval=timedelta(days=1), first=timedelta(minutes=5)
+                )
+            
             # Iniciar bot
-            logger.info("Bot iniciado exitosamente")
             updater.start_polling()
+            logger.info(f"Bot iniciado exitosamente en {time.perf_counter() - self.started_at:.2f} s")
             updater.idle()
             
         except Exception as e:
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Importación masiva de registros históricos para HotelBot
+Carga un CSV o XLSX (con los encabezados de la hoja de registros) al almacén
+local y lo replica en Google Sheets por bloques. Se puede interrumpir y volver
+a ejecutar: continúa desde el último bloque guardado y omite los registros que
+ya existen (mismo DNI y fecha).
+
+Solo un proceso replica cada base local: si el bot está en marcha con la misma
+base, la importación no se ejecuta (detenga el bot antes de importar).
+"""
+
+import sys
+import time
+import argparse
+import logging
+
+from utils.bulk_import import BulkImporter
+from utils.properties import load_properties
+from utils.sheets_manager import REPLICATION_LEASE_SECONDS, SheetsManager
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+def main():
+    """Función principal de la importación"""
+    parser = argparse.ArgumentParser(description="Importar registros históricos desde CSV o XLSX")
+    parser.add_argument('archivo', help="Archivo .csv o .xlsx con los registros")
+    parser.add_argument('--hoja', help="Hoja del archivo XLSX (por defecto, la activa)")
+    parser.add_argument('--hotel', help="Clave de la propiedad (si hay varias en HOTELES)")
+    parser.add_argument('--bloque', type=int, default=5000, help="Registros por bloque")
+    parser.add_argument('--rechazados', help="CSV donde anotar las filas rechazadas y el motivo")
+    parser.add_argument('--sin-replicar', action='store_true',
+                        help="Solo cargar el almacén local; el bot replicará al iniciarse")
+    args = parser.parse_args()
+
+    properties = load_properties()
+    key = args.hotel or next(iter(properties))
+    if key not in properties:
+        print(f"❌ Hotel desconocido: {key} (disponibles: {', '.join(properties)})")
+        return 1
+
+    print("📥 IMPORTACIÓN DE REGISTROS HISTÓRICOS")
+    print("="*70)
+
+    # Sin hilo de replicación propio: la réplica se hace aquí, con el permiso
+    # de réplica de la base tomado durante toda la importación
+    manager = SheetsManager(properties[key], replicate=False)
+    holder = manager.acquire_replication()
+    if holder:
+        print(f"❌ Otro proceso replica {properties[key].db_path} ({holder}).")
+        print("   Detenga el bot antes de importar; si ya se detuvo, el permiso vence en "
+              f"{REPLICATION_LEASE_SECONDS} s.")
+        return 1
+
+    try:
+        return run_import(args, manager, properties[key])
+    finally:
+        manager.stop()
+
+def run_import(args, manager, hotel):
+    """Cargar el archivo y, salvo --sin-replicar, esperar su réplica en Sheets"""
+    # Traer primero lo que ya está en Sheets para no duplicarlo
+    manager.sync_with_sheets()
+
+    importer = BulkImporter(manager, chunk_rows=args.bloque)
+    stats = importer.run(args.archivo, sheet=args.hoja, rejects_path=args.rechazados)
+
+    print(f"\n🏨 Hotel: {hotel.name}")
+    if stats['resumed_after']:
+        print(f"↪️  Reanudado después de la fila {stats['resumed_after']}")
+    print(f"📄 Filas leídas:       {stats['read']}")
+    print(f"✅ Importadas:         {stats['imported']}")
+    print(f"🔁 Duplicadas:         {stats['duplicates']}")
+    print(f"❌ Rechazadas:         {stats['rejected']}")
+    print(f"⏱️  Carga local:        {stats['seconds']:.2f} s ({stats['rows_per_second']:.0f} filas/s)")
+
+    if not args.sin_replicar:
+        seconds = importer.wait_for_replication()
+        rate = stats['imported'] / seconds if seconds else 0
+        print(f"☁️  Réplica en Sheets:  {stats['imported']} filas en {seconds:.2f} s ({rate:.0f} filas/s)")
+    else:
+        print("☁️  Réplica en Sheets:  pendiente, la hará el bot al iniciarse")
+
+    return 0
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    code = main()
+    print(f"\n⏱️  Tiempo total: {time.perf_counter() - start:.2f} s")
+    sys.exit(code)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Purga de fotos de DNI vencidas en Google Drive
+Elimina las fotos sin uso hace más de DRIVE_RETENTION_DAYS días (o --dias),
+elegidas en el índice local, con peticiones en lote de hasta 100 eliminaciones.
+Con --simular solo muestra qué se eliminaría. --informe guarda el detalle en CSV.
+"""
+
+import sys
+import csv
+import time
+import argparse
+import logging
+
+from config import Config
+from utils.drive_manager import DriveManager
+from utils.properties import load_properties
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+REPORT_COLUMNS = ['file_id', 'nombre', 'dni', 'fecha', 'usado', 'tamano', 'estado']
+
+def main():
+    """Función principal de la purga"""
+    parser = argparse.ArgumentParser(description="Eliminar las fotos de DNI vencidas de Google Drive")
+    parser.add_argument('--hotel', help="Clave de la propiedad (si hay varias en HOTELES)")
+    parser.add_argument('--dias', type=int, default=Config.DRIVE_RETENTION_DAYS,
+                        help="Días de conservación desde el último uso (por defecto DRIVE_RETENTION_DAYS)")
+    parser.add_argument('--simular', action='store_true', help="Solo informar, sin eliminar")
+    parser.add_argument('--informe', help="CSV donde guardar el detalle de las fotos purgadas")
+    args = parser.parse_args()
+
+    if args.dias <= 0:
+        print("❌ Indica el plazo con --dias o DRIVE_RETENTION_DAYS")
+        return 1
+
+    properties = load_properties()
+    key = args.hotel or next(iter(properties))
+    if key not in properties:
+        print(f"❌ Hotel desconocido: {key} (disponibles: {', '.join(properties)})")
+        return 1
+
+    print("🗑️  PURGA DE FOTOS DE DNI VENCIDAS")
+    print("="*70)
+
+    drive = DriveManager(properties[key])
+    # El índice local decide qué se elimina: ponerlo al día con Drive primero
+    drive.sync_index()
+    report = drive.purge_expired(args.dias, dry_run=args.simular)
+
+    print(f"\n🏨 Hotel: {properties[key].name}")
+    print(f"📅 Sin uso desde antes del: {report['corte']}")
+    print(f"🔎 Vencidas:        {report['seleccionadas']}")
+    if args.simular:
+        print("ℹ️  Simulación: no se eliminó nada")
+    else:
+        print(f"✅ Eliminadas:      {report['eliminadas']} ({report['bytes'] / (1024 * 1024):.1f} MB)")
+        print(f"❌ Con error:       {report['fallidas']}")
+        print(f"📁 Carpetas vacías: {report['carpetas']}")
+        print(f"🌐 Peticiones HTTP: {report['peticiones']}")
+
+    if args.informe:
+        with open(args.informe, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(report['fotos'])
+        print(f"📄 Informe: {args.informe}")
+
+    return 0 if not report['fallidas'] else 1
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    code = main()
+    print(f"\n⏱️  Tiempo total: {time.perf_counter() - start:.2f} s")
+    sys.exit(code)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Prueba de estrés de subidas simultáneas a Google Drive sobre un Drive en memoria
+Sube fotos desde varios hilos a la vez con una sola conexión compartida (como
+antes) y con una conexión por hilo, y comprueba que con el pool no hay usos
+simultáneos de una conexión, que todas las fotos se subieron y que la
+credencial compartida se renueva una sola vez
+"""
+
+import sys
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from benchmark_drive import synthetic_photo
+from utils.drive_manager import DriveManager, _SharedCredentials
+from utils.fake_drive import FakeDrive
+from utils.properties import Property
+
+class ExpiredCredentials:
+    """Credencial vencida que tarda en renovarse, para contar renovaciones"""
+
+    def __init__(self):
+        self.token = 'vencido'
+        self.valid = False
+        self.refreshes = 0
+
+    def refresh(self, request):
+        time.sleep(0.05)
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        self.valid = True
+
+    def apply(self, headers):
+        headers['authorization'] = f"Bearer {self.token}"
+
+def run_mode(pooled, photos, threads, latency):
+    """Subir las fotos desde varios hilos; devuelve segundos, subidas, fallos y usos simultáneos"""
+    drive = FakeDrive(latency=latency)
+    folder_id = drive.add_folder('Fotos DNI')
+    hotel = Property(
+        key='estres', name='Estrés', spreadsheet_id=None,
+        drive_folder_id=folder_id, rooms=Config.HABITACIONES, photo_index_path=':memory:'
+    )
+    # Una función crea una conexión por hilo; una conexión se comparte entre todos
+    manager = DriveManager(hotel, http=drive.http if pooled else drive.http())
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(
+            lambda item: manager.upload_dni_photo(item[1], f"{20000000 + item[0]}", f"CLIENTE {item[0]}"),
+            enumerate(photos)
+        ))
+    elapsed = time.perf_counter() - start
+
+    uploaded = sum(1 for result in results if result)
+    indexed = manager.index.count()
+    return elapsed, uploaded, len(photos) - uploaded, drive.concurrent_errors, indexed
+
+def check_credentials(threads):
+    """Varios hilos con la credencial vencida: devuelve cuántas veces se renovó"""
+    credentials = ExpiredCredentials()
+    shared = _SharedCredentials(credentials, on_refresh=lambda: None)
+    barrier = threading.Barrier(threads)
+
+    def use():
+        barrier.wait()
+        shared.before_request(None, 'GET', 'https://www.googleapis.com/drive/v3/files', {})
+
+    workers = [threading.Thread(target=use) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return credentials.refreshes
+
+def main():
+    """Función principal de la prueba de estrés"""
+    parser = argparse.ArgumentParser(description="Subidas simultáneas a Google Drive desde varios hilos")
+    parser.add_argument('--fotos', type=int, default=80, help="Fotos a subir por modo")
+    parser.add_argument('--hilos', type=int, default=8, help="Hilos que suben a la vez")
+    parser.add_argument('--latencia', type=float, default=0.05, help="Segundos de latencia por petición")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("🔥 PRUEBA DE ESTRÉS DE SUBIDAS A GOOGLE DRIVE - BACKEND EN MEMORIA")
+    print("="*70)
+    print(f"Fotos: {args.fotos}  Hilos: {args.hilos}  Latencia: {args.latencia * 1000:.0f} ms")
+
+    photos = [synthetic_photo(i, 320, 240) for i in range(args.fotos)]
+
+    modes = [
+        ('conexión compartida (antes)', False, args.hilos),
+        ('una conexión por hilo, 1 hilo', True, 1),
+        (f'una conexión por hilo, {args.hilos} hilos', True, args.hilos),
+    ]
+    header = f"\n{'Modo':<36}{'Subidas':>9}{'Fallos':>8}{'Choques':>9}{'Fotos/s':>9}"
+    print(f"{header}\n{'-' * (len(header) - 1)}")
+
+    failed = False
+    for name, pooled, threads in modes:
+        elapsed, uploaded, errors, collisions, indexed = run_mode(pooled, photos, threads, args.latencia)
+        print(f"{name:<36}{uploaded:>9}{errors:>8}{collisions:>9}{uploaded / elapsed:>9.1f}")
+        if pooled and (errors or collisions or indexed != len(photos)):
+            failed = True
+
+    refreshes = check_credentials(args.hilos)
+    print(f"\n🔑 Credencial vencida usada por {args.hilos} hilos a la vez: {refreshes} renovación(es)")
+    if refreshes != 1:
+        failed = True
+
+    print(f"\n{'❌ FALLÓ' if failed else '✅ SIN USOS SIMULTÁNEOS NI FOTOS PERDIDAS'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -190,9 +190,9 @@ class BotFunctionalTester:
             if result and 'file_id' in result:
                 logger.info(f"✅ Imagen subida exitosamente: {result['filename']}")
                 
-                # Probar listado de archivos
+                # Probar listado de archivos (carpeta del día)
                 logger.info("   Listando archivos...")
-                files = drive.list_dni_photos(limit=10)
+                files = drive.list_dni_photos(limit=10, day=datetime.now())
                 
                 if files and len(files) > 0:
                     logger.info(f"✅ {len(files)} archivos encontrados")
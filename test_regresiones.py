@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Pruebas de regresión sobre los backends en memoria (utils/fake_gspread.py)
+Cubren la conciliación de ediciones hechas a mano en Google Sheets, la
+replicación, las salidas, las fotos sin registro y la conversión de precios,
+sin credenciales ni red
+"""
+
+import io
+import sys
+import logging
+import tempfile
+import argparse
+import threading
+import traceback
+from datetime import date, timedelta
+from pathlib import Path
+
+import httplib2
+from googleapiclient.errors import HttpError
+from gspread.exceptions import APIError
+from PIL import Image
+
+from config import Config
+from utils.drive_manager import DriveManager
+from utils.fake_drive import FakeDrive
+from utils.fake_gspread import FakeClient, FakeResponse, FakeWorksheet
+from utils.properties import Property
+from utils.records import date_to_day, parse_price_cents, time_to_epoch
+from utils.sheets_manager import SheetsManager
+from utils.sheets_scheduler import SheetsScheduler
+from utils.upload_queue import PhotoUploadQueue
+
+SPREADSHEET_ID = 'regresiones'
+
+def new_manager(client=None, db_path=':memory:'):
+    """SheetsManager sobre un cliente en memoria, sin hilo de replicación"""
+    client = client or FakeClient()
+    client.add_spreadsheet(SPREADSHEET_ID)
+    hotel = Property(
+        key='regresiones', name='Regresiones', spreadsheet_id=SPREADSHEET_ID,
+        drive_folder_id=None, rooms=Config.HABITACIONES, db_path=db_path
+    )
+    manager = SheetsManager(
+        hotel=hotel, client=client, replicate=False,
+        scheduler=SheetsScheduler(write_batch_seconds=0, max_retries=1)
+    )
+    return manager, client
+
+def save(manager, index, **extra):
+    client_data = {
+        'dni': f"{40000000 + index}", 'nombre': f"CLIENTE {index}", 'habitacion': str(index + 1),
+        'hora_ingreso': '14:00', 'precio': 'S/30', 'id_registro': f"sesion-{index}",
+    }
+    client_data.update(extra)
+    assert manager.save_client_data(client_data)
+
+def sync(manager):
+    """Sincronizar sin esperar el intervalo entre consultas de versión"""
+    manager._revision_checked_at = 0.0
+    return manager.sync_with_sheets()
+
+def today_at(value, days_ago=0):
+    """Epoch de una hora 'HH:MM' de hoy (o de hace days_ago días)"""
+    return time_to_epoch(date_to_day(date.today() - timedelta(days=days_ago)), value)
+
+def sheet_rows(manager):
+    values = manager.worksheet.get_all_values()
+    column = values[0].index('ID Registro')
+    return [row[column] for row in values[1:]]
+
+def check_price_parsing():
+    """Precios con separador de miles y decimales"""
+    cases = {
+        'S/30': 3000, 'S/35.50': 3550, '35,5': 3550, 'S/1,200': 120000, '1.200': 120000,
+        '1,200.50': 120050, '1.200,50': 120050, 'S/ 25': 2500, '': 0, 'gratis': 0, 30: 3000,
+    }
+    for value, expected in cases.items():
+        cents = parse_price_cents(value)
+        assert cents == expected, f"{value!r} -> {cents}, se esperaba {expected}"
+
+def check_row_deleted_by_hand():
+    """Borrar una fila a mano desplaza las de abajo: se emparejan por ID Registro"""
+    manager, client = new_manager()
+    for i in range(3):
+        save(manager, i)
+    sync(manager)
+    assert sheet_rows(manager) == ['sesion-0', 'sesion-1', 'sesion-2']
+
+    # Salida pendiente de la última fila, con su número de fila anterior al borrado
+    assert manager.update_client_checkout('40000002', today_at('16:00'))
+    del manager.worksheet.rows[2]  # Fila 3 de la hoja: sesion-1
+    client.touch()
+    sync(manager)
+
+    assert not manager.store._conn.in_transaction
+    assert manager.store.find_by_key('sesion-1') is None
+    moved = manager.store.find_by_key('sesion-2')
+    assert moved.fila == 3, f"sesion-2 quedó en la fila {moved.fila}"
+    assert sheet_rows(manager) == ['sesion-0', 'sesion-2']
+
+    # La salida se escribió en la fila de sesion-2, no en la de otro registro
+    values = manager.worksheet.get_all_values()
+    column = values[0].index('Hora Salida Real')
+    assert values[2][column] == '16:00' and values[1][column] == ''
+    assert manager.store.pending_count() == 0
+
+def check_checkout_within_revision_interval():
+    """Una salida justo después de borrar una fila no pisa otra fila (sin esperar la consulta de versión)"""
+    manager, client = new_manager()
+    for i in range(4):
+        save(manager, i)
+    sync(manager)
+    original = [list(row) for row in manager.worksheet.rows]
+
+    del manager.worksheet.rows[2]  # sesion-1, a mano
+    client.touch()
+    assert manager.update_client_checkout('40000002', today_at('16:00'))
+    manager.sync_with_sheets()  # Dentro de GOOGLE_SHEETS_REVISION_CHECK_SECONDS
+
+    assert sheet_rows(manager) == ['sesion-0', 'sesion-2', 'sesion-3']
+    assert manager.store.find_by_key('sesion-3') is not None
+    values = manager.worksheet.get_all_values()
+    column = values[0].index('Hora Salida Real')
+    assert values[2][column] == '16:00' and values[3][column] == ''
+    # Las demás celdas de las filas siguen como estaban
+    assert values[3] == original[4], values[3]
+    assert manager.store.pending_count() == 0
+
+def check_pending_row_deleted_by_hand():
+    """Una fila borrada a mano con cambios locales pendientes vuelve a agregarse"""
+    manager, client = new_manager()
+    for i in range(2):
+        save(manager, i)
+    sync(manager)
+
+    assert manager.update_client_checkout('40000000', today_at('16:00'))
+    del manager.worksheet.rows[1]
+    client.touch()
+    sync(manager)
+
+    assert sorted(sheet_rows(manager)) == ['sesion-0', 'sesion-1']
+    assert manager.store.find_by_key('sesion-0').fila == 3
+    assert manager.store.pending_count() == 0
+
+def check_failed_reconcile_is_retried():
+    """Si la conciliación falla, se deshace y la misma versión se vuelve a procesar"""
+    manager, client = new_manager()
+    save(manager, 0)
+    sync(manager)
+
+    manager.worksheet.load_rows([[manager.worksheet.rows[1][0], '15:00', '', '9', '49999999', 'A MANO']])
+    original = manager.store.mirror_partition
+    manager.store.mirror_partition = lambda *args: (_ for _ in ()).throw(RuntimeError('fallo simulado'))
+    try:
+        sync(manager)
+        raise AssertionError("la conciliación simulada no falló")
+    except RuntimeError:
+        pass
+    manager.store.mirror_partition = original
+
+    assert not manager.store._conn.in_transaction
+    sync(manager)
+    assert [r.dni for r in manager.get_client_history('49999999')] == ['49999999']
+
+def check_append_error_not_duplicated():
+    """Un 503 después de agregar las filas no las vuelve a enviar"""
+    manager, client = new_manager()
+    for i in range(3):
+        save(manager, i)
+
+    append_rows = FakeWorksheet.append_rows
+    def append_then_fail(worksheet, values, **kwargs):
+        append_rows(worksheet, values, **kwargs)
+        raise APIError(FakeResponse(503, {'error': {'code': 503, 'message': 'Backend Error'}}))
+
+    FakeWorksheet.append_rows = append_then_fail
+    try:
+        try:
+            sync(manager)
+        except APIError:
+            pass
+    finally:
+        FakeWorksheet.append_rows = append_rows
+
+    sync(manager)
+    assert sheet_rows(manager) == ['sesion-0', 'sesion-1', 'sesion-2']
+    assert manager.store.pending_count() == 0
+
+def check_overnight_checkout():
+    """Una salida al día siguiente, más tarde que la hora de ingreso, queda en ese día"""
+    manager, client = new_manager()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    save(manager, 0, fecha=yesterday, hora_ingreso='14:00')
+    save(manager, 1, fecha=yesterday, hora_ingreso='14:00')
+    sync(manager)
+
+    late = manager.update_client_checkout('40000000', today_at('15:00'))
+    early = manager.update_room_checkout('2', today_at('10:00'))
+    assert late.salida_real - late.ingreso == 25 * 3600, "la salida se registró el día del ingreso"
+    assert early.salida_real - early.ingreso == 20 * 3600
+    sync(manager)
+
+    values = manager.worksheet.get_all_values()
+    column = values[0].index('Hora Salida Real')
+    assert values[1][column] == f"{date.today().isoformat()} 15:00", values[1][column]
+    assert values[2][column] == '10:00', values[2][column]
+
+    # Releer la hoja no cambia la salida guardada
+    client.touch()
+    sync(manager)
+    assert manager.store.find_by_key('sesion-0').salida_real == late.salida_real
+    assert manager.store.find_by_key('sesion-1').salida_real == early.salida_real
+
+def check_duplicate_rows_deleted():
+    """Las filas repetidas (mismo ID Registro) se eliminan de la hoja"""
+    manager, client = new_manager()
+    for i in range(3):
+        save(manager, i)
+    sync(manager)
+
+    # Dos copias de sesion-0 pegadas a mano entre otras filas
+    copy = list(manager.worksheet.rows[1])
+    manager.worksheet.rows.insert(2, list(copy))
+    manager.worksheet.load_rows([copy])
+    assert manager.update_client_checkout('40000002', today_at('16:00'))
+    sync(manager)
+
+    assert sheet_rows(manager) == ['sesion-0', 'sesion-1', 'sesion-2']
+    assert [manager.store.find_by_key(f"sesion-{i}").fila for i in range(3)] == [2, 3, 4]
+    values = manager.worksheet.get_all_values()
+    column = values[0].index('Hora Salida Real')
+    assert values[3][column] == '16:00'
+    assert manager.store.count() == 3
+
+def check_unconfirmed_photo_discarded():
+    """La foto de un registro cancelado o nunca confirmado se descarta"""
+    manager, client = new_manager()
+    manager.attach_photo('sesion-0', 'https://drive/0', 'archivo-0')
+    manager.attach_photo('sesion-1', 'https://drive/1', 'archivo-1')
+    manager.attach_photo('sesion-2', 'https://drive/2', 'archivo-2')
+    assert manager.photo_in_use('archivo-0')
+
+    # Cancelado: se descarta al cancelar
+    assert manager.discard_pending_photo('sesion-0') == 'archivo-0'
+    assert not manager.photo_in_use('archivo-0')
+
+    # Confirmado: la foto pasa al registro y no vence
+    save(manager, 2)
+    assert manager.store.find_by_key('sesion-2').foto_drive_id == 'archivo-2'
+
+    # Abandonado: vence después de PENDING_PHOTO_HOURS
+    assert manager.expire_pending_photos() == []
+    assert manager.expire_pending_photos(max_age_hours=-1) == [('sesion-1', 'archivo-1')]
+    assert not manager.photo_in_use('archivo-1') and manager.photo_in_use('archivo-2')
+
+def check_single_replicator_per_database():
+    """Dos procesos con la misma base (bot e importación) no replican a la vez"""
+    db_path = str(Path(tempfile.mkdtemp(prefix='hotelbot-regresiones-')) / 'hotel.db')
+    bot, client = new_manager(db_path=db_path)
+    importer, _ = new_manager(client, db_path=db_path)
+
+    save(bot, 0)
+    assert sync(bot) is True
+    assert importer.acquire_replication() == bot._owner
+
+    save(importer, 1)
+    assert sync(importer) is False
+    assert sync(bot) is True
+    assert sheet_rows(bot) == ['sesion-0', 'sesion-1']
+
+    # Al detenerse, el bot libera el permiso y la importación puede replicar
+    bot.stop()
+    assert importer.acquire_replication() is None
+    assert sync(bot) is False
+
+def check_shared_scheduler_batches():
+    """Un planificador compartido no mezcla hojas con el mismo gid de archivos distintos"""
+    client = FakeClient()
+    first = client.add_spreadsheet('hotel-a').create_worksheet('Registros')
+    second = client.add_spreadsheet('hotel-b').create_worksheet('Registros')
+    second.id = first.id  # Cada archivo numera sus hojas: los gid se repiten
+    scheduler = SheetsScheduler(write_batch_seconds=0.2, max_retries=1)
+
+    results = {}
+    def append(name, worksheet, rows):
+        results[name] = scheduler.append_rows(worksheet, rows)
+
+    threads = [
+        threading.Thread(target=append, args=('a1', first, [['a1'], ['a1']])),
+        threading.Thread(target=append, args=('b', second, [['b']])),
+        threading.Thread(target=append, args=('a2', first, [['a2']])),
+    ]
+    for thread in threads:
+        thread.start()
+        thread.join(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert sorted(row[0] for row in first.rows) == ['a1', 'a1', 'a2'], first.rows
+    assert second.rows == [['b']], second.rows
+
+    # Cada hilo recibe la posición de sus filas dentro del append combinado
+    for name in ('a1', 'a2'):
+        response, start = results[name]
+        first_row = SheetsManager._first_updated_row(response)
+        assert first.rows[first_row - 1 + start] == [name], (name, first_row, start)
+
+def check_upload_failures_classified():
+    """Solo los errores pasajeros de Drive se reintentan; los rechazos y los agotados se apartan"""
+    drive = FakeDrive()
+    hotel = Property(
+        key='regresiones', name='Regresiones', spreadsheet_id=None,
+        drive_folder_id=drive.add_folder('Fotos DNI'), rooms=Config.HABITACIONES,
+        photo_index_path=':memory:'
+    )
+    queue = PhotoUploadQueue(
+        DriveManager(hotel, http=drive.http()), tempfile.mkdtemp(prefix='hotelbot-regresiones-'), workers=1
+    )
+    photo = io.BytesIO()
+    Image.new('RGB', (64, 48), 'white').save(photo, 'JPEG')
+    max_attempts = Config.DRIVE_RETRY_MAX_ATTEMPTS
+    try:
+        # Sin conexión: queda en espera de reintento
+        drive.offline = True
+        queue.submit(photo.getvalue(), '40000000', id_registro='sesion-0')
+        assert queue.wait(5)
+        assert queue.is_offline() and queue.retrying_count() == 1 and not queue.failed_jobs()
+
+        # Sin permiso en la carpeta: Drive no la aceptará, se aparta sin reintentar
+        drive.offline = False
+        manager = queue.drive_manager
+        def forbidden(*args):
+            raise HttpError(httplib2.Response({'status': 403}), b'{"error": {"message": "insufficientFilePermissions"}}')
+        manager._upload_new_photo = forbidden
+        queue.submit(photo.getvalue(), '40000001', id_registro='sesion-1')
+        assert queue.wait(5)
+        del manager._upload_new_photo
+        failed = queue.failed_jobs()
+        assert [job['dni'] for job in failed] == ['40000001'] and queue.retrying_count() == 1
+        assert queue.pending_count() == 1
+
+        # Reintentos agotados: también se aparta, y se informa una sola vez
+        Config.DRIVE_RETRY_MAX_ATTEMPTS = 1
+        drive.offline = True
+        queue.submit(photo.getvalue(), '40000002', id_registro='sesion-2')
+        assert queue.wait(5)
+        assert sorted(job['dni'] for job in queue.failed_jobs(unreported=True)) == ['40000001', '40000002']
+        queue.mark_reported([job['job_id'] for job in queue.failed_jobs()])
+        assert queue.failed_jobs(unreported=True) == [] and len(queue.failed_jobs()) == 2
+    finally:
+        Config.DRIVE_RETRY_MAX_ATTEMPTS = max_attempts
+        queue.stop()
+
+CHECKS = [
+    ('Precios con separador de miles', check_price_parsing),
+    ('Fila borrada a mano en Sheets', check_row_deleted_by_hand),
+    ('Fila borrada con cambios pendientes', check_pending_row_deleted_by_hand),
+    ('Salida dentro del intervalo de versión', check_checkout_within_revision_interval),
+    ('Conciliación fallida se reintenta', check_failed_reconcile_is_retried),
+    ('Salida al día siguiente del ingreso', check_overnight_checkout),
+    ('Filas duplicadas eliminadas de la hoja', check_duplicate_rows_deleted),
+    ('Foto de un registro sin confirmar', check_unconfirmed_photo_discarded),
+    ('Error 503 en append_rows', check_append_error_not_duplicated),
+    ('Planificador compartido entre propiedades', check_shared_scheduler_batches),
+    ('Un solo proceso replica cada base', check_single_replicator_per_database),
+    ('Fotos rechazadas por Drive o sin reintentos', check_upload_failures_classified),
+]
+
+def main():
+    """Función principal de las pruebas de regresión"""
+    parser = argparse.ArgumentParser(description="Pruebas de regresión sobre backends en memoria")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar el log del bot")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    print("🧪 PRUEBAS DE REGRESIÓN - BACKENDS EN MEMORIA")
+    print("="*70)
+
+    failed = 0
+    for name, check in CHECKS:
+        try:
+            check()
+            print(f"✅ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+            if args.verbose:
+                traceback.print_exc()
+
+    print("="*70)
+    print(f"{'❌' if failed else '✅'} {len(CHECKS) - failed}/{len(CHECKS)} pruebas pasaron")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
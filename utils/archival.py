@@ -0,0 +1,114 @@
+from PIL import Image, ImageOps
+import io
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Formato de archivo -> (formato de Pillow, tipo MIME, extensión)
+ARCHIVE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+}
+
+# Calidad mínima antes de reducir dimensiones para entrar en el tamaño máximo
+MIN_QUALITY = 60
+
+
+class ArchivedPhoto:
+    """Foto lista para archivar: versión maestra, miniatura y tamaños"""
+
+    __slots__ = ('master', 'thumbnail', 'mime_type', 'extension', 'original_size')
+
+    def __init__(self, master, thumbnail, mime_type, extension, original_size):
+        self.master = master
+        self.thumbnail = thumbnail
+        self.mime_type = mime_type
+        self.extension = extension
+        self.original_size = original_size
+
+    @property
+    def saved_bytes(self):
+        return self.original_size - len(self.master)
+
+
+class ArchivalEncoder:
+    """Recodificación de fotos de DNI para archivo.
+
+    Genera una versión maestra WebP o JPEG de alta calidad con tamaño acotado
+    (DRIVE_ARCHIVE_MAX_KB, DRIVE_ARCHIVE_MAX_DIMENSION) y una miniatura JPEG
+    pequeña para vistas previas en el chat. Con formato 'original' la foto se
+    guarda tal cual y solo se genera la miniatura.
+    """
+
+    def __init__(self, fmt=None, max_bytes=None, max_dimension=None, quality=85, thumbnail_size=None):
+        self.fmt = (fmt or Config.DRIVE_ARCHIVE_FORMAT).lower()
+        self.max_bytes = max_bytes or Config.DRIVE_ARCHIVE_MAX_KB * 1024
+        self.max_dimension = max_dimension or Config.DRIVE_ARCHIVE_MAX_DIMENSION
+        self.quality = quality
+        self.thumbnail_size = thumbnail_size or Config.DRIVE_THUMBNAIL_SIZE
+
+    @staticmethod
+    def _open(image_bytes):
+        image = Image.open(io.BytesIO(image_bytes))
+        # Respetar la orientación de la cámara antes de descartar EXIF
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        return image
+
+    @staticmethod
+    def _save(image, pil_format, quality):
+        output = io.BytesIO()
+        if pil_format == 'WEBP':
+            image.save(output, format='WEBP', quality=quality, method=4)
+        else:
+            image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+    def _fit(self, image, max_dimension):
+        if max(image.size) <= max_dimension:
+            return image
+        image = image.copy()
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        return image
+
+    def _encode_master(self, image, pil_format):
+        """Bajar la calidad y, si no alcanza, las dimensiones hasta entrar en max_bytes"""
+        dimension = self.max_dimension
+        while True:
+            scaled = self._fit(image, dimension)
+            for quality in range(self.quality, MIN_QUALITY - 1, -5):
+                data = self._save(scaled, pil_format, quality)
+                if len(data) <= self.max_bytes:
+                    return data
+            if dimension <= 640:
+                return data
+            dimension = int(dimension * 0.8)
+
+    def thumbnail(self, image):
+        small = self._fit(image, self.thumbnail_size)
+        return self._save(small, 'JPEG', 70)
+
+    def encode(self, image_bytes):
+        """Recodificar una foto; si no es una imagen válida se archiva tal cual sin miniatura"""
+        try:
+            image = self._open(image_bytes)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la imagen para archivar, se guarda original: {str(e)}")
+            return ArchivedPhoto(image_bytes, None, 'image/jpeg', 'jpg', len(image_bytes))
+
+        thumbnail = self.thumbnail(image)
+
+        if self.fmt not in ARCHIVE_FORMATS:
+            return ArchivedPhoto(image_bytes, thumbnail, 'image/jpeg', 'jpg', len(image_bytes))
+
+        pil_format, mime_type, extension = ARCHIVE_FORMATS[self.fmt]
+        master = self._encode_master(image, pil_format)
+
+        # Una foto que ya era pequeña no se agranda al recodificarla
+        if len(master) >= len(image_bytes) and len(image_bytes) <= self.max_bytes \
+                and max(image.size) <= self.max_dimension:
+            return ArchivedPhoto(image_bytes, thumbnail, 'image/jpeg', 'jpg', len(image_bytes))
+
+        return ArchivedPhoto(master, thumbnail, mime_type, extension, len(image_bytes))
@@ -0,0 +1,256 @@
+from datetime import datetime, date, time as dt_time
+from pathlib import Path
+import csv
+import logging
+import time
+import unicodedata
+import uuid
+from utils.ocr_processor import OCRProcessor
+from utils.records import Registro
+
+logger = logging.getLogger(__name__)
+
+# Formatos de fecha aceptados en registros históricos
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')
+
+# Columna de la hoja -> clave de client_data
+CLIENT_FIELDS = {
+    'Fecha': 'fecha',
+    'Hora Ingreso': 'hora_ingreso',
+    'Hora Salida Estimada': 'hora_salida_estimada',
+    'Habitación': 'habitacion',
+    'DNI': 'dni',
+    'Nombre': 'nombre',
+    'Nacionalidad': 'nacionalidad',
+    'Duración': 'duracion',
+    'Precio': 'precio',
+    'Forma de Pago': 'forma_pago',
+    'Observaciones': 'observaciones',
+    'Registrado por': 'registrado_por',
+    'Hora Salida Real': 'hora_salida_real',
+    'Foto DNI': 'foto_url',
+}
+
+
+def _normalize_header(value):
+    """'Habitación ' -> 'habitacion' (sin tildes ni mayúsculas)"""
+    text = unicodedata.normalize('NFKD', str(value or '').strip().lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+HEADER_ALIASES = {_normalize_header(column): column for column in CLIENT_FIELDS}
+
+
+class BulkImporter:
+    """Importación masiva de registros históricos desde CSV o XLSX.
+
+    Valida cada fila con la misma limpieza que los datos del OCR, descarta los
+    duplicados (mismo DNI y fecha) y guarda los registros por bloques en el
+    almacén local, con un punto de control por bloque para poder reanudar.
+    La réplica en Google Sheets se hace con append_rows por bloques.
+    """
+
+    def __init__(self, sheets_manager, chunk_rows=5000, registered_by='importación'):
+        self.sheets_manager = sheets_manager
+        self.chunk_rows = chunk_rows
+        self.registered_by = registered_by
+        self.validator = OCRProcessor()  # Solo se usa la validación (no crea cliente de OpenAI)
+
+    # ------------------------------------------------------------------
+    # Lectura del archivo
+    # ------------------------------------------------------------------
+
+    def read_rows(self, path, sheet=None):
+        """Generar (número de fila, {columna: valor}) desde un CSV o XLSX"""
+        path = Path(path)
+        if path.suffix.lower() in ('.xlsx', '.xlsm'):
+            rows = self._read_xlsx(path, sheet)
+        else:
+            rows = self._read_csv(path)
+
+        header = next(rows, None)
+        if not header:
+            return
+
+        columns = [HEADER_ALIASES.get(_normalize_header(value)) for value in header]
+        if 'Fecha' not in columns or 'DNI' not in columns:
+            raise ValueError("El archivo debe tener al menos las columnas Fecha y DNI")
+
+        for line, row in enumerate(rows, start=2):
+            values = {
+                column: value for column, value in zip(columns, row)
+                if column and value not in (None, '')
+            }
+            if values:
+                yield line, values
+
+    @staticmethod
+    def _read_csv(path):
+        # utf-8-sig: los CSV exportados desde Excel suelen traer BOM
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            yield from csv.reader(f, dialect)
+
+    @staticmethod
+    def _read_xlsx(path, sheet=None):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportError("Para importar archivos .xlsx instala openpyxl: pip install -r requirements-opcional.txt")
+
+        # read_only recorre la hoja sin cargarla completa en memoria
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet else workbook.active
+            yield from worksheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    # ------------------------------------------------------------------
+    # Validación
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _parse_date(value):
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+
+        text = str(value).strip()[:10]
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).date().isoformat()
+            except ValueError:
+                continue
+        return None
+
+    @staticmethod
+    def _format_time(value):
+        if isinstance(value, (datetime, dt_time)):
+            return value.strftime('%H:%M')
+        return str(value).strip()
+
+    def to_registro(self, values):
+        """Convertir una fila del archivo en Registro; devuelve (registro, motivo de rechazo)"""
+        fecha = self._parse_date(values.get('Fecha', ''))
+        if not fecha:
+            return None, f"fecha no válida: {values.get('Fecha', '')!r}"
+
+        # Misma limpieza que los datos extraídos por OCR
+        cleaned = self.validator._validate_and_clean_data({
+            'nombre': str(values.get('Nombre', '')),
+            'dni': str(values.get('DNI', '')),
+            'nacionalidad': str(values.get('Nacionalidad', '')),
+        })
+        if not cleaned['dni']:
+            return None, f"DNI no válido: {values.get('DNI', '')!r}"
+
+        client_data = {CLIENT_FIELDS[column]: value for column, value in values.items()}
+        client_data.update(
+            fecha=fecha,
+            dni=cleaned['dni'],
+            nombre=cleaned['nombre'] or '',
+            nacionalidad=cleaned['nacionalidad'] or '',
+            registrado_por=values.get('Registrado por') or self.registered_by,
+            # Clave propia para reconocer la fila en Sheets si el envío falla a medias
+            id_registro=uuid.uuid4().hex,
+        )
+        for key in ('hora_ingreso', 'hora_salida_estimada', 'hora_salida_real'):
+            if key in client_data:
+                client_data[key] = self._format_time(client_data[key])
+
+        registro = Registro.from_client_data(client_data)
+        if registro is None:
+            return None, f"fecha no válida: {fecha!r}"
+        return registro, None
+
+    # ------------------------------------------------------------------
+    # Importación
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def checkpoint_key(path):
+        """Clave del punto de control: ruta y tamaño del archivo"""
+        path = Path(path).resolve()
+        return f"importacion:{path}:{path.stat().st_size}"
+
+    def run(self, path, sheet=None, rejects_path=None):
+        """Importar un archivo; devuelve las estadísticas de la carga"""
+        store = self.sheets_manager.store
+        key = self.checkpoint_key(path)
+        resume_after = int(store.get_state(key) or 0)
+        if resume_after:
+            logger.info(f"Reanudando importación de {path} después de la fila {resume_after}")
+
+        stats = {
+            'read': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0,
+            'resumed_after': resume_after, 'seconds': 0.0, 'rows_per_second': 0.0
+        }
+        seen = set()  # Pares (dni, día) ya vistos en este archivo
+        chunk, last_line = [], resume_after
+        rejects = open(rejects_path, 'w', encoding='utf-8', newline='') if rejects_path else None
+        reject_writer = csv.writer(rejects) if rejects else None
+        started = time.perf_counter()
+
+        def flush():
+            # Descartar lo que ya existe (Sheets importado o cargas anteriores)
+            existing = store.existing_keys({(r.dni, r.dia) for r in chunk})
+            new = [r for r in chunk if (r.dni, r.dia) not in existing]
+            stats['duplicates'] += len(chunk) - len(new)
+            self.sheets_manager.save_records(new, checkpoint=(key, str(last_line)))
+            stats['imported'] += len(new)
+            logger.info(f"Importación: {stats['imported']} registros guardados (fila {last_line})")
+
+        try:
+            for line, values in self.read_rows(path, sheet):
+                if line <= resume_after:
+                    continue
+                stats['read'] += 1
+                last_line = line
+
+                registro, reason = self.to_registro(values)
+                if registro is None:
+                    stats['rejected'] += 1
+                    if reject_writer:
+                        reject_writer.writerow([line, reason])
+                    continue
+
+                dedupe_key = (registro.dni, registro.dia)
+                if dedupe_key in seen:
+                    stats['duplicates'] += 1
+                    continue
+                seen.add(dedupe_key)
+                chunk.append(registro)
+
+                if len(chunk) >= self.chunk_rows:
+                    flush()
+                    chunk = []
+
+            flush()
+        finally:
+            if rejects:
+                rejects.close()
+
+        stats['seconds'] = time.perf_counter() - started
+        if stats['seconds']:
+            stats['rows_per_second'] = stats['read'] / stats['seconds']
+        return stats
+
+    def wait_for_replication(self, poll_seconds=1.0):
+        """Esperar a que el almacén local quede replicado en Sheets; devuelve los segundos de espera"""
+        store = self.sheets_manager.store
+        started = time.perf_counter()
+
+        while store.pending_count():
+            if not self.sheets_manager.sync_with_sheets():
+                raise RuntimeError("Otro proceso replica la base local; la réplica queda a su cargo")
+            if store.pending_count():
+                time.sleep(poll_seconds)
+
+        return time.perf_counter() - started
@@ -1,16 +1,103 @@
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload, build_http
+from google.auth.exceptions import TransportError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import httplib2
 import io
+import itertools
+import json
 import logging
+import re
+import socket
+import threading
+import time
 from pathlib import Path
 from config import Config
+from utils.archival import ArchivalEncoder
+from utils.photo_index import PhotoIndex
+from utils.properties import Property
 
 logger = logging.getLogger(__name__)
 
+# Peticiones por llamada en lote (límite de la API de Drive)
+BATCH_MAX_REQUESTS = 100
+
+# Candados por hash: la misma foto no se sube dos veces aunque llegue a la vez
+HASH_LOCK_STRIPES = 64
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Campos mínimos por página al listar fotos (y al sincronizar el índice local)
+PHOTO_LIST_FIELDS = 'nextPageToken,files(id,name,createdTime,webViewLink,size)'
+PHOTO_SYNC_FIELDS = 'nextPageToken,files(id,name,createdTime,webViewLink,size,appProperties)'
+PAGE_SIZE = 1000
+
+# Errores pasajeros de la API (cuota, Drive sobrecargado): la subida se reintenta.
+# Drive también responde 403 con estos motivos cuando se excede la cuota
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ('ratelimitexceeded', 'userratelimitexceeded')
+
+# DNI en el nombre de las fotos subidas antes de guardarlo en appProperties
+_DNI_IN_NAME_RE = re.compile(r'^DNI_([^_]+)_')
+
+
+class _CountingHttp:
+    """Envoltorio de la conexión HTTP que cuenta cada petición a la API"""
+    
+    def __init__(self, http, on_request):
+        self.http = http
+        self.on_request = on_request
+    
+    def request(self, *args, **kwargs):
+        self.on_request()
+        return self.http.request(*args, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+class _SharedCredentials:
+    """Credencial OAuth compartida por las conexiones de todos los hilos.
+    
+    AuthorizedHttp la renueva antes de una petición si venció, o tras un 401;
+    el candado evita que varios hilos la renueven (y guarden el token) a la vez.
+    """
+    
+    def __init__(self, credentials, on_refresh):
+        self.credentials = credentials
+        self.on_refresh = on_refresh
+        self._lock = threading.Lock()
+    
+    def _refresh(self, request, stale_token):
+        with self._lock:
+            # Otro hilo pudo renovarla mientras se esperaba el candado
+            if self.credentials.token != stale_token and self.credentials.valid:
+                return
+            self.credentials.refresh(request)
+            logger.info("Token de Google Drive renovado exitosamente")
+            self.on_refresh()
+    
+    def before_request(self, request, method, url, headers):
+        if not self.credentials.valid:
+            self._refresh(request, self.credentials.token)
+        self.credentials.apply(headers)
+    
+    def refresh(self, request):
+        self._refresh(request, self.credentials.token)
+    
+    def __getattr__(self, name):
+        return getattr(self.credentials, name)
+
+
 class DriveManager:
     """Manejador para Google Drive usando OAuth authentication"""
     
@@ -20,14 +107,54 @@ class DriveManager:
         'https://www.googleapis.com/auth/drive'
     ]
     
-    def __init__(self):
-        self.service = None
+    def __init__(self, hotel=None, http=None):
+        self.hotel = hotel or Property.default()
+        self.folder_id = self.hotel.drive_folder_id  # Carpeta de fotos de la propiedad
+        # Conexión HTTP ya autorizada, o una función que crea una por hilo
+        # (en memoria para pruebas: utils/fake_drive.py)
+        self._http = http
+        self._discovery_doc = None
+        self._service_lock = threading.Lock()
+        self._shared_credentials = None
+        self.credentials = None
         self.credentials_file = Path(Config.GOOGLE_OAUTH_CREDENTIALS)
         self.token_file = Path("credentials/token.json")  # Token para OAuth
-        self._authenticate()
+        
+        # Peticiones HTTP por operación (subida, permisos, ...) y fotos subidas
+        self._metrics_lock = threading.Lock()
+        self._local = threading.local()
+        self.requests = {}
+        self.uploads = 0
+        self.reused = 0
+        
+        # Fotos ya subidas por contenido (SHA-256 -> archivo)
+        self.index = PhotoIndex(self.hotel.photo_index_path)
+        self._hash_locks = [threading.Lock() for _ in range(HASH_LOCK_STRIPES)]
+        
+        # Copia de archivo (tamaño acotado) y miniatura de cada foto nueva
+        self.encoder = ArchivalEncoder()
+        
+        # Carpetas AAAA/MM/DD ya conocidas (ruta -> ID); en disco en el índice de fotos
+        self._folders = {}
+        self._folder_lock = threading.Lock()
+        
+        if self._http is None:
+            self._authenticate()
+    
+    @property
+    def service(self):
+        """Servicio de Google Drive de este hilo, creado en su primer uso.
+        
+        httplib2 no admite peticiones simultáneas en una misma conexión: cada
+        hilo tiene la suya, y todas comparten la misma credencial.
+        """
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = self._build_service()
+        return service
     
     def _authenticate(self):
-        """Autenticación con Google Drive usando OAuth"""
+        """Cargar las credenciales OAuth; la renovación del token se hace en el primer uso"""
         try:
             creds = None
             
@@ -38,119 +165,364 @@ class DriveManager:
                 except Exception as e:
                     logger.warning(f"No se pudo cargar token existente: {e}")
             
-            # If no valid credentials, authenticate
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    try:
-                        creds.refresh(Request())
-                        logger.info("Token de Google Drive renovado exitosamente")
-                    except Exception as e:
-                        logger.warning(f"No se pudo renovar token: {e}")
-                        creds = None
-                
-                if not creds:
-                    if not self.credentials_file.exists():
-                        logger.error(f"Archivo de credenciales no encontrado: {self.credentials_file}")
-                        raise FileNotFoundError("Archivo credentials.json no encontrado")
-                    
-                    try:
-                        flow = InstalledAppFlow.from_client_secrets_file(
-                            str(self.credentials_file), self.SCOPES)
-                        creds = flow.run_local_server(port=0)
-                        logger.info("Autenticación OAuth completada exitosamente")
-                    except Exception as e:
-                        logger.error(f"Fallo en autenticación OAuth: {e}")
-                        raise
-                
-                # Save the credentials for next run
-                try:
-                    # Crear directorio credentials si no existe
-                    self.token_file.parent.mkdir(exist_ok=True)
-                    
-                    with open(self.token_file, 'w') as token:
-                        token.write(creds.to_json())
-                    logger.info(f"Token guardado in: {self.token_file}")
-                except Exception as e:
-                    logger.warning(f"No se pudo guardar token: {e}")
+            # Un token vencido con refresh_token se renueva al crear el servicio
+            if creds and (creds.valid or (creds.expired and creds.refresh_token)):
+                self.credentials = creds
+                logger.info("Credenciales de Google Drive cargadas")
+                return
+            
+            if not self.credentials_file.exists():
+                logger.error(f"Archivo de credenciales no encontrado: {self.credentials_file}")
+                raise FileNotFoundError("Archivo credentials.json no encontrado")
             
-            # Crear servicio de Google Drive
-            self.service = build('drive', 'v3', credentials=creds)
+            try:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    str(self.credentials_file), self.SCOPES)
+                creds = flow.run_local_server(port=0)
+                logger.info("Autenticación OAuth completada exitosamente")
+            except Exception as e:
+                logger.error(f"Fallo en autenticación OAuth: {e}")
+                raise
             
-            logger.info("Autenticación con Google Drive exitosa")
+            self.credentials = creds
+            self._save_token()
             
         except Exception as e:
             logger.error(f"Error al autenticar con Google Drive: {str(e)}")
             raise
     
-    def upload_dni_photo(self, image_bytes, dni, client_name=None):
-        """Subir foto de DNI a Google Drive"""
+    def _save_token(self):
+        """Guardar el token para la próxima ejecución"""
         try:
-            # Crear nombre único para el archivo
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"DNI_{dni}_{timestamp}.jpg"
-            
-            if client_name:
-                # Limpiar nombre del cliente para usar en el archivo
-                clean_name = ''.join(c for c in client_name if c.isalnum() or c in (' ', '-', '_')).strip()
-                filename = f"DNI_{dni}_{clean_name}_{timestamp}.jpg"
-            
-            # Crear objeto de archivo
-            media = MediaIoBaseUpload(
-                io.BytesIO(image_bytes),
-                mimetype='image/jpeg',
-                resumable=True
-            )
-            
-            # Metadatos del archivo
-            file_metadata = {
-                'name': filename,
-                'parents': [Config.GOOGLE_DRIVE_FOLDER_ID]
-            }
-            
-            # Subir archivo
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id,name,webViewLink,webContentLink'
-            ).execute()
-            
-            # Hacer el archivo público (opcional)
-            self._make_file_public(file['id'])
+            # Crear directorio credentials si no existe
+            self.token_file.parent.mkdir(exist_ok=True)
             
-            logger.info(f"Foto de DNI subida exitosamente: {filename}")
-            
-            return {
-                'file_id': file['id'],
-                'filename': filename,
-                'web_view_link': file['webViewLink'],
-                'web_content_link': file['webContentLink']
-            }
+            with open(self.token_file, 'w') as token:
+                token.write(self.credentials.to_json())
+            logger.info(f"Token guardado in: {self.token_file}")
+        except Exception as e:
+            logger.warning(f"No se pudo guardar token: {e}")
+    
+    def _new_http(self):
+        """Conexión HTTP autorizada para un hilo"""
+        if self._http is not None:
+            return self._http() if callable(self._http) and not hasattr(self._http, 'request') else self._http
+        
+        with self._service_lock:
+            if self._shared_credentials is None:
+                # Renovar una sola vez al empezar; después, cada conexión
+                # renueva la credencial compartida cuando vence
+                creds = self.credentials
+                if not creds.valid and creds.refresh_token:
+                    try:
+                        creds.refresh(Request())
+                        logger.info("Token de Google Drive renovado exitosamente")
+                        self._save_token()
+                    except Exception as e:
+                        logger.error(f"No se pudo renovar token de Google Drive: {e}")
+                        raise
+                self._shared_credentials = _SharedCredentials(creds, self._save_token)
+        
+        return AuthorizedHttp(self._shared_credentials, http=build_http())
+    
+    def _build_service(self):
+        """Crear el cliente de la API de Drive para el hilo actual"""
+        http = self._new_http()
+        
+        # El documento de descubrimiento de Drive v3 viene incluido en
+        # google-api-python-client: se lee de disco una sola vez
+        if self._discovery_doc is None:
+            self._discovery_doc = json.loads(get_static_doc('drive', 'v3'))
+        
+        service = build_from_document(
+            self._discovery_doc,
+            http=_CountingHttp(http, self._count_request)
+        )
+        
+        logger.debug(f"Cliente de Google Drive creado para el hilo {threading.current_thread().name}")
+        return service
+    
+    # ------------------------------------------------------------------
+    # Métricas de peticiones
+    # ------------------------------------------------------------------
+    
+    @contextmanager
+    def _operation(self, name):
+        """Atribuir a una operación las peticiones HTTP hechas en este hilo"""
+        previous = getattr(self._local, 'operation', None)
+        self._local.operation = name
+        try:
+            yield
+        finally:
+            self._local.operation = previous
+    
+    def _count_request(self):
+        operation = getattr(self._local, 'operation', None) or 'otras'
+        with self._metrics_lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+    
+    def get_api_metrics(self):
+        """Peticiones HTTP a Drive por operación y promedio por foto subida"""
+        with self._metrics_lock:
+            requests = dict(self.requests)
+            uploads = self.uploads
+            reused = self.reused
+        
+        per_upload = requests.get('subida', 0) + requests.get('permisos', 0)
+        return {
+            'requests': requests,
+            'uploads': uploads,
+            'reused': reused,
+            'requests_per_upload': per_upload / uploads if uploads else 0.0
+        }
+    
+    # ------------------------------------------------------------------
+    # Fotos de DNI
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def is_transient_error(error):
+        """Si un error de Drive es pasajero (sin red, 429, 5xx) y la operación puede reintentarse"""
+        if isinstance(error, HttpError):
+            if error.resp.status in TRANSIENT_STATUS:
+                return True
+            content = (error.content or b'').decode('utf-8', errors='ignore').lower()
+            return error.resp.status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)
+        # Sin conexión, DNS o tiempo de espera agotado (no cualquier OSError:
+        # Pillow también lo usa para una imagen que no puede leer)
+        return isinstance(error, (
+            httplib2.HttpLib2Error, TransportError, ConnectionError, TimeoutError,
+            socket.timeout, socket.gaierror
+        ))
+    
+    def upload_dni_photo(self, image_bytes, dni, client_name=None, raise_errors=False):
+        """Subir foto de DNI a Google Drive (si el mismo contenido ya se subió, se reutiliza).
+        
+        Si la subida falla devuelve None, o con raise_errors=True propaga el
+        error para distinguir los pasajeros (is_transient_error) de los demás.
+        """
+        try:
+            # Una foto reenviada o de un cliente que vuelve a registrarse no se sube otra vez
+            digest = hashlib.sha256(image_bytes).hexdigest()
+            with self._hash_locks[int(digest[:8], 16) % HASH_LOCK_STRIPES]:
+                existing = self.index.find_by_hash(digest)
+                if existing:
+                    with self._metrics_lock:
+                        self.reused += 1
+                    # El plazo de conservación vuelve a contar desde este uso
+                    self.index.touch(existing['file_id'], datetime.now().strftime('%Y-%m-%d'))
+                    logger.info(f"Foto de DNI ya subida, se reutiliza: {existing['nombre']}")
+                    return {
+                        'file_id': existing['file_id'],
+                        'filename': existing['nombre'],
+                        'web_view_link': existing['web_view_link'],
+                        'web_content_link': existing['web_content_link'],
+                        'sha256': digest,
+                        'reused': True
+                    }
+                
+                return self._upload_new_photo(image_bytes, digest, dni, client_name)
             
         except Exception as e:
             logger.error(f"Error al subir foto de DNI: {str(e)}")
+            if raise_errors:
+                raise
             return None
     
-    def _make_file_public(self, file_id):
-        """Hacer el archivo público para que sea accesible"""
-        try:
-            permission = {
-                'type': 'anyone',
-                'role': 'reader'
+    def _upload_new_photo(self, image_bytes, digest, dni, client_name):
+        """Subir una foto que no está en Drive y registrarla en el índice local"""
+        # Recodificar para archivo (se ejecuta en el hilo de la cola de subida);
+        # el hash sigue siendo el de la foto recibida para reconocer reenvíos
+        archived = self.encoder.encode(image_bytes)
+        
+        # Crear nombre único para el archivo
+        now = datetime.now()
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+        filename = f"DNI_{dni}_{timestamp}.{archived.extension}"
+        
+        if client_name:
+            # Limpiar nombre del cliente para usar en el archivo
+            clean_name = ''.join(c for c in client_name if c.isalnum() or c in (' ', '-', '_')).strip()
+            filename = f"DNI_{dni}_{clean_name}_{timestamp}.{archived.extension}"
+        
+        # Metadatos del archivo; hash, DNI y fecha quedan en appProperties
+        # (visibles solo para esta app) para reconstruir el índice local
+        file_metadata = {
+            'name': filename,
+            'appProperties': {'sha256': digest, 'dni': str(dni), 'fecha': now.strftime('%Y-%m-%d')}
+        }
+        if archived.thumbnail:
+            # La miniatura viaja con la subida: Drive la muestra sin generarla
+            file_metadata['contentHints'] = {
+                'thumbnail': {
+                    'image': base64.urlsafe_b64encode(archived.thumbnail).decode('ascii'),
+                    'mimeType': 'image/jpeg'
+                }
             }
-            
-            self.service.permissions().create(
-                fileId=file_id,
-                body=permission
+        
+        # Subir archivo a la carpeta del día (AAAA/MM/DD)
+        folder_id = self.get_partition_folder(now)
+        try:
+            file = self._create_photo(archived, file_metadata, folder_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # La carpeta del día se borró en Drive: olvidarla y crearla de nuevo
+            self.forget_partition(now)
+            folder_id = self.get_partition_folder(now)
+            file = self._create_photo(archived, file_metadata, folder_id)
+        
+        with self._metrics_lock:
+            self.uploads += 1
+        
+        # Por defecto la foto hereda el acceso de la carpeta (compartida con el
+        # personal); en modo 'archivo' cada foto se publica con su enlace
+        if Config.DRIVE_SHARE_MODE == 'archivo':
+            self.share_files([file['id']])
+        
+        self.index.record_storage(
+            now.strftime('%Y-%m-%d'), folder_id, subidos=len(archived.master), fotos_subidas=1
+        )
+        self.index.add(
+            file['id'], digest, filename,
+            file['webViewLink'], file.get('webContentLink'), len(archived.master),
+            tamano_original=archived.original_size, miniatura=archived.thumbnail,
+            dni=str(dni), fecha=now.strftime('%Y-%m-%d'), carpeta=folder_id
+        )
+        logger.info(
+            f"Foto de DNI subida exitosamente: {filename} "
+            f"({archived.original_size // 1024} KB -> {len(archived.master) // 1024} KB)"
+        )
+        
+        return {
+            'file_id': file['id'],
+            'filename': filename,
+            'web_view_link': file['webViewLink'],
+            'web_content_link': file.get('webContentLink'),
+            'sha256': digest,
+            'size': len(archived.master),
+            'original_size': archived.original_size,
+            'reused': False
+        }
+    
+    def _create_photo(self, archived, file_metadata, folder_id):
+        # Las fotos pequeñas van en una sola petición multipart; la subida
+        # reanudable (una petición más para abrir la sesión) solo para las grandes
+        media = MediaIoBaseUpload(
+            io.BytesIO(archived.master),
+            mimetype=archived.mime_type,
+            resumable=len(archived.master) > Config.DRIVE_MULTIPART_MAX_BYTES
+        )
+        
+        with self._operation('subida'):
+            return self.service.files().create(
+                body=dict(file_metadata, parents=[folder_id]),
+                media_body=media,
+                fields='id,name,webViewLink,webContentLink'
             ).execute()
+    
+    @staticmethod
+    def partition_path(day):
+        """Ruta de la carpeta de un día dentro de la carpeta de la propiedad (AAAA/MM/DD)"""
+        return day.strftime('%Y/%m/%d')
+    
+    def get_partition_folder(self, day=None, create=True):
+        """ID de la carpeta AAAA/MM/DD de un día (por defecto hoy).
+        
+        Cada nivel se busca primero en memoria, luego en el índice local y luego
+        en Drive; si no existe se crea (con create=False se devuelve None).
+        """
+        parts = self.partition_path(day or datetime.now()).split('/')
+        
+        with self._folder_lock:
+            parent = self.folder_id
+            for depth in range(1, len(parts) + 1):
+                path = '/'.join(parts[:depth])
+                folder_id = self._folders.get(path) or self.index.get_folder(self.folder_id, path)
+                
+                if folder_id is None:
+                    folder_id = self._find_folder(parts[depth - 1], parent)
+                    if folder_id is None:
+                        if not create:
+                            return None
+                        folder_id = self.create_backup_folder(parts[depth - 1], parent_id=parent)
+                        if folder_id is None:
+                            raise RuntimeError(f"No se pudo crear la carpeta {path} en Google Drive")
+                    self.index.add_folder(self.folder_id, path, folder_id)
+                
+                self._folders[path] = folder_id
+                parent = folder_id
             
-        except Exception as e:
-            logger.warning(f"No se pudo hacer público el archivo: {str(e)}")
+            return parent
+    
+    def forget_partition(self, day):
+        """Olvidar las carpetas de un día (y su mes y año) de la caché en memoria y en disco"""
+        parts = self.partition_path(day).split('/')
+        paths = ['/'.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+        with self._folder_lock:
+            for path in paths:
+                self._folders.pop(path, None)
+            self.index.remove_folders(self.folder_id, paths)
+    
+    def _find_folder(self, name, parent_id):
+        """ID de una carpeta existente en Drive con ese nombre dentro de parent_id, o None"""
+        with self._operation('carpetas'):
+            results = self.service.files().list(
+                q=(f"name = '{name}' and '{parent_id}' in parents "
+                   f"and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"),
+                pageSize=1,
+                fields='files(id)'
+            ).execute()
+        files = results.get('files', [])
+        return files[0]['id'] if files else None
+    
+    def get_thumbnail(self, file_id):
+        """Miniatura JPEG de una foto subida, para vistas previas en el chat (o None)"""
+        return self.index.get_thumbnail(file_id)
+    
+    def get_storage_savings(self, day=None):
+        """Ahorro de almacenamiento del archivado en las fotos subidas un día (por defecto hoy)"""
+        return self.index.storage_savings(day)
+    
+    def share_files(self, file_ids):
+        """Hacer públicos (lector con enlace) varios archivos con peticiones en lote.
+        
+        Hasta BATCH_MAX_REQUESTS permisos por petición HTTP. Devuelve cuántos
+        archivos quedaron compartidos.
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        shared = []
+        
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.warning(f"No se pudo hacer público el archivo {request_id}: {str(exception)}")
+            else:
+                shared.append(request_id)
+        
+        with self._operation('permisos'):
+            for start in range(0, len(file_ids), BATCH_MAX_REQUESTS):
+                try:
+                    batch = self.service.new_batch_http_request(callback=on_response)
+                    for file_id in file_ids[start:start + BATCH_MAX_REQUESTS]:
+                        batch.add(
+                            self.service.permissions().create(
+                                fileId=file_id,
+                                body={'type': 'anyone', 'role': 'reader'},
+                                fields='id'
+                            ),
+                            request_id=file_id
+                        )
+                    batch.execute()
+                except Exception as e:
+                    logger.warning(f"No se pudieron hacer públicos los archivos: {str(e)}")
+        
+        return len(shared)
     
     def get_folder_info(self):
         """Obtener información de la carpeta de almacenamiento"""
         try:
             folder = self.service.files().get(
-                fileId=Config.GOOGLE_DRIVE_FOLDER_ID,
+                fileId=self.folder_id,
                 fields='name,id,webViewLink'
             ).execute()
             
@@ -160,30 +532,159 @@ class DriveManager:
             logger.error(f"Error al obtener información de la carpeta: {str(e)}")
             return None
     
-    def list_dni_photos(self, limit=50):
-        """Listar fotos de DNI almacenadas"""
+    def _iter_files(self, query, fields, page_size=PAGE_SIZE, operation='listado'):
+        """Recorrer todas las páginas de un listado de Drive, archivo por archivo"""
+        page_token = None
+        while True:
+            with self._operation(operation):
+                results = self.service.files().list(
+                    q=query,
+                    pageSize=page_size,
+                    pageToken=page_token,
+                    fields=fields
+                ).execute()
+            
+            yield from results.get('files', [])
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+    
+    def iter_dni_photos(self, day=None, fields=PHOTO_LIST_FIELDS, page_size=PAGE_SIZE):
+        """Fotos de DNI de un día (o de la carpeta principal), siguiendo todas las páginas"""
+        folder_id = self.folder_id
+        if day is not None:
+            folder_id = self.get_partition_folder(day, create=False)
+            if folder_id is None:
+                return
+        
+        yield from self._iter_files(
+            f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false",
+            fields, page_size
+        )
+    
+    def list_dni_photos(self, limit=50, day=None):
+        """Listar fotos de DNI almacenadas (las de un día, o las de la carpeta principal)"""
         try:
-            # Buscar archivos en la carpeta
-            query = f"'{Config.GOOGLE_DRIVE_FOLDER_ID}' in parents and mimeType contains 'image/'"
-            
-            results = self.service.files().list(
-                q=query,
-                pageSize=limit,
-                fields="files(id,name,createdTime,webViewLink,size)"
-            ).execute()
-            
-            files = results.get('files', [])
-            
-            return files
+            photos = self.iter_dni_photos(day, page_size=min(limit, PAGE_SIZE))
+            return list(itertools.islice(photos, limit))
             
         except Exception as e:
             logger.error(f"Error al listar fotos de DNI: {str(e)}")
             return []
     
+    def iter_partitions(self, since=None):
+        """Carpetas de día existentes en Drive como (fecha, ID), desde since si se indica"""
+        def subfolders(parent_id):
+            children = self._iter_files(
+                f"'{parent_id}' in parents and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
+                'nextPageToken,files(id,name)', operation='carpetas'
+            )
+            return sorted((f['name'], f['id']) for f in children if f['name'].isdigit())
+        
+        for year, year_id in subfolders(self.folder_id):
+            if since and int(year) < since.year:
+                continue
+            for month, month_id in subfolders(year_id):
+                if since and (int(year), int(month)) < (since.year, since.month):
+                    continue
+                for day, day_id in subfolders(month_id):
+                    try:
+                        date = datetime(int(year), int(month), int(day)).date()
+                    except ValueError:
+                        continue
+                    if since and date < since:
+                        continue
+                    
+                    path = self.partition_path(date)
+                    with self._folder_lock:
+                        if self._folders.get(path) != day_id:
+                            self._folders[path] = day_id
+                            self.index.add_folder(self.folder_id, path, day_id)
+                    yield date, day_id
+    
+    def _listed_photo(self, file):
+        """Datos del índice local para una foto listada en Drive"""
+        app_properties = file.get('appProperties') or {}
+        dni = app_properties.get('dni')
+        if dni is None:
+            match = _DNI_IN_NAME_RE.match(file.get('name', ''))
+            dni = match.group(1) if match else None
+        created = file.get('createdTime', '')
+        if created:
+            # Drive informa createdTime en UTC; el índice guarda la hora local
+            # como las fotos subidas por el bot
+            created = datetime.fromisoformat(created.replace('Z', '+00:00')) \
+                .astimezone().replace(tzinfo=None).isoformat(timespec='seconds')
+        return {
+            'file_id': file['id'],
+            'sha256': app_properties.get('sha256'),
+            'nombre': file.get('name'),
+            'web_view_link': file.get('webViewLink'),
+            'tamano': int(file.get('size', 0)),
+            'creado': created[:19] or None,
+            'dni': dni,
+            'fecha': app_properties.get('fecha') or created[:10] or None,
+        }
+    
+    def sync_index(self, full=False):
+        """Poner al día el índice local (DNI, fecha -> foto) con lo que hay en Drive.
+        
+        Es incremental: solo recorre las carpetas de día desde la última
+        sincronización (incluida, porque pudo recibir más fotos). Con full=True
+        recorre todas, más las fotos sueltas de la carpeta principal.
+        Devuelve {'carpetas', 'agregadas', 'eliminadas'}.
+        """
+        state_key = f"sincronizado:{self.folder_id}"
+        last = self.index.get_state(state_key)
+        since = None if full or last is None else datetime.strptime(last, '%Y-%m-%d').date()
+        today = datetime.now().date()
+        summary = {'carpetas': 0, 'agregadas': 0, 'eliminadas': 0}
+        
+        try:
+            folders = list(self.iter_partitions(since))
+            if since is None:
+                folders.append((None, self.folder_id))
+            
+            for _, folder_id in folders:
+                # Listado completo antes de tocar el índice: un fallo a mitad no borra nada
+                listed_at = datetime.now().isoformat(timespec='seconds')
+                photos = [
+                    self._listed_photo(f) for f in self._iter_files(
+                        f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false",
+                        PHOTO_SYNC_FIELDS
+                    )
+                ]
+                added, removed = self.index.merge_listed(folder_id, photos, listed_at)
+                summary['carpetas'] += 1
+                summary['agregadas'] += added
+                summary['eliminadas'] += removed
+            
+            self.index.set_state(state_key, today.isoformat())
+            logger.info(
+                f"Índice de fotos sincronizado: {summary['carpetas']} carpetas, "
+                f"{summary['agregadas']} agregadas, {summary['eliminadas']} eliminadas"
+            )
+            
+        except Exception as e:
+            logger.error(f"Error al sincronizar índice de fotos: {str(e)}")
+        
+        return summary
+    
+    def find_dni_photos(self, dni, day=None):
+        """Fotos de un cliente por DNI (y día), desde el índice local, sin consultar Drive"""
+        return self.index.find_by_dni(str(dni), day.strftime('%Y-%m-%d') if day else None)
+    
     def delete_dni_photo(self, file_id):
         """Eliminar foto de DNI"""
         try:
+            photo = self.index.get(file_id) or {}
             self.service.files().delete(fileId=file_id).execute()
+            self.index.record_storage(
+                datetime.now().strftime('%Y-%m-%d'), photo.get('carpeta'),
+                eliminados=photo.get('tamano') or 0, fotos_eliminadas=1
+            )
+            self.index.remove(file_id)
             logger.info(f"Foto de DNI eliminada: {file_id}")
             return True
             
@@ -191,19 +692,192 @@ class DriveManager:
             logger.error(f"Error al eliminar foto de DNI: {str(e)}")
             return False
     
-    def get_storage_usage(self):
-        """Obtener información de uso de almacenamiento"""
+    def _batch_delete(self, file_ids, per_second):
+        """Eliminar archivos con peticiones en lote, sin pasar de per_second eliminaciones por segundo.
+        
+        Devuelve (eliminados, fallidos) donde fallidos es {file_id: error}. Un
+        archivo que ya no existe (404) cuenta como eliminado.
+        """
+        deleted = []
+        failed = {}
+        
+        def on_response(request_id, response, exception):
+            if exception is None or (isinstance(exception, HttpError) and exception.resp.status == 404):
+                deleted.append(request_id)
+            else:
+                failed[request_id] = str(exception)
+        
+        with self._operation('eliminacion'):
+            for start in range(0, len(file_ids), BATCH_MAX_REQUESTS):
+                chunk = file_ids[start:start + BATCH_MAX_REQUESTS]
+                began = time.monotonic()
+                try:
+                    batch = self.service.new_batch_http_request(callback=on_response)
+                    for file_id in chunk:
+                        batch.add(self.service.files().delete(fileId=file_id), request_id=file_id)
+                    batch.execute()
+                except Exception as e:
+                    logger.warning(f"No se pudo eliminar un lote de archivos: {str(e)}")
+                    for file_id in chunk:
+                        if file_id not in deleted:
+                            failed.setdefault(file_id, str(e))
+                
+                # Cada elemento del lote cuenta para la cuota de Drive
+                if per_second and start + BATCH_MAX_REQUESTS < len(file_ids):
+                    wait = len(chunk) / per_second - (time.monotonic() - began)
+                    if wait > 0:
+                        time.sleep(wait)
+        
+        return deleted, failed
+    
+    def _folder_is_empty(self, folder_id):
+        """Confirmar en Drive que una carpeta no contiene ningún archivo, de cualquier tipo"""
+        with self._operation('listado'):
+            results = self.service.files().list(
+                q=f"'{folder_id}' in parents",
+                pageSize=1,
+                fields='files(id)'
+            ).execute()
+        return not results.get('files')
+    
+    def purge_expired(self, retention_days=None, dry_run=False, today=None):
+        """Eliminar de Drive las fotos de DNI vencidas según el plazo de conservación.
+        
+        Elige en el índice local las fotos sin uso hace más de retention_days
+        días (DRIVE_RETENTION_DAYS) y las elimina en lotes de hasta
+        BATCH_MAX_REQUESTS, a DRIVE_PURGE_PER_SECOND como máximo. Después
+        elimina las carpetas de día vencidas que quedaron vacías (confirmado
+        en Drive). Conviene llamar antes a sync_index(). Con
+        dry_run=True solo informa qué se eliminaría. Devuelve un informe.
+        """
+        retention_days = Config.DRIVE_RETENTION_DAYS if retention_days is None else retention_days
+        today = today or datetime.now().date()
+        cutoff = today - timedelta(days=retention_days)
+        report = {
+            'corte': cutoff.isoformat(),
+            'simulacion': dry_run,
+            'seleccionadas': 0,
+            'eliminadas': 0,
+            'fallidas': 0,
+            'bytes': 0,
+            'carpetas': 0,
+            'peticiones': 0,
+            'fotos': []
+        }
+        
+        if retention_days <= 0:
+            logger.warning("Purga de fotos omitida: DRIVE_RETENTION_DAYS no está configurado")
+            return report
+        
         try:
-            # Obtener información de la cuenta
+            expired = self.index.expired(cutoff.isoformat())
+            report['seleccionadas'] = len(expired)
+            if dry_run or not expired:
+                report['fotos'] = [dict(photo, estado='vencida') for photo in expired]
+                return report
+            
+            before = sum(self.get_api_metrics()['requests'].values())
+            deleted, failed = self._batch_delete(
+                [photo['file_id'] for photo in expired], Config.DRIVE_PURGE_PER_SECOND
+            )
+            self.index.remove_many(deleted)
+            
+            deleted = set(deleted)
+            freed = {}  # carpeta -> (bytes, fotos)
+            for photo in expired:
+                if photo['file_id'] in deleted:
+                    report['bytes'] += photo['tamano'] or 0
+                    report['fotos'].append(dict(photo, estado='eliminada'))
+                    size, count = freed.get(photo['carpeta'], (0, 0))
+                    freed[photo['carpeta']] = (size + (photo['tamano'] or 0), count + 1)
+                else:
+                    report['fotos'].append(dict(photo, estado=f"error: {failed.get(photo['file_id'])}"))
+            report['eliminadas'] = len(deleted)
+            report['fallidas'] = len(expired) - len(deleted)
+            for folder_id, (size, count) in freed.items():
+                self.index.record_storage(
+                    today.isoformat(), folder_id, eliminados=size, fotos_eliminadas=count
+                )
+            
+            # Carpetas de día vencidas sin fotos en el índice. Eliminar una carpeta
+            # elimina todo su contenido: el índice solo conoce las imágenes, así
+            # que antes se confirma en Drive que no tiene ningún archivo
+            empty = {}
+            for folder_id in {photo['carpeta'] for photo in expired if photo['carpeta']}:
+                path = self.index.folder_path(self.folder_id, folder_id)
+                if path and path.count('/') == 2 and path.replace('/', '-') < cutoff.isoformat() \
+                        and self.index.count_in_folder(folder_id) == 0:
+                    if self._folder_is_empty(folder_id):
+                        empty[folder_id] = path
+                    else:
+                        logger.warning(f"Carpeta {path} con archivos fuera del índice, se conserva")
+            if empty:
+                removed, _ = self._batch_delete(list(empty), Config.DRIVE_PURGE_PER_SECOND)
+                with self._folder_lock:
+                    for folder_id in removed:
+                        self._folders.pop(empty[folder_id], None)
+                    self.index.remove_folders(self.folder_id, [empty[i] for i in removed])
+                report['carpetas'] = len(removed)
+            
+            report['peticiones'] = sum(self.get_api_metrics()['requests'].values()) - before
+            logger.info(
+                f"Purga de fotos (antes del {report['corte']}): {report['eliminadas']} eliminadas, "
+                f"{report['fallidas']} con error, {report['carpetas']} carpetas, "
+                f"{report['peticiones']} peticiones"
+            )
+            
+        except Exception as e:
+            logger.error(f"Error al purgar fotos vencidas: {str(e)}")
+        
+        return report
+    
+    def reconcile_storage(self):
+        """Consultar la cuota real en Drive (about) y tomarla como base de la cuenta local"""
+        with self._operation('otras'):
             about = self.service.about().get(fields='storageQuota').execute()
+        
+        storage_quota = about.get('storageQuota', {})
+        snapshot = {
+            'limit': int(storage_quota.get('limit', 0)),
+            'usage': int(storage_quota.get('usage', 0)),
+            'usage_in_drive': int(storage_quota.get('usageInDrive', 0)),
+            'net': self.index.storage_net(),
+            'at': datetime.now().isoformat(timespec='seconds')
+        }
+        self.index.set_state(f"cuota:{self.folder_id}", json.dumps(snapshot))
+        logger.info(f"Uso de almacenamiento conciliado con Drive: {snapshot['usage'] / (1024 ** 3):.2f} GB")
+        return snapshot
+    
+    def _estimate_storage(self, snapshot):
+        """Uso estimado: el último valor de Drive más lo subido menos lo eliminado desde entonces"""
+        delta = self.index.storage_net() - snapshot['net']
+        return {
+            'limit': snapshot['limit'],
+            'usage': snapshot['usage'] + delta,
+            'usage_in_drive': snapshot['usage_in_drive'] + delta,
+            'conciliado': snapshot['at'],
+            'estimado': delta != 0
+        }
+    
+    def get_storage_usage(self, reconcile=True):
+        """Obtener información de uso de almacenamiento.
+        
+        Se calcula con la cuenta local de bytes subidos y eliminados; solo se
+        consulta la cuota en Drive si la última conciliación tiene más de
+        DRIVE_QUOTA_RECONCILE_HOURS (y reconcile=True).
+        """
+        try:
+            snapshot = self.index.get_state(f"cuota:{self.folder_id}")
+            snapshot = json.loads(snapshot) if snapshot else None
             
-            storage_quota = about.get('storageQuota', {})
+            stale = snapshot is None or datetime.now() - datetime.fromisoformat(snapshot['at']) \
+                >= timedelta(hours=Config.DRIVE_QUOTA_RECONCILE_HOURS)
+            if reconcile and stale:
+                snapshot = self.reconcile_storage()
+            if snapshot is None:
+                return {'limit': 0, 'usage': 0, 'usage_in_drive': 0, 'conciliado': None, 'estimado': True}
             
-            return {
-                'limit': int(storage_quota.get('limit', 0)),
-                'usage': int(storage_quota.get('usage', 0)),
-                'usage_in_drive': int(storage_quota.get('usageInDrive', 0))
-            }
+            return self._estimate_storage(snapshot)
             
         except Exception as e:
             logger.error(f"Error al obtener información de almacenamiento: {str(e)}")
@@ -213,19 +887,60 @@ class DriveManager:
                 'usage_in_drive': 0
             }
     
-    def create_backup_folder(self, folder_name):
-        """Crear carpeta de respaldo"""
+    def get_storage_trend(self, days=7, today=None):
+        """Crecimiento del almacenamiento por día, solo con la cuenta local (sin peticiones a Drive).
+        
+        Devuelve {'dias': [...], 'subidos', 'eliminados', 'neto', 'promedio_diario',
+        'uso', 'limite', 'conciliado', 'dias_hasta_lleno'}.
+        """
+        today = today or datetime.now().date()
+        since = today - timedelta(days=days - 1)
+        by_day = {row['fecha']: row for row in self.index.storage_by_day(since.isoformat())}
+        
+        rows = []
+        for offset in range(days):
+            day = (since + timedelta(days=offset)).isoformat()
+            row = by_day.get(day, {
+                'fecha': day, 'subidos': 0, 'eliminados': 0,
+                'fotos_subidas': 0, 'fotos_eliminadas': 0, 'carpetas': 0
+            })
+            rows.append(dict(row, neto=row['subidos'] - row['eliminados']))
+        
+        uploaded = sum(row['subidos'] for row in rows)
+        deleted = sum(row['eliminados'] for row in rows)
+        daily = (uploaded - deleted) / days
+        usage = self.get_storage_usage(reconcile=False)
+        
+        days_to_full = None
+        if daily > 0 and usage['limit']:
+            days_to_full = max(0, int((usage['limit'] - usage['usage']) / daily))
+        
+        return {
+            'dias': rows,
+            'subidos': uploaded,
+            'eliminados': deleted,
+            'neto': uploaded - deleted,
+            'promedio_diario': daily,
+            'uso': usage['usage'],
+            'limite': usage['limit'],
+            'conciliado': usage.get('conciliado'),
+            'dias_hasta_lleno': days_to_full
+        }
+    
+    def create_backup_folder(self, folder_name, parent_id=None):
+        """Crear carpeta de respaldo (por defecto en la carpeta de la propiedad)"""
         try:
             folder_metadata = {
                 'name': folder_name,
-                'mimeType': 'application/vnd.google-apps.folder',
-                'parents': [Config.GOOGLE_DRIVE_FOLDER_ID]
+                'mimeType': FOLDER_MIME_TYPE,
+                'parents': [parent_id or self.folder_id]
             }
             
-            folder = self.service.files().create(
-                body=folder_metadata,
-                fields='id,name'
-            ).execute()
+            with self._operation('carpetas'):
+                folder = self.service.files().create(
+                    body=folder_metadata,
+                    fields='id,name'
+                ).execute()
             
             logger.info(f"Carpeta de respaldo creada: {folder_name}")
             return folder['id']
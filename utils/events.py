@@ -0,0 +1,111 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento del almacén de registros
+AGREGADO = 'agregado'    # Registro nuevo (bot, importación o fila agregada en Sheets)
+SALIDA = 'salida'        # Hora de salida real registrada
+EDITADO = 'editado'      # Fila editada a mano en Google Sheets
+ELIMINADO = 'eliminado'  # Fila borrada en Google Sheets (o reemplazada al reimportar)
+
+EVENT_TYPES = (AGREGADO, SALIDA, EDITADO, ELIMINADO)
+
+# Origen del cambio
+ORIGEN_BOT = 'bot'
+ORIGEN_SHEETS = 'sheets'
+ORIGEN_REPLAY = 'replay'
+
+
+class RegistroEvent:
+    """Cambio en un registro: tipo, registro resultante y, en ediciones, el anterior"""
+
+    __slots__ = ('tipo', 'registro', 'anterior', 'origen')
+
+    def __init__(self, tipo, registro, anterior=None, origen=ORIGEN_BOT):
+        self.tipo = tipo
+        self.registro = registro
+        self.anterior = anterior
+        self.origen = origen
+
+    def __repr__(self):
+        return f"<RegistroEvent {self.tipo} {self.registro.dni} {self.registro.fecha} ({self.origen})>"
+
+
+class EventFeed:
+    """Flujo de eventos de registros con suscripción.
+
+    Los eventos se entregan en el hilo que hace el cambio (el del bot o el de
+    replicación), en el orden en que ocurren. El error de un suscriptor se
+    registra en el log y no afecta al resto ni a quien publica.
+    """
+
+    def __init__(self):
+        self._subscribers = []  # (callback, tipos o None)
+        # Reentrante: un suscriptor puede suscribir a otro mientras recibe un evento.
+        # Quien publica lo toma junto con la escritura en el almacén para que
+        # una reproducción (replay) no vea un cambio y además lo reciba después.
+        self.lock = threading.RLock()
+
+    def subscribe(self, callback, tipos=None):
+        """Suscribir callback(evento) a todos los tipos o solo a los indicados"""
+        tipos = frozenset(tipos) if tipos else None
+        unknown = (tipos or frozenset()) - set(EVENT_TYPES)
+        if unknown:
+            raise ValueError(f"Tipos de evento desconocidos: {', '.join(sorted(unknown))}")
+
+        with self.lock:
+            self._subscribers.append((callback, tipos))
+        return callback
+
+    def unsubscribe(self, callback):
+        """Cancelar una suscripción"""
+        with self.lock:
+            self._subscribers = [item for item in self._subscribers if item[0] is not callback]
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, tipo, registro, anterior=None, origen=ORIGEN_BOT):
+        """Entregar un evento a los suscriptores interesados"""
+        if not self._subscribers:
+            return
+
+        event = RegistroEvent(tipo, registro, anterior, origen)
+        with self.lock:
+            subscribers = list(self._subscribers)
+            for callback, tipos in subscribers:
+                self._deliver(callback, tipos, event)
+
+    def publish_many(self, tipo, registros, origen=ORIGEN_BOT):
+        """Entregar un evento por registro (cargas en bloque)"""
+        if not self._subscribers:
+            return
+
+        with self.lock:
+            for registro in registros:
+                self.publish(tipo, registro, origen=origen)
+
+    def replay(self, callback, registros, tipos=None):
+        """Entregar a un suscriptor el estado actual como eventos y suscribirlo.
+
+        Cada registro llega como AGREGADO y, si ya tiene salida real, como
+        SALIDA. Se hace con el flujo bloqueado: ningún cambio concurrente se
+        pierde ni llega antes que la reproducción.
+        """
+        tipos = frozenset(tipos) if tipos else None
+        with self.lock:
+            for registro in registros:
+                self._deliver(callback, tipos, RegistroEvent(AGREGADO, registro, origen=ORIGEN_REPLAY))
+                if registro.salida_real is not None:
+                    self._deliver(callback, tipos, RegistroEvent(SALIDA, registro, origen=ORIGEN_REPLAY))
+            return self.subscribe(callback, tipos)
+
+    @staticmethod
+    def _deliver(callback, tipos, event):
+        if tipos is not None and event.tipo not in tipos:
+            return
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Error en suscriptor de eventos {getattr(callback, '__name__', callback)}: {str(e)}")
@@ -0,0 +1,118 @@
+from decimal import Decimal
+from itertools import islice
+import csv
+import logging
+import os
+import tempfile
+from utils.records import Registro, day_to_date, epoch_to_moment, epoch_to_time
+
+logger = logging.getLogger(__name__)
+
+# Formatos de exportación soportados
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Registros por bloque (grupo de filas en Parquet)
+EXPORT_CHUNK_ROWS = 5000
+
+
+class RegistrationExporter:
+    """Exportación de registros de un rango de fechas a CSV o Parquet.
+
+    Recorre el almacén local por bloques (SheetsManager.iter_records) y escribe
+    cada bloque a medida que se lee, así la memoria no crece con el periodo.
+    """
+
+    def __init__(self, sheets_manager, chunk_rows=EXPORT_CHUNK_ROWS):
+        self.sheets_manager = sheets_manager
+        self.chunk_rows = chunk_rows
+
+    def export(self, start_date, end_date, fmt='csv', path=None):
+        """Exportar el periodo (inclusive) a un archivo; devuelve (ruta, cantidad de registros)"""
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt}")
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='registros_', suffix=f'.{fmt}')
+            os.close(fd)
+
+        records = self.sheets_manager.iter_records(start_date, end_date)
+        try:
+            if fmt == 'parquet':
+                total = self._write_parquet(records, path)
+            else:
+                total = self._write_csv(records, path)
+        except Exception:
+            os.remove(path)
+            raise
+
+        logger.info(f"Exportados {total} registros ({start_date} a {end_date}) en {path}")
+        return path, total
+
+    @staticmethod
+    def _write_csv(records, path):
+        # utf-8-sig para que Excel muestre bien las tildes
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(Registro.SHEET_COLUMNS)
+            total = 0
+            for registro in records:
+                writer.writerow(registro.to_row())
+                total += 1
+        return total
+
+    def _write_parquet(self, records, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Para exportar a Parquet instala pyarrow: pip install -r requirements-opcional.txt")
+
+        # Columnas con tipo: fecha como date, precio como decimal en soles
+        schema = pa.schema([
+            ('Fecha', pa.date32()),
+            ('Hora Ingreso', pa.string()),
+            ('Hora Salida Estimada', pa.string()),
+            ('Hora Salida Real', pa.string()),
+            ('Habitación', pa.string()),
+            ('DNI', pa.string()),
+            ('Nombre', pa.string()),
+            ('Nacionalidad', pa.string()),
+            ('Duración', pa.string()),
+            ('Precio', pa.decimal128(12, 2)),
+            ('Forma de Pago', pa.string()),
+            ('Observaciones', pa.string()),
+            ('Registrado por', pa.string()),
+            ('ID Registro', pa.string()),
+            ('Foto DNI', pa.string()),
+            ('ID Foto', pa.string()),
+        ])
+
+        total = 0
+        with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+            while True:
+                chunk = list(islice(records, self.chunk_rows))
+                if not chunk:
+                    break
+                writer.write_table(pa.table({
+                    'Fecha': [day_to_date(r.dia) for r in chunk],
+                    'Hora Ingreso': [epoch_to_time(r.ingreso) for r in chunk],
+                    'Hora Salida Estimada': [epoch_to_time(r.salida_estimada) for r in chunk],
+                    'Hora Salida Real': [
+                        epoch_to_moment(r.salida_real, r.dia, not_before=r.ingreso) for r in chunk
+                    ],
+                    'Habitación': [r.habitacion_label for r in chunk],
+                    'DNI': [r.dni for r in chunk],
+                    'Nombre': [r.nombre for r in chunk],
+                    'Nacionalidad': [r.nacionalidad for r in chunk],
+                    'Duración': [r.duracion for r in chunk],
+                    'Precio': [Decimal(r.precio_cents).scaleb(-2) for r in chunk],
+                    'Forma de Pago': [r.forma_pago for r in chunk],
+                    'Observaciones': [r.observaciones for r in chunk],
+                    'Registrado por': [r.registrado_por for r in chunk],
+                    'ID Registro': [r.id_registro for r in chunk],
+                    'Foto DNI': [r.foto_url for r in chunk],
+                    'ID Foto': [r.foto_drive_id for r in chunk],
+                }, schema=schema))
+                total += len(chunk)
+        return total
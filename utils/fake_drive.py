@@ -0,0 +1,390 @@
+from email.parser import BytesParser, Parser
+from email.policy import HTTP
+from urllib.parse import parse_qs, urlsplit
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import httplib2
+
+API_ROOT = 'https://www.googleapis.com'
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Condiciones de q separadas por 'and' (sin cortar dentro de appProperties has { ... })
+_AND_RE = re.compile(r"\s+and\s+(?![^{]*\})")
+_CLAUSE_RE = re.compile(r"^(?P<field>\w+)\s*(?P<op>=|!=|<=|>=|<|>|contains)\s*(?P<value>'(?:[^'\\]|\\.)*'|true|false)$")
+_IN_PARENTS_RE = re.compile(r"^'(?P<value>(?:[^'\\]|\\.)*)'\s+in\s+parents$")
+_HAS_RE = re.compile(
+    r"^(?P<field>appProperties|properties)\s+has\s+\{\s*key\s*=\s*'(?P<key>(?:[^'\\]|\\.)*)'\s+and\s+"
+    r"value\s*=\s*'(?P<value>(?:[^'\\]|\\.)*)'\s*\}$"
+)
+
+
+def _unquote(value):
+    if value in ('true', 'false'):
+        return value == 'true'
+    return re.sub(r"\\(.)", r"\1", value[1:-1])
+
+
+class FakeDriveHttp:
+    """Conexión HTTP (como httplib2.Http) contra el Drive en memoria.
+
+    Como httplib2.Http, no admite peticiones simultáneas: si dos hilos la usan
+    a la vez, la segunda petición falla, igual que una conexión compartida.
+    """
+
+    def __init__(self, drive):
+        self.drive = drive
+        self._busy = threading.Lock()
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        if not self._busy.acquire(blocking=False):
+            self.drive.concurrent_errors += 1
+            raise httplib2.HttpLib2Error("Conexión HTTP usada por dos hilos a la vez")
+        try:
+            return self.drive.request(uri, method, body, headers or {})
+        finally:
+            self._busy.release()
+
+
+class FakeDrive:
+    """API de Google Drive v3 en memoria para pruebas de DriveManager.
+
+    Responde por HTTP a lo que usa DriveManager con googleapiclient: subidas
+    multipart y reanudables, crear/listar/obtener/actualizar/eliminar archivos,
+    permisos, about y peticiones en lote (batch). Cuenta cada petición HTTP.
+
+    - latency: segundos de espera por petición HTTP.
+    - error_rate: probabilidad de responder 503 en cada petición.
+    - offline: si es True, cada petición falla como si no hubiera red.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, quota_bytes=15 * 1024 ** 3, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.offline = False
+        self.quota_bytes = quota_bytes
+        self.random = random.Random(seed)
+
+        self.files = {}  # id -> metadatos (+ '_content')
+        self.permissions = {}  # id -> [permisos]
+        self._uploads = {}  # upload_id -> (metadatos, bytes recibidos)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self.calls = {}  # tipo de petición -> cantidad
+        self.batch_items = 0
+        self.concurrent_errors = 0
+
+    def http(self):
+        """Nueva conexión HTTP contra este Drive"""
+        return FakeDriveHttp(self)
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    # ------------------------------------------------------------------
+    # Preparación de pruebas (sin latencia ni conteo)
+    # ------------------------------------------------------------------
+
+    def add_folder(self, name, parent=None, folder_id=None):
+        return self._create({'name': name, 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent] if parent else []},
+                            file_id=folder_id)['id']
+
+    def add_file(self, name, parent, content=b'', created_time=None, app_properties=None,
+                 mime_type='image/jpeg'):
+        metadata = self._create({
+            'name': name, 'mimeType': mime_type, 'parents': [parent],
+            'appProperties': app_properties or {}
+        }, content)
+        if created_time:
+            metadata['createdTime'] = created_time
+        return metadata['id']
+
+    # ------------------------------------------------------------------
+    # Archivos
+    # ------------------------------------------------------------------
+
+    def _create(self, metadata, content=None, file_id=None):
+        file_id = file_id or f"fake{next(self._ids):06d}"
+        now = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        metadata = {
+            'id': file_id,
+            'name': metadata.get('name', 'Untitled'),
+            'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+            'parents': list(metadata.get('parents') or []),
+            'appProperties': dict(metadata.get('appProperties') or {}),
+            'createdTime': now,
+            'modifiedTime': now,
+            'trashed': False,
+            'webViewLink': f"https://drive.google.com/file/d/{file_id}/view",
+        }
+        if content is not None:
+            metadata['size'] = str(len(content))
+            metadata['md5Checksum'] = hashlib.md5(content).hexdigest()
+            metadata['webContentLink'] = f"https://drive.google.com/uc?id={file_id}&export=download"
+            metadata['_content'] = content
+        self.files[file_id] = metadata
+        return metadata
+
+    @staticmethod
+    def _public(metadata):
+        return {key: value for key, value in metadata.items() if not key.startswith('_')}
+
+    def _matches(self, metadata, q):
+        for clause in _AND_RE.split(q.strip()) if q else []:
+            clause = clause.strip()
+            match = _IN_PARENTS_RE.match(clause)
+            if match:
+                if _unquote(f"'{match.group('value')}'") not in metadata['parents']:
+                    return False
+                continue
+
+            match = _HAS_RE.match(clause)
+            if match:
+                key, value = _unquote(f"'{match.group('key')}'"), _unquote(f"'{match.group('value')}'")
+                if metadata.get('appProperties', {}).get(key) != value:
+                    return False
+                continue
+
+            match = _CLAUSE_RE.match(clause)
+            if not match:
+                raise ValueError(f"Consulta no soportada: {clause}")
+            actual = metadata.get(match.group('field'))
+            expected = _unquote(match.group('value'))
+            op = match.group('op')
+            if op == 'contains':
+                ok = expected in (actual or '')
+            elif op == '=':
+                ok = actual == expected
+            elif op == '!=':
+                ok = actual != expected
+            elif op == '<':
+                ok = actual < expected
+            elif op == '<=':
+                ok = actual <= expected
+            elif op == '>':
+                ok = actual > expected
+            else:
+                ok = actual >= expected
+            if not ok:
+                return False
+        return True
+
+    def _list(self, params):
+        q = params.get('q', '')
+        files = sorted(
+            (f for f in self.files.values() if self._matches(f, q)),
+            key=lambda f: (f['createdTime'], f['id'])
+        )
+        if 'trashed' not in q:
+            files = [f for f in files if not f['trashed']]
+
+        page_size = min(int(params.get('pageSize', 100)), 1000)
+        start = int(params.get('pageToken') or 0)
+        page = files[start:start + page_size]
+        result = {'files': [self._public(f) for f in page]}
+        if start + page_size < len(files):
+            result['nextPageToken'] = str(start + page_size)
+        return result
+
+    def _missing_parent(self, metadata):
+        """Carpeta padre inexistente (Drive responde 404), o None"""
+        for parent in metadata.get('parents') or []:
+            if parent not in self.files:
+                return parent
+        return None
+
+    def _delete(self, file_id):
+        """Eliminar un archivo; una carpeta se elimina con todo su contenido"""
+        children = [f['id'] for f in self.files.values() if file_id in f['parents']]
+        for child_id in children:
+            self._delete(child_id)
+        self.files.pop(file_id, None)
+        self.permissions.pop(file_id, None)
+
+    def _usage(self):
+        return sum(int(f.get('size', 0)) for f in self.files.values())
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def request(self, uri, method, body, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.offline:
+            raise httplib2.ServerNotFoundError("Sin conexión con www.googleapis.com")
+
+        parts = urlsplit(uri)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if hasattr(body, 'read'):
+            body = body.read()
+
+        with self._lock:
+            kind = self._kind(parts.path, method, params)
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self._response(503, {'error': {'code': 503, 'message': 'Backend Error'}})
+
+            if kind == 'batch':
+                return self._batch(body, headers)
+            return self._dispatch(parts.path, method, params, body, headers)
+
+    @staticmethod
+    def _kind(path, method, params):
+        if path.startswith('/batch/'):
+            return 'batch'
+        if path.startswith('/upload/'):
+            if params.get('upload_id'):
+                return 'upload_chunk'
+            return f"upload_{params.get('uploadType', 'media')}"
+        tail = path.split('/drive/v3/', 1)[-1]
+        if tail == 'about':
+            return 'about'
+        if '/permissions' in tail:
+            return f"permissions_{'list' if method == 'GET' else 'create'}"
+        if tail == 'files':
+            return 'files_list' if method == 'GET' else 'files_create'
+        return {'GET': 'files_get', 'PATCH': 'files_update', 'DELETE': 'files_delete'}.get(method, 'otro')
+
+    @staticmethod
+    def _response(status, payload=None, extra_headers=None):
+        headers = {'status': str(status), 'content-type': 'application/json; charset=UTF-8'}
+        headers.update(extra_headers or {})
+        content = b'' if payload is None else json.dumps(payload).encode('utf-8')
+        return httplib2.Response(headers), content
+
+    def _not_found(self, file_id):
+        return self._response(404, {'error': {'code': 404, 'message': f'File not found: {file_id}.'}})
+
+    def _dispatch(self, path, method, params, body, headers):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        if path.startswith('/upload/'):
+            return self._upload(method, params, body, headers)
+
+        tail = path.split('/drive/v3/', 1)[-1]
+        if tail == 'about':
+            usage = self._usage()
+            return self._response(200, {'storageQuota': {
+                'limit': str(self.quota_bytes), 'usage': str(usage), 'usageInDrive': str(usage)
+            }})
+
+        if tail == 'files':
+            if method == 'GET':
+                return self._response(200, self._list(params))
+            metadata = json.loads(body or b'{}')
+            if self._missing_parent(metadata):
+                return self._not_found(self._missing_parent(metadata))
+            return self._response(200, self._public(self._create(metadata)))
+
+        segments = tail.split('/')
+        file_id = segments[1]
+        metadata = self.files.get(file_id)
+        if metadata is None:
+            return self._not_found(file_id)
+
+        if len(segments) > 2 and segments[2] == 'permissions':
+            permissions = self.permissions.setdefault(file_id, [])
+            if method == 'GET':
+                return self._response(200, {'permissions': permissions})
+            permission = dict(json.loads(body or b'{}'), id=f"perm{len(permissions) + 1}")
+            permissions.append(permission)
+            return self._response(200, permission)
+
+        if method == 'GET':
+            return self._response(200, self._public(metadata))
+        if method == 'DELETE':
+            self._delete(file_id)
+            return self._response(204)
+        if method == 'PATCH':
+            changes = json.loads(body or b'{}')
+            metadata.update({k: v for k, v in changes.items() if k != 'appProperties'})
+            metadata['appProperties'].update(changes.get('appProperties', {}))
+            for parent in filter(None, params.get('removeParents', '').split(',')):
+                if parent in metadata['parents']:
+                    metadata['parents'].remove(parent)
+            for parent in filter(None, params.get('addParents', '').split(',')):
+                metadata['parents'].append(parent)
+            return self._response(200, self._public(metadata))
+        return self._response(405, {'error': {'code': 405, 'message': 'Method Not Allowed'}})
+
+    def _upload(self, method, params, body, headers):
+        upload_type = params.get('uploadType')
+        headers = {key.lower(): value for key, value in headers.items()}
+
+        if upload_type == 'multipart':
+            message = BytesParser().parsebytes(
+                f"Content-Type: {headers['content-type']}\r\n\r\n".encode('utf-8') + body
+            )
+            metadata_part, media_part = message.get_payload()
+            metadata = json.loads(metadata_part.get_payload(decode=True))
+            metadata.setdefault('mimeType', media_part.get_content_type())
+            if self._missing_parent(metadata):
+                return self._not_found(self._missing_parent(metadata))
+            content = media_part.get_payload(decode=True)
+            return self._response(200, self._public(self._create(metadata, content)))
+
+        if upload_type == 'resumable' and not params.get('upload_id'):
+            upload_id = f"upload{next(self._ids)}"
+            metadata = json.loads(body or b'{}')
+            metadata.setdefault('mimeType', headers.get('x-upload-content-type', 'application/octet-stream'))
+            if self._missing_parent(metadata):
+                return self._not_found(self._missing_parent(metadata))
+            self._uploads[upload_id] = (metadata, b'')
+            location = f"{API_ROOT}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return self._response(200, extra_headers={'location': location})
+
+        upload_id = params.get('upload_id')
+        metadata, received = self._uploads[upload_id]
+        received += body or b''
+        total = headers.get('content-range', '').rsplit('/', 1)[-1]
+        if total.isdigit() and len(received) < int(total):
+            self._uploads[upload_id] = (metadata, received)
+            return self._response(308, extra_headers={'range': f"bytes=0-{len(received) - 1}"})
+
+        del self._uploads[upload_id]
+        return self._response(200, self._public(self._create(metadata, received)))
+
+    def _batch(self, body, headers):
+        """Peticiones en lote: multipart/mixed con una petición HTTP por parte"""
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        headers = {key.lower(): value for key, value in headers.items()}
+        message = Parser().parsestr(f"Content-Type: {headers['content-type']}\r\n\r\n{body}")
+
+        boundary = f"batch_{next(self._ids)}"
+        out = []
+        for part in message.get_payload():
+            request_line, rest = part.get_payload().split('\n', 1)
+            method, path, _ = request_line.split(' ', 2)
+            inner = Parser(policy=HTTP).parsestr(rest)
+            inner_body = inner.get_payload() or None
+            parts = urlsplit(path)
+            params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+            inner_headers = {key: value for key, value in inner.items()}
+
+            self.batch_items += 1
+            response, content = self._dispatch(
+                parts.path, method, params,
+                inner_body.encode('utf-8') if inner_body else None, inner_headers
+            )
+            content_id = part['Content-ID'].strip('<>')
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {response.status} OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{content.decode('utf-8')}\r\n"
+            )
+
+        content = ''.join(out) + f"--{boundary}--\r\n"
+        return httplib2.Response({
+            'status': '200', 'content-type': f'multipart/mixed; boundary={boundary}'
+        }), content.encode('utf-8')
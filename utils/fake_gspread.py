@@ -0,0 +1,276 @@
+from collections import deque
+import csv
+import io
+import itertools
+import random
+import threading
+import time
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+
+class FakeResponse:
+    """Respuesta HTTP mínima (para APIError, la consulta de versión y la exportación CSV)"""
+
+    def __init__(self, status_code=200, payload=None, content=b''):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.raw = io.BytesIO(content)
+        self.text = str(self._payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise APIError(self)
+
+    def close(self):
+        self.raw.close()
+
+
+class FakeWorksheet:
+    """Hoja en memoria: una lista de filas de texto"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client, spreadsheet, title, rows=1000, cols=26):
+        self.client = client
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = next(self._ids)
+        self.row_count = rows
+        self.col_count = cols
+        self.rows = []
+        self.hidden_columns = set()
+
+    def load_rows(self, rows):
+        """Cargar filas directamente, sin latencia ni cuota (para preparar pruebas)"""
+        self.rows.extend([str(value) for value in row] for row in rows)
+        self.row_count = max(self.row_count, len(self.rows))
+        self.client.touch()
+
+    def _set_cell(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        if len(cells) < col:
+            cells.extend([''] * (col - len(cells)))
+        cells[col - 1] = str(value)
+
+    def _write_range(self, range_name, values):
+        start = range_name.split('!')[-1].split(':')[0]
+        first_row, first_col = a1_to_rowcol(start)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set_cell(first_row + i, first_col + j, value)
+        self.row_count = max(self.row_count, len(self.rows))
+
+    # API de gspread ---------------------------------------------------
+
+    def get_all_values(self):
+        self.client.api_call('get_all_values')
+        return [list(row) for row in self.rows]
+
+    def get_all_records(self):
+        values = self.get_all_values()
+        if not values:
+            return []
+        header = values[0]
+        return [
+            dict(zip(header, row + [''] * (len(header) - len(row))))
+            for row in values[1:]
+        ]
+
+    def row_values(self, row):
+        self.client.api_call('row_values')
+        values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def add_cols(self, cols):
+        self.client.api_call('add_cols')
+        self.col_count += cols
+
+    def hide_columns(self, start, end):
+        self.client.api_call('hide_columns')
+        self.hidden_columns.update(range(start, end))
+
+    def update(self, range_name, values, **kwargs):
+        self.client.api_call('update')
+        self._write_range(range_name, values)
+        self.client.touch()
+        return {'updatedRange': f"'{self.title}'!{range_name}"}
+
+    def batch_update(self, data, **kwargs):
+        self.client.api_call('batch_update')
+        for item in data:
+            self._write_range(item['range'], item['values'])
+        self.client.touch()
+        return {'totalUpdatedRows': sum(len(item['values']) for item in data)}
+
+    def append_rows(self, values, **kwargs):
+        self.client.api_call('append_rows')
+        first = len(self.rows) + 1
+        self.rows.extend([str(value) for value in row] for row in values)
+        self.row_count = max(self.row_count, len(self.rows))
+        self.client.touch()
+        last = len(self.rows)
+        width = max((len(row) for row in values), default=1)
+        last_column = chr(ord('A') + width - 1)
+        return {'updates': {'updatedRange': f"'{self.title}'!A{first}:{last_column}{last}"}}
+
+    def __repr__(self):
+        return f"<FakeWorksheet {self.title!r} id:{self.id}>"
+
+
+class FakeSpreadsheet:
+    """Hoja de cálculo en memoria"""
+
+    def __init__(self, client, key):
+        self.client = client
+        self.id = key
+        self.title = f"Fake {key}"
+        self._worksheets = {}
+
+    def worksheets(self):
+        self.client.api_call('worksheets')
+        return list(self._worksheets.values())
+
+    def worksheet(self, title):
+        self.client.api_call('worksheet')
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self.client.api_call('add_worksheet')
+        if title in self._worksheets:
+            raise APIError(FakeResponse(400, {'error': {
+                'code': 400,
+                'message': f'A sheet with the name "{title}" already exists.',
+                'status': 'INVALID_ARGUMENT'
+            }}))
+        worksheet = FakeWorksheet(self.client, self, title, rows, cols)
+        self._worksheets[title] = worksheet
+        self.client.touch()
+        return worksheet
+
+    def create_worksheet(self, title, rows=1000, cols=26):
+        """Crear una hoja sin latencia ni cuota (para preparar pruebas)"""
+        worksheet = FakeWorksheet(self.client, self, title, rows, cols)
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def batch_update(self, body):
+        """Solo deleteDimension de filas (eliminar filas duplicadas)"""
+        self.client.api_call('spreadsheet_batch_update')
+        worksheets = {worksheet.id: worksheet for worksheet in self._worksheets.values()}
+        for request in body.get('requests', []):
+            target = request['deleteDimension']['range']
+            worksheet = worksheets[target['sheetId']]
+            del worksheet.rows[target['startIndex']:target['endIndex']]
+        self.client.touch()
+        return {'spreadsheetId': self.id, 'replies': [{} for _ in body.get('requests', [])]}
+
+    def del_worksheet(self, worksheet):
+        self.client.api_call('del_worksheet')
+        self._worksheets.pop(worksheet.title, None)
+        self.client.touch()
+
+
+class FakeSession:
+    """Sesión HTTP mínima para la exportación CSV de una hoja"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url, params=None, stream=False, **kwargs):
+        self.client.api_call('export_csv')
+        gid = int((params or {}).get('gid'))
+        for spreadsheet in self.client.spreadsheets.values():
+            for worksheet in spreadsheet._worksheets.values():
+                if worksheet.id == gid:
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(worksheet.rows)
+                    return FakeResponse(content=buffer.getvalue().encode('utf-8'))
+        return FakeResponse(404, {'error': {'code': 404, 'message': 'Not Found'}})
+
+
+class FakeClient:
+    """Cliente gspread en memoria para pruebas de carga de SheetsManager.
+
+    Implementa solo lo que usan SheetsManager y los benchmarks: abrir la hoja de
+    cálculo, listar/crear hojas, leer valores, append_rows, batch_update (de
+    celdas y para eliminar filas), la consulta de versión en Drive y la
+    exportación CSV.
+
+    - latency: segundos de espera por llamada a la API.
+    - error_rate: probabilidad de responder 429 en cada llamada.
+    - requests_per_minute: cuota por minuto; al superarla responde 429, como Google.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, requests_per_minute=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.random = random.Random(seed)
+        self.spreadsheets = {}
+        self.session = FakeSession(self)
+        self.version = 1
+
+        self._lock = threading.Lock()
+        self._recent_calls = deque()  # Momentos de las llamadas del último minuto
+        self.calls = {}  # tipo de llamada -> cantidad
+        self.quota_errors = 0
+
+    def api_call(self, kind):
+        """Registrar una llamada: aplica latencia y decide si responde 429"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            now = time.monotonic()
+            while self._recent_calls and now - self._recent_calls[0] > 60:
+                self._recent_calls.popleft()
+
+            over_quota = (
+                self.requests_per_minute is not None
+                and len(self._recent_calls) >= self.requests_per_minute
+            )
+            if over_quota or (self.error_rate and self.random.random() < self.error_rate):
+                self.quota_errors += 1
+                raise APIError(FakeResponse(429, {'error': {
+                    'code': 429,
+                    'message': 'Quota exceeded for quota metric Read requests per minute',
+                    'status': 'RESOURCE_EXHAUSTED'
+                }}))
+
+            self._recent_calls.append(now)
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def touch(self):
+        """Cada escritura cambia la versión del archivo en Drive"""
+        with self._lock:
+            self.version += 1
+
+    def add_spreadsheet(self, key):
+        """Crear una hoja de cálculo sin latencia ni cuota (para preparar pruebas)"""
+        return self.spreadsheets.setdefault(key, FakeSpreadsheet(self, key))
+
+    def open_by_key(self, key):
+        self.api_call('open_by_key')
+        return self.add_spreadsheet(key)
+
+    def request(self, method, endpoint, params=None, **kwargs):
+        """Consulta de metadatos en Drive (version, modifiedTime)"""
+        self.api_call('drive_metadata')
+        return FakeResponse(payload={
+            'version': str(self.version),
+            'modifiedTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        })
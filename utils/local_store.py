@@ -0,0 +1,508 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config import Config
+from utils.records import Registro
+
+logger = logging.getLogger(__name__)
+
+# Columnas de la tabla de registros, en el orden de Registro.DATA_FIELDS
+DATA_COLUMNS = Registro.DATA_FIELDS
+SELECT_COLUMNS = ('id', 'hoja', 'fila') + DATA_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hoja TEXT NOT NULL,
+    fila INTEGER,
+    pendiente INTEGER NOT NULL DEFAULT 0,
+    dia INTEGER NOT NULL,
+    ingreso INTEGER,
+    salida_estimada INTEGER,
+    salida_real INTEGER,
+    habitacion INTEGER NOT NULL DEFAULT 0,
+    habitacion_texto TEXT,
+    dni TEXT,
+    nombre TEXT,
+    nacionalidad TEXT,
+    duracion TEXT,
+    precio_cents INTEGER NOT NULL DEFAULT 0,
+    forma_pago TEXT,
+    observaciones TEXT,
+    registrado_por TEXT,
+    id_registro TEXT,
+    foto_url TEXT,
+    foto_drive_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_registros_dia ON registros (dia);
+CREATE INDEX IF NOT EXISTS idx_registros_dni ON registros (dni, dia);
+CREATE INDEX IF NOT EXISTS idx_registros_habitacion ON registros (habitacion, dia);
+CREATE INDEX IF NOT EXISTS idx_registros_hoja_fila ON registros (hoja, fila);
+CREATE INDEX IF NOT EXISTS idx_registros_pendiente ON registros (pendiente) WHERE pendiente > 0;
+
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+class LocalStore:
+    """Almacén local de registros en SQLite.
+
+    Es el sistema de registro del bot: las consultas se resuelven aquí y
+    Google Sheets se mantiene como réplica. La columna `pendiente` cuenta los
+    cambios locales aún no enviados a Sheets (0 = replicado).
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or Config.LOCAL_DB_PATH)
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+        logger.info(f"Almacén local abierto: {self.path}")
+
+    def _migrate(self):
+        """Agregar columnas nuevas a bases creadas con versiones anteriores"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(registros)")}
+        for column in ('id_registro', 'foto_url', 'foto_drive_id'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE registros ADD COLUMN {column} TEXT")
+        
+        # Una sola fila por sesión de registro (confirmaciones repetidas)
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_registros_id_registro "
+            "ON registros (id_registro) WHERE id_registro IS NOT NULL"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_registro(row):
+        """Convertir una fila de SELECT_COLUMNS en Registro"""
+        return Registro(**dict(zip(SELECT_COLUMNS, row)))
+
+    def _select(self, where, params=(), order='dia, ingreso, id'):
+        sql = f"SELECT {', '.join(SELECT_COLUMNS)} FROM registros WHERE {where} ORDER BY {order}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_registro(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Estado de sincronización
+    # ------------------------------------------------------------------
+
+    def get_state(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT valor FROM estado WHERE clave = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def pop_state(self, key):
+        """Leer y eliminar un valor de estado"""
+        with self._lock:
+            row = self._conn.execute("SELECT valor FROM estado WHERE clave = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM estado WHERE clave = ?", (key,))
+                self._conn.commit()
+        return row[0] if row else None
+
+    def get_states(self, prefix):
+        """Pares (clave, valor) de estado cuya clave empieza con prefix"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT clave, valor FROM estado WHERE substr(clave, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+
+    def set_state(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO estado (clave, valor) VALUES (?, ?) "
+                "ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor",
+                (key, value)
+            )
+            self._conn.commit()
+
+    def acquire_lease(self, key, owner, seconds):
+        """Tomar o renovar un permiso exclusivo entre procesos que comparten la base.
+
+        Devuelve None si owner lo obtuvo, o el dueño actual si otro proceso lo
+        tiene y no ha vencido. El permiso vence si no se renueva en seconds.
+        """
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: ningún otro proceso escribe entre leer y tomar el permiso
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT valor FROM estado WHERE clave = ?", (key,)).fetchone()
+                if row:
+                    lease = json.loads(row[0])
+                    if lease['owner'] != owner and lease['expira'] > now:
+                        self._conn.rollback()
+                        return lease['owner']
+                self._conn.execute(
+                    "INSERT INTO estado (clave, valor) VALUES (?, ?) "
+                    "ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor",
+                    (key, json.dumps({'owner': owner, 'expira': now + seconds}))
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return None
+
+    def release_lease(self, key, owner):
+        """Liberar un permiso si owner todavía lo tiene"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM estado WHERE clave = ? AND json_extract(valor, '$.owner') = ?", (key, owner)
+            )
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Escrituras
+    # ------------------------------------------------------------------
+
+    def insert(self, registro, hoja):
+        """Guardar un registro nuevo, pendiente de replicar.
+
+        Devuelve (id, creado). Si ya existe un registro con el mismo
+        id_registro no se inserta otro y se devuelve el id del existente.
+        """
+        sql = (
+            f"INSERT INTO registros (hoja, pendiente, {', '.join(DATA_COLUMNS)}) "
+            f"VALUES (?, 1, {', '.join('?' * len(DATA_COLUMNS))}) "
+            f"ON CONFLICT (id_registro) WHERE id_registro IS NOT NULL DO NOTHING"
+        )
+        with self._lock:
+            cursor = self._conn.execute(sql, (hoja,) + registro.data())
+            self._conn.commit()
+            created = cursor.rowcount == 1
+            if not created:
+                existing = self.find_by_key(registro.id_registro)
+                return existing.id, False
+
+        registro.id = cursor.lastrowid
+        registro.hoja = hoja
+        return registro.id, True
+
+    def insert_many(self, registros, state=None):
+        """Guardar un bloque de registros nuevos (con su hoja), pendientes de replicar.
+
+        Si se pasa state=(clave, valor), se guarda en la misma transacción: sirve
+        como punto de control de una importación.
+        """
+        sql = (
+            f"INSERT INTO registros (hoja, pendiente, {', '.join(DATA_COLUMNS)}) "
+            f"VALUES (?, 1, {', '.join('?' * len(DATA_COLUMNS))})"
+        )
+        with self._lock:
+            self._conn.executemany(sql, ((r.hoja,) + r.data() for r in registros))
+            if state:
+                self._conn.execute(
+                    "INSERT INTO estado (clave, valor) VALUES (?, ?) "
+                    "ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor",
+                    state
+                )
+            self._conn.commit()
+    
+    def insert_replicated(self, registros):
+        """Guardar registros que ya existen en Sheets (importación inicial)"""
+        # Las filas repetidas con el mismo ID Registro se importan una sola vez
+        sql = (
+            f"INSERT OR IGNORE INTO registros (hoja, fila, pendiente, {', '.join(DATA_COLUMNS)}) "
+            f"VALUES (?, ?, 0, {', '.join('?' * len(DATA_COLUMNS))})"
+        )
+        with self._lock:
+            self._conn.executemany(
+                sql, ((r.hoja, r.fila) + r.data() for r in registros)
+            )
+            self._conn.commit()
+
+    def get_replicated(self, hoja):
+        """Registros ya replicados de una hoja"""
+        return self._select("hoja = ? AND pendiente = 0", (hoja,))
+
+    def clear_replicated(self, hoja):
+        """Eliminar los registros replicados de una hoja (antes de volver a importarla)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM registros WHERE hoja = ? AND pendiente = 0", (hoja,))
+            self._conn.commit()
+
+    def set_foto(self, id_registro, foto_url, foto_drive_id):
+        """Vincular la foto del DNI al registro de una sesión; queda pendiente de replicar.
+
+        Devuelve False si todavía no hay registro con esa clave.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE registros SET foto_url = ?, foto_drive_id = ?, pendiente = pendiente + 1 "
+                "WHERE id_registro = ?",
+                (foto_url, foto_drive_id, id_registro)
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def set_salida_real(self, registro_id, timestamp):
+        """Registrar la hora de salida real; queda pendiente de replicar"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE registros SET salida_real = ?, pendiente = pendiente + 1 WHERE id = ?",
+                (timestamp, registro_id)
+            )
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def get_range(self, start_day, end_day):
+        """Registros entre dos días (inclusive)"""
+        return self._select("dia BETWEEN ? AND ?", (start_day, end_day))
+
+    def iter_range(self, start_day=None, end_day=None, chunk_size=1000):
+        """Recorrer registros por bloques, con memoria constante"""
+        start_day = -10 ** 9 if start_day is None else start_day
+        end_day = 10 ** 9 if end_day is None else end_day
+        sql = (
+            f"SELECT {', '.join(SELECT_COLUMNS)} FROM registros "
+            f"WHERE dia BETWEEN ? AND ? ORDER BY dia, ingreso, id"
+        )
+
+        # Cursor propio para no bloquear a otros hilos mientras se recorre
+        conn = sqlite3.connect(self.path) if self.path != ':memory:' else self._conn
+        try:
+            cursor = conn.execute(sql, (start_day, end_day))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._to_registro(row)
+        finally:
+            if conn is not self._conn:
+                conn.close()
+
+    def find_by_key(self, id_registro):
+        """Registro con una clave de sesión, o None"""
+        records = self._select("id_registro = ?", (id_registro,))
+        return records[0] if records else None
+
+    def find_by_dni(self, dni):
+        """Historial de un DNI"""
+        return self._select("dni = ?", (dni,))
+
+    def find_open_by_dni(self, dni, since_day):
+        """Registros de un DNI desde un día, sin salida real"""
+        return self._select(
+            "dni = ? AND dia >= ? AND salida_real IS NULL", (dni, since_day),
+            order='dia DESC, ingreso DESC, id DESC'
+        )
+
+    def find_open_by_room(self, room, since_day):
+        """Registros de una habitación desde un día, sin salida real"""
+        room = str(room).strip()
+        if room.isdigit():
+            where, params = "habitacion = ?", (int(room),)
+        else:
+            where, params = "habitacion = 0 AND habitacion_texto = ?", (room,)
+        return self._select(
+            f"{where} AND dia >= ? AND salida_real IS NULL", params + (since_day,),
+            order='dia DESC, ingreso DESC, id DESC'
+        )
+
+    def has_foto(self, foto_drive_id):
+        """Si algún registro tiene vinculada la foto de Drive"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM registros WHERE foto_drive_id = ? LIMIT 1", (foto_drive_id,)
+            ).fetchone() is not None
+
+    def existing_keys(self, keys):
+        """De un conjunto de pares (dni, día), los que ya tienen registro"""
+        with self._lock:
+            return {
+                key for key in keys
+                if self._conn.execute(
+                    "SELECT 1 FROM registros WHERE dni = ? AND dia = ? LIMIT 1", key
+                ).fetchone()
+            }
+    
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM registros").fetchone()[0]
+    
+    def pending_count(self):
+        """Registros con cambios aún no replicados en Sheets"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM registros WHERE pendiente > 0").fetchone()[0]
+
+    def has_pending_updates(self):
+        """Hay registros ya replicados con cambios locales sin enviar"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM registros WHERE pendiente > 0 AND fila IS NOT NULL LIMIT 1"
+            ).fetchone() is not None
+
+    # ------------------------------------------------------------------
+    # Replicación con Google Sheets
+    # ------------------------------------------------------------------
+
+    def pending_inserts(self):
+        """Registros que aún no tienen fila en Sheets, con su contador de cambios"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SELECT_COLUMNS)}, pendiente FROM registros "
+                f"WHERE pendiente > 0 AND fila IS NULL ORDER BY hoja, id"
+            ).fetchall()
+        return [(self._to_registro(row[:-1]), row[-1]) for row in rows]
+
+    def pending_updates(self):
+        """Registros ya replicados con cambios locales, con su contador de cambios"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SELECT_COLUMNS)}, pendiente FROM registros "
+                f"WHERE pendiente > 0 AND fila IS NOT NULL ORDER BY hoja, fila"
+            ).fetchall()
+        return [(self._to_registro(row[:-1]), row[-1]) for row in rows]
+
+    def mark_replicated(self, registro_id, seen, fila=None):
+        """Marcar como replicado si no hubo cambios desde que se leyó (seen)"""
+        with self._lock:
+            if fila is not None:
+                self._conn.execute("UPDATE registros SET fila = ? WHERE id = ?", (fila, registro_id))
+            self._conn.execute(
+                "UPDATE registros SET pendiente = 0 WHERE id = ? AND pendiente = ?",
+                (registro_id, seen)
+            )
+            self._conn.commit()
+
+    def mirror_partition(self, hoja, registros):
+        """Reflejar el contenido de una hoja en el almacén local.
+
+        Las filas de Sheets son la referencia para los registros ya replicados:
+        se agregan las filas nuevas, se actualizan las editadas a mano y se
+        eliminan las que ya no existen. Cada fila se empareja con su registro
+        local por la columna oculta ID Registro (las filas se desplazan si se
+        borra una a mano) y solo las que no tienen clave, por número de fila.
+        Los registros con cambios locales pendientes no se editan, pero sí se
+        actualiza su fila; si la suya se borró, vuelven a agregarse. Una fila
+        cuya clave ya existe en otra hoja o en otra fila es un duplicado: no se
+        importa y se devuelve para eliminarla de la hoja. Si el registro local
+        aún no tenía fila (se envió pero no llegó a marcarse), se vincula a
+        ella. Todo se aplica en una sola transacción. Devuelve (agregados,
+        editados, eliminados, duplicados); cada editado es un par (anterior,
+        nuevo) y los duplicados son las filas de la hoja.
+        """
+        added, edited, removed, duplicates = [], [], [], []
+
+        with self._lock:
+            try:
+                current = [
+                    (self._to_registro(row[:-1]), row[-1])
+                    for row in self._conn.execute(
+                        f"SELECT {', '.join(SELECT_COLUMNS)}, pendiente FROM registros "
+                        f"WHERE hoja = ? AND fila IS NOT NULL",
+                        (hoja,)
+                    )
+                ]
+                by_key, by_row = {}, {}
+                for item in current:
+                    local = item[0]
+                    if local.id_registro:
+                        by_key[local.id_registro] = item
+                    else:
+                        by_row[local.fila] = item
+
+                matched = set()
+                for registro in registros:
+                    if registro.id_registro:
+                        existing = by_key.get(registro.id_registro)
+                    else:
+                        existing = by_row.get(registro.fila)
+
+                    if existing is not None and existing[0].id in matched:
+                        duplicates.append(registro)
+                        continue
+
+                    if existing is None and registro.id_registro:
+                        row = self._conn.execute(
+                            "SELECT id, hoja, fila FROM registros WHERE id_registro = ?",
+                            (registro.id_registro,)
+                        ).fetchone()
+                        if row and row[2] is None and row[1] == hoja:
+                            # Si tuvo cambios después del alta, queda pendiente como actualización
+                            self._conn.execute(
+                                "UPDATE registros SET fila = ?, "
+                                "pendiente = CASE WHEN pendiente > 1 THEN pendiente ELSE 0 END WHERE id = ?",
+                                (registro.fila, row[0])
+                            )
+                            matched.add(row[0])
+                            continue
+                        if row:
+                            duplicates.append(registro)
+                            continue
+
+                    if existing is None:
+                        cursor = self._conn.execute(
+                            f"INSERT INTO registros (hoja, fila, pendiente, {', '.join(DATA_COLUMNS)}) "
+                            f"VALUES (?, ?, 0, {', '.join('?' * len(DATA_COLUMNS))})",
+                            (hoja, registro.fila) + registro.data()
+                        )
+                        registro.id = cursor.lastrowid
+                        matched.add(registro.id)
+                        added.append(registro)
+                        continue
+
+                    local, pending = existing
+                    matched.add(local.id)
+                    if local.fila != registro.fila:
+                        # La fila se desplazó (otra se borró o se insertó encima)
+                        self._conn.execute("UPDATE registros SET fila = ? WHERE id = ?", (registro.fila, local.id))
+                    if pending or local.data() == registro.data():
+                        continue
+
+                    self._conn.execute(
+                        f"UPDATE registros SET {', '.join(f'{c} = ?' for c in DATA_COLUMNS)} WHERE id = ?",
+                        registro.data() + (local.id,)
+                    )
+                    registro.id = local.id
+                    edited.append((local, registro))
+
+                for local, pending in current:
+                    if local.id in matched:
+                        continue
+                    if pending:
+                        # Su fila se borró a mano con cambios locales sin enviar: se vuelve a agregar
+                        self._conn.execute("UPDATE registros SET fila = NULL WHERE id = ?", (local.id,))
+                    else:
+                        self._conn.execute("DELETE FROM registros WHERE id = ?", (local.id,))
+                        removed.append(local)
+
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+        return added, edited, removed, duplicates
+
+    def shift_rows(self, hoja, deleted_rows):
+        """Ajustar los números de fila de una hoja después de eliminar filas en Sheets"""
+        with self._lock:
+            for fila in sorted(deleted_rows, reverse=True):
+                self._conn.execute(
+                    "UPDATE registros SET fila = fila - 1 WHERE hoja = ? AND fila > ?", (hoja, fila)
+                )
+            self._conn.commit()
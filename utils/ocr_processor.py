@@ -12,9 +12,16 @@ class OCRProcessor:
     """Procesador de OCR para extraer datos de DNI usando OpenAI Vision"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self._client = None
         self.model = "gpt-4o-mini"  # Modelo optimizado para vision
     
+    @property
+    def client(self):
+        """Cliente de OpenAI, creado en el primer uso"""
+        if self._client is None:
+            self._client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        return self._client
+    
     def extract_text_from_image(self, image_bytes):
         """Extrae texto de una imagen usando OpenAI Vision API con múltiples intentos"""
         try:
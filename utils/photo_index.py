@@ -0,0 +1,303 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fotos (
+    file_id TEXT PRIMARY KEY,
+    sha256 TEXT,
+    nombre TEXT,
+    web_view_link TEXT,
+    web_content_link TEXT,
+    tamano INTEGER NOT NULL DEFAULT 0,
+    creado TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_fotos_sha256 ON fotos (sha256);
+CREATE TABLE IF NOT EXISTS carpetas (
+    raiz TEXT NOT NULL,
+    ruta TEXT NOT NULL,
+    folder_id TEXT NOT NULL,
+    PRIMARY KEY (raiz, ruta)
+);
+CREATE TABLE IF NOT EXISTS almacenamiento (
+    fecha TEXT NOT NULL,
+    carpeta TEXT NOT NULL,
+    bytes_subidos INTEGER NOT NULL DEFAULT 0,
+    bytes_eliminados INTEGER NOT NULL DEFAULT 0,
+    fotos_subidas INTEGER NOT NULL DEFAULT 0,
+    fotos_eliminadas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, carpeta)
+);
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+FIELDS = ('file_id', 'sha256', 'nombre', 'web_view_link', 'web_content_link', 'tamano', 'creado',
+          'tamano_original', 'dni', 'fecha', 'carpeta', 'usado')
+
+
+class PhotoIndex:
+    """Índice local (SQLite) de las fotos de DNI subidas a Google Drive.
+
+    Permite reconocer una foto ya subida por su SHA-256 sin consultar Drive,
+    guarda la miniatura de cada foto para mostrarla en el chat y el tamaño
+    original frente al archivado para medir el ahorro de almacenamiento.
+    Las fotos se buscan por (DNI, fecha) sin listar la carpeta en Drive, y las
+    vencidas (sin uso desde antes de una fecha) se eligen para la purga.
+    También recuerda los IDs de las carpetas AAAA/MM/DD ya creadas en Drive y
+    lleva la cuenta de bytes subidos y eliminados por día y carpeta.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """Agregar columnas nuevas a índices creados por versiones anteriores"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(fotos)")}
+        if 'tamano_original' not in columns:
+            self._conn.execute("ALTER TABLE fotos ADD COLUMN tamano_original INTEGER")
+        if 'miniatura' not in columns:
+            self._conn.execute("ALTER TABLE fotos ADD COLUMN miniatura BLOB")
+        for column in ('dni', 'fecha', 'carpeta', 'usado'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE fotos ADD COLUMN {column} TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fotos_dni ON fotos (dni, fecha)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fotos_carpeta ON fotos (carpeta)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add(self, file_id, sha256, nombre, web_view_link, web_content_link, tamano, creado=None,
+            tamano_original=None, miniatura=None, dni=None, fecha=None, carpeta=None):
+        """Guardar (o reemplazar) una foto del índice"""
+        creado = creado or datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO fotos ({', '.join(FIELDS)}, miniatura) "
+                f"VALUES ({', '.join('?' * (len(FIELDS) + 1))})",
+                (file_id, sha256, nombre, web_view_link, web_content_link, tamano, creado,
+                 tamano if tamano_original is None else tamano_original,
+                 dni, fecha or creado[:10], carpeta, None, miniatura)
+            )
+            self._conn.commit()
+
+    def merge_listed(self, carpeta, files, listed_at=None):
+        """Sincronizar una carpeta con su listado en Drive.
+
+        files son dicts con file_id, sha256, nombre, web_view_link, tamano,
+        creado, dni y fecha. Las fotos nuevas se agregan, las ya conocidas
+        completan los datos que les falten y las que ya no están en la carpeta
+        se quitan, salvo las agregadas después de listed_at (subidas mientras
+        se listaba). Devuelve (agregadas, eliminadas).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, creado FROM fotos WHERE carpeta = ?", (carpeta,)
+            ).fetchall()
+            known = {row[0] for row in rows}
+            recent = {row[0] for row in rows if listed_at and (row[1] or '') >= listed_at}
+            listed = set()
+            for f in files:
+                listed.add(f['file_id'])
+                self._conn.execute(
+                    "INSERT INTO fotos (file_id, sha256, nombre, web_view_link, tamano, creado, "
+                    "tamano_original, dni, fecha, carpeta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(file_id) DO UPDATE SET "
+                    "sha256 = COALESCE(fotos.sha256, excluded.sha256), "
+                    "dni = COALESCE(fotos.dni, excluded.dni), "
+                    "fecha = COALESCE(fotos.fecha, excluded.fecha), "
+                    "carpeta = excluded.carpeta "
+                    "WHERE fotos.carpeta IS NOT excluded.carpeta OR fotos.dni IS NULL "
+                    "OR fotos.fecha IS NULL OR fotos.sha256 IS NULL",
+                    (f['file_id'], f.get('sha256'), f.get('nombre'), f.get('web_view_link'),
+                     f.get('tamano', 0), f.get('creado'), f.get('tamano', 0),
+                     f.get('dni'), f.get('fecha'), carpeta)
+                )
+
+            removed = known - listed - recent
+            self._conn.executemany("DELETE FROM fotos WHERE file_id = ?", [(i,) for i in removed])
+            self._conn.commit()
+        return len(listed - known), len(removed)
+
+    def find_by_dni(self, dni, fecha=None):
+        """Fotos de un DNI (de un día si se indica fecha AAAA-MM-DD), la más reciente primero"""
+        query = f"SELECT {', '.join(FIELDS)} FROM fotos WHERE dni = ?"
+        params = [dni]
+        if fecha:
+            query += " AND fecha = ?"
+            params.append(fecha)
+        query += " ORDER BY fecha DESC, creado DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def record_storage(self, fecha, carpeta, subidos=0, eliminados=0, fotos_subidas=0, fotos_eliminadas=0):
+        """Sumar bytes y fotos subidos o eliminados en un día (AAAA-MM-DD) a una carpeta"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO almacenamiento (fecha, carpeta, bytes_subidos, bytes_eliminados, "
+                "fotos_subidas, fotos_eliminadas) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(fecha, carpeta) DO UPDATE SET "
+                "bytes_subidos = bytes_subidos + excluded.bytes_subidos, "
+                "bytes_eliminados = bytes_eliminados + excluded.bytes_eliminados, "
+                "fotos_subidas = fotos_subidas + excluded.fotos_subidas, "
+                "fotos_eliminadas = fotos_eliminadas + excluded.fotos_eliminadas",
+                (fecha, carpeta or '', subidos, eliminados, fotos_subidas, fotos_eliminadas)
+            )
+            self._conn.commit()
+
+    def storage_by_day(self, desde):
+        """Bytes y fotos subidos y eliminados por día desde la fecha desde (AAAA-MM-DD)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fecha, SUM(bytes_subidos), SUM(bytes_eliminados), SUM(fotos_subidas), "
+                "SUM(fotos_eliminadas), COUNT(*) FROM almacenamiento WHERE fecha >= ? "
+                "GROUP BY fecha ORDER BY fecha",
+                (desde,)
+            ).fetchall()
+        keys = ('fecha', 'subidos', 'eliminados', 'fotos_subidas', 'fotos_eliminadas', 'carpetas')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def storage_net(self):
+        """Bytes subidos menos eliminados desde que se lleva la cuenta"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(bytes_subidos - bytes_eliminados), 0) FROM almacenamiento"
+            ).fetchone()[0]
+
+    def get_state(self, clave, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT valor FROM estado WHERE clave = ?", (clave,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, clave, valor):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO estado (clave, valor) VALUES (?, ?)", (clave, valor)
+            )
+            self._conn.commit()
+
+    def get(self, file_id):
+        """Foto por ID de archivo ({campo: valor}), o None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM fotos WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def find_by_hash(self, sha256):
+        """Foto con ese contenido ({campo: valor}), o None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM fotos WHERE sha256 = ? LIMIT 1", (sha256,)
+            ).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def touch(self, file_id, fecha):
+        """Anotar que una foto se volvió a usar (el plazo de conservación cuenta desde ahí)"""
+        with self._lock:
+            self._conn.execute("UPDATE fotos SET usado = ? WHERE file_id = ?", (fecha, file_id))
+            self._conn.commit()
+
+    def expired(self, corte):
+        """Fotos sin uso desde antes de la fecha corte (AAAA-MM-DD), las más antiguas primero"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM fotos "
+                "WHERE COALESCE(usado, fecha, substr(creado, 1, 10)) < ? ORDER BY fecha, creado",
+                (corte,)
+            ).fetchall()
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def count_in_folder(self, carpeta):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM fotos WHERE carpeta = ?", (carpeta,)
+            ).fetchone()[0]
+
+    def get_thumbnail(self, file_id):
+        """Miniatura JPEG de una foto (bytes), o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT miniatura FROM fotos WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def storage_savings(self, day=None):
+        """Ahorro del archivado en las fotos subidas un día (por defecto hoy).
+
+        Devuelve {'fotos', 'original', 'archivado', 'ahorro'} con tamaños en bytes.
+        """
+        day = (day or datetime.now()).strftime('%Y-%m-%d')
+        with self._lock:
+            fotos, original, archivado = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(COALESCE(tamano_original, tamano)), 0), "
+                "COALESCE(SUM(tamano), 0) FROM fotos WHERE fecha = ?",
+                (day,)
+            ).fetchone()
+        return {
+            'fotos': fotos,
+            'original': original,
+            'archivado': archivado,
+            'ahorro': original - archivado,
+        }
+
+    def get_folder(self, raiz, ruta):
+        """ID de la carpeta ruta (ej: 2026/10/19) dentro de la carpeta raiz, o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT folder_id FROM carpetas WHERE raiz = ? AND ruta = ?", (raiz, ruta)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_folder(self, raiz, ruta, folder_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO carpetas (raiz, ruta, folder_id) VALUES (?, ?, ?)",
+                (raiz, ruta, folder_id)
+            )
+            self._conn.commit()
+
+    def folder_path(self, raiz, folder_id):
+        """Ruta (AAAA/MM/DD) de una carpeta conocida, o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ruta FROM carpetas WHERE raiz = ? AND folder_id = ?", (raiz, folder_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def remove_folders(self, raiz, rutas):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM carpetas WHERE raiz = ? AND ruta = ?", [(raiz, ruta) for ruta in rutas]
+            )
+            self._conn.commit()
+
+    def remove(self, file_id):
+        self.remove_many([file_id])
+
+    def remove_many(self, file_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM fotos WHERE file_id = ?", [(i,) for i in file_ids])
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fotos").fetchone()[0]
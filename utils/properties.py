@@ -0,0 +1,116 @@
+import logging
+import os
+from pathlib import Path
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Clave de la propiedad cuando solo se administra un hotel
+DEFAULT_PROPERTY = 'principal'
+
+
+def parse_rooms(value):
+    """Convertir '1-10' o '101,102,201-205' en la lista de habitaciones"""
+    rooms = []
+    for part in str(value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        if end and start.strip().isdigit() and end.strip().isdigit():
+            rooms.extend(str(i) for i in range(int(start), int(end) + 1))
+        else:
+            rooms.append(part)
+    return rooms
+
+
+class Property:
+    """Configuración de una propiedad (hotel): su hoja de cálculo, carpeta de Drive y habitaciones"""
+
+    def __init__(self, key, name, spreadsheet_id, drive_folder_id, rooms, users=(), db_path=None,
+                 spool_dir=None, photo_index_path=None):
+        self.key = key
+        self.name = name
+        self.spreadsheet_id = spreadsheet_id
+        self.drive_folder_id = drive_folder_id
+        self.rooms = list(rooms)
+        self.users = [int(user) for user in users]
+        self.db_path = db_path or Config.LOCAL_DB_PATH
+        # Fotos pendientes de subir a Drive (ej: data/fotos_pendientes/centro)
+        self.spool_dir = spool_dir or str(Path(Config.DRIVE_SPOOL_DIR) / key)
+        # Índice local de las fotos subidas a Drive (ej: data/hotel-centro-fotos.db)
+        if photo_index_path is None and self.db_path != ':memory:':
+            db_path = Path(self.db_path)
+            photo_index_path = str(db_path.with_name(f"{db_path.stem}-fotos{db_path.suffix}"))
+        self.photo_index_path = photo_index_path or ':memory:'
+
+    @classmethod
+    def default(cls):
+        """Propiedad única definida con las variables generales (GOOGLE_SHEETS_SPREADSHEET_ID, ...)"""
+        return cls(
+            key=DEFAULT_PROPERTY,
+            name=os.getenv('HOTEL_NOMBRE', 'Hotel'),
+            spreadsheet_id=Config.GOOGLE_SHEETS_SPREADSHEET_ID,
+            drive_folder_id=Config.GOOGLE_DRIVE_FOLDER_ID,
+            rooms=Config.HABITACIONES,
+            users=Config.AUTHORIZED_USERS
+        )
+
+    @classmethod
+    def from_env(cls, key):
+        """Propiedad definida con las variables HOTEL_<CLAVE>_*"""
+        prefix = f"HOTEL_{key.upper()}_"
+
+        # Cada propiedad tiene su propio almacén local (ej: data/hotel-centro.db)
+        db_path = Path(Config.LOCAL_DB_PATH)
+        db_path = db_path.with_name(f"{db_path.stem}-{key}{db_path.suffix}")
+
+        return cls(
+            key=key,
+            name=os.getenv(f'{prefix}NOMBRE', key.capitalize()),
+            spreadsheet_id=os.getenv(f'{prefix}SPREADSHEET_ID'),
+            drive_folder_id=os.getenv(f'{prefix}DRIVE_FOLDER_ID'),
+            rooms=parse_rooms(os.getenv(f'{prefix}HABITACIONES')) or Config.HABITACIONES,
+            users=[
+                user_id for user_id in os.getenv(f'{prefix}USUARIOS', '').split(',')
+                if user_id.strip()
+            ],
+            db_path=str(db_path)
+        )
+
+    def __repr__(self):
+        return f"Property(key={self.key!r}, name={self.name!r})"
+
+
+def load_properties():
+    """Propiedades configuradas, en el orden de HOTELES (o la propiedad única)"""
+    if not Config.HOTELES:
+        return {DEFAULT_PROPERTY: Property.default()}
+
+    properties = {}
+    for key in Config.HOTELES:
+        properties[key] = Property.from_env(key)
+        logger.info(f"Propiedad configurada: {properties[key].name} ({key})")
+    return properties
+
+
+def map_users(properties):
+    """Mapear cada usuario autorizado a su propiedad.
+
+    Los usuarios de HOTEL_<CLAVE>_USUARIOS trabajan en esa propiedad. Los de
+    AUTHORIZED_USERS que no están asignados registran en la primera propiedad
+    y pueden ver los reportes de todas.
+    """
+    user_properties = {}
+    for key, prop in properties.items():
+        for user_id in prop.users:
+            if user_id in user_properties and user_properties[user_id] != key:
+                logger.warning(f"Usuario {user_id} asignado a varias propiedades, se usa {user_properties[user_id]}")
+                continue
+            user_properties[user_id] = key
+
+    first = next(iter(properties))
+    for user_id in Config.AUTHORIZED_USERS:
+        user_properties.setdefault(user_id, first)
+
+    return user_properties
@@ -0,0 +1,309 @@
+from datetime import datetime, date
+from functools import lru_cache
+import re
+import pytz
+from config import Config
+
+# Día 0 de las fechas almacenadas como enteros (días desde 1970-01-01)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_PRICE_RE = re.compile(r'\d[\d.,]*')
+# Hora con fecha explícita, ej: '2026-10-20 15:00' (salidas de estancias de varias noches)
+_DATETIME_RE = re.compile(r'(\d{4}-\d{2}-\d{2})[ T](\d{1,2}:\d{2})')
+# Último separador seguido de 1 o 2 dígitos: punto decimal (con 3 dígitos es de miles)
+_DECIMAL_RE = re.compile(r'[.,](\d{1,2})$')
+
+
+def parse_price_cents(value):
+    """Convertir un precio de la hoja (ej: 'S/30', 'S/35.50', 'S/1,200', 30) a céntimos"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, (int, float)):
+        return int(round(value * 100))
+
+    match = _PRICE_RE.search(str(value).replace(' ', ''))
+    if not match:
+        return 0
+
+    number = match.group(0).rstrip('.,')
+    decimal = _DECIMAL_RE.search(number)
+    if decimal:
+        number = number[:decimal.start()]
+    cents = int(re.sub(r'[.,]', '', number)) * 100
+    if decimal:
+        cents += int(decimal.group(1).ljust(2, '0'))
+    return cents
+
+
+def format_soles(cents):
+    """Formatear céntimos como monto en soles (3000 -> '30', 3550 -> '35.50')"""
+    if cents % 100 == 0:
+        return str(cents // 100)
+    return f"{cents / 100:.2f}"
+
+
+def date_to_day(value):
+    """Convertir 'YYYY-MM-DD', date o datetime a días desde 1970-01-01"""
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        value = datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day):
+    """Convertir días desde 1970-01-01 a date"""
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+
+@lru_cache(maxsize=4096)
+def _midnight_epoch(day):
+    """Epoch de la medianoche local de un día (en la zona horaria del hotel)"""
+    tz = pytz.timezone(Config.TIMEZONE)
+    midnight = tz.localize(datetime.combine(day_to_date(day), datetime.min.time()))
+    return int(midnight.timestamp())
+
+
+def _parse_minutes(value):
+    """Convertir 'HH:MM' a minutos desde medianoche, o None"""
+    parts = str(value or '').strip().split(':')
+    if len(parts) < 2 or not parts[0].isdigit() or not parts[1][:2].isdigit():
+        return None
+    return int(parts[0]) * 60 + int(parts[1][:2])
+
+
+def time_to_epoch(day, value, not_before=None):
+    """Epoch de una hora 'HH:MM' en un día; pasa al día siguiente si es anterior a not_before.
+
+    Con 'AAAA-MM-DD HH:MM' se usa esa fecha y no se ajusta el día.
+    """
+    match = _DATETIME_RE.match(str(value or '').strip())
+    if match:
+        day, value, not_before = date_to_day(match.group(1)), match.group(2), None
+
+    minutes = _parse_minutes(value)
+    if minutes is None:
+        return None
+
+    timestamp = _midnight_epoch(day) + minutes * 60
+    if not_before is not None and timestamp < not_before:
+        timestamp = _midnight_epoch(day + 1) + minutes * 60
+    return timestamp
+
+
+def epoch_to_time(timestamp):
+    """Formatear un epoch como 'HH:MM' en la zona horaria del hotel"""
+    if timestamp is None:
+        return ''
+    tz = pytz.timezone(Config.TIMEZONE)
+    return datetime.fromtimestamp(timestamp, tz).strftime('%H:%M')
+
+
+def epoch_to_moment(timestamp, day, not_before=None):
+    """Formatear un epoch como 'HH:MM', o como 'AAAA-MM-DD HH:MM' si la hora sola
+    no lo ubica en su día al leerla con time_to_epoch (ej: salida dos días después)"""
+    value = epoch_to_time(timestamp)
+    if not value or time_to_epoch(day, value, not_before=not_before) == timestamp:
+        return value
+    tz = pytz.timezone(Config.TIMEZONE)
+    return datetime.fromtimestamp(timestamp, tz).strftime('%Y-%m-%d %H:%M')
+
+
+class Registro:
+    """Registro de cliente con los tipos ya convertidos.
+
+    Se construye una sola vez al leer de Google Sheets: el precio queda en
+    céntimos, las horas como epoch y la habitación como entero. Usa __slots__
+    para que el historial ocupe poca memoria.
+    """
+
+    __slots__ = (
+        'id',               # Identificador en el almacén local
+        'hoja',             # Partición de Google Sheets donde vive la fila
+        'fila',             # Número de fila en su hoja (para actualizaciones)
+        'dia',              # Días desde 1970-01-01
+        'ingreso',          # Epoch de la hora de ingreso
+        'salida_estimada',  # Epoch de la hora de salida estimada
+        'salida_real',      # Epoch de la hora de salida real, o None
+        'habitacion',       # Número de habitación, 0 si no es numérica
+        'habitacion_texto', # Nombre original si la habitación no es numérica
+        'dni',
+        'nombre',
+        'nacionalidad',
+        'duracion',
+        'precio_cents',
+        'forma_pago',
+        'observaciones',
+        'registrado_por',
+        'id_registro',      # Clave única de la sesión de registro (idempotencia)
+        'foto_url',         # Enlace a la foto del DNI en Google Drive
+        'foto_drive_id',    # ID del archivo de la foto en Google Drive
+    )
+
+    # Columna de la hoja -> atributo de texto
+    TEXT_COLUMNS = {
+        'DNI': 'dni',
+        'Nombre': 'nombre',
+        'Nacionalidad': 'nacionalidad',
+        'Duración': 'duracion',
+        'Forma de Pago': 'forma_pago',
+        'Observaciones': 'observaciones',
+        'Registrado por': 'registrado_por',
+    }
+
+    # Columna de la hoja -> atributo de texto opcional (vacío = None)
+    OPTIONAL_COLUMNS = {
+        'ID Registro': 'id_registro',
+        'Foto DNI': 'foto_url',
+        'ID Foto': 'foto_drive_id',
+    }
+
+    # Atributos con los datos del registro, en el orden del almacén local
+    DATA_FIELDS = (
+        'dia', 'ingreso', 'salida_estimada', 'salida_real', 'habitacion',
+        'habitacion_texto', 'dni', 'nombre', 'nacionalidad', 'duracion',
+        'precio_cents', 'forma_pago', 'observaciones', 'registrado_por',
+        'id_registro', 'foto_url', 'foto_drive_id',
+    )
+
+    # Columnas de la hoja de registros, en orden
+    SHEET_COLUMNS = (
+        'Fecha', 'Hora Ingreso', 'Hora Salida Estimada', 'Habitación', 'DNI',
+        'Nombre', 'Nacionalidad', 'Duración', 'Precio', 'Forma de Pago',
+        'Observaciones', 'Registrado por', 'Hora Salida Real', 'ID Registro',
+        'Foto DNI', 'ID Foto',
+    )
+
+    # Columnas internas que no se muestran al personal
+    HIDDEN_COLUMNS = ('ID Registro', 'ID Foto')
+
+    def __init__(self, **values):
+        for slot in self.__slots__:
+            setattr(self, slot, values.get(slot))
+
+    @property
+    def fecha(self):
+        """Fecha del registro en formato 'YYYY-MM-DD'"""
+        return day_to_date(self.dia).isoformat()
+
+    @property
+    def habitacion_label(self):
+        """Habitación tal como se muestra al usuario"""
+        if self.habitacion:
+            return str(self.habitacion)
+        return self.habitacion_texto or ''
+
+    @classmethod
+    def column_index(cls, header_row):
+        """Mapear cada encabezado a su posición en la fila"""
+        return {header: i for i, header in enumerate(header_row) if header}
+
+    @classmethod
+    def from_row(cls, row, index, fila=None, hoja=None):
+        """Construir un registro a partir de una fila de get_all_values()"""
+        def cell(header):
+            position = index.get(header)
+            if position is None or position >= len(row):
+                return ''
+            return row[position]
+
+        fecha = cell('Fecha')
+        if not fecha:
+            return None
+        try:
+            dia = date_to_day(fecha)
+        except ValueError:
+            return None
+
+        ingreso = time_to_epoch(dia, cell('Hora Ingreso'))
+        habitacion = str(cell('Habitación')).strip()
+
+        registro = cls(
+            hoja=hoja,
+            fila=fila,
+            dia=dia,
+            ingreso=ingreso,
+            salida_estimada=time_to_epoch(dia, cell('Hora Salida Estimada'), not_before=ingreso),
+            salida_real=time_to_epoch(dia, cell('Hora Salida Real'), not_before=ingreso),
+            habitacion=int(habitacion) if habitacion.isdigit() else 0,
+            habitacion_texto=None if habitacion.isdigit() else habitacion,
+            precio_cents=parse_price_cents(cell('Precio')),
+        )
+
+        for header, attribute in cls.TEXT_COLUMNS.items():
+            setattr(registro, attribute, str(cell(header)))
+        for header, attribute in cls.OPTIONAL_COLUMNS.items():
+            setattr(registro, attribute, str(cell(header)).strip() or None)
+
+        return registro
+
+    @classmethod
+    def from_values(cls, values, first_row=2, hoja=None):
+        """Convertir el resultado de get_all_values() (con encabezados) en registros"""
+        if not values:
+            return []
+
+        index = cls.column_index(values[0])
+        records = []
+        for fila, row in enumerate(values[1:], start=first_row):
+            registro = cls.from_row(row, index, fila=fila, hoja=hoja)
+            if registro is not None:
+                records.append(registro)
+        return records
+
+    @classmethod
+    def from_client_data(cls, client_data):
+        """Construir un registro a partir de los datos recopilados por el bot"""
+        row = [
+            client_data.get('fecha', ''),
+            client_data.get('hora_ingreso', ''),
+            client_data.get('hora_salida_estimada', ''),
+            client_data.get('habitacion', ''),
+            client_data.get('dni', ''),
+            client_data.get('nombre', ''),
+            client_data.get('nacionalidad', ''),
+            client_data.get('duracion', ''),
+            client_data.get('precio', ''),
+            client_data.get('forma_pago', ''),
+            client_data.get('observaciones', ''),
+            client_data.get('registrado_por', ''),
+            client_data.get('hora_salida_real', ''),
+            client_data.get('id_registro', ''),
+            client_data.get('foto_url', ''),
+            client_data.get('foto_drive_id', ''),
+        ]
+        index = {header: i for i, header in enumerate(cls.SHEET_COLUMNS)}
+        return cls.from_row([str(value or '') for value in row], index)
+
+    def data(self):
+        """Tupla con los datos del registro (para comparar y guardar)"""
+        return tuple(getattr(self, field) for field in self.DATA_FIELDS)
+
+    def to_row(self):
+        """Fila para Google Sheets, en el orden de SHEET_COLUMNS"""
+        values = self.to_dict()
+        return [values[column] for column in self.SHEET_COLUMNS]
+
+    def to_dict(self):
+        """Representación con los encabezados de la hoja (para reportes y exportación)"""
+        return {
+            'Fecha': self.fecha,
+            'Hora Ingreso': epoch_to_time(self.ingreso),
+            'Hora Salida Estimada': epoch_to_time(self.salida_estimada),
+            'Habitación': self.habitacion_label,
+            'DNI': self.dni,
+            'Nombre': self.nombre,
+            'Nacionalidad': self.nacionalidad,
+            'Duración': self.duracion,
+            'Precio': f"S/{format_soles(self.precio_cents)}",
+            'Forma de Pago': self.forma_pago,
+            'Observaciones': self.observaciones,
+            'Registrado por': self.registrado_por,
+            'Hora Salida Real': epoch_to_moment(self.salida_real, self.dia, not_before=self.ingreso),
+            'ID Registro': self.id_registro or '',
+            'Foto DNI': self.foto_url or '',
+            'ID Foto': self.foto_drive_id or '',
+        }
+
+    def __repr__(self):
+        return f"Registro(fecha={self.fecha!r}, habitacion={self.habitacion_label!r}, dni={self.dni!r})"
@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+import logging
+import numpy as np
+from utils.records import date_to_day, day_to_date, time_to_epoch
+
+logger = logging.getLogger(__name__)
+
+
+class ReportEngine:
+    """Reportes por rango de fechas calculados sobre columnas NumPy"""
+
+    def __init__(self, sheets_manager):
+        self.sheets_manager = sheets_manager
+        self._cache = {}  # (inicio, fin) -> reporte de periodos cerrados
+        # Un periodo cerrado cambia si se importa o se edita en Sheets uno de sus días
+        sheets_manager.subscribe(self._on_change)
+
+    def _on_change(self, event):
+        """Descartar los reportes en caché que incluyen el día del registro cambiado"""
+        if not self._cache:
+            return
+
+        days = {event.registro.fecha}
+        if event.anterior is not None:
+            days.add(event.anterior.fecha)
+
+        for key in list(self._cache):
+            start, end = key
+            if any(start <= day <= end for day in days):
+                self._cache.pop(key, None)
+
+    @staticmethod
+    def build_columns(records):
+        """Convertir registros tipados en arreglos columnares"""
+        count = len(records)
+        columns = {
+            'dia': np.fromiter((r.dia for r in records), dtype=np.int32, count=count),
+            'habitacion': np.fromiter((r.habitacion for r in records), dtype=np.int32, count=count),
+            'precio': np.fromiter((r.precio_cents for r in records), dtype=np.int64, count=count),
+            # -1 marca horas vacías o inválidas
+            'ingreso': np.fromiter(
+                (r.ingreso if r.ingreso is not None else -1 for r in records),
+                dtype=np.int64, count=count
+            ),
+            'salida': np.fromiter(
+                (
+                    r.salida_real if r.salida_real is not None
+                    else r.salida_estimada if r.salida_estimada is not None
+                    else -1
+                    for r in records
+                ),
+                dtype=np.int64, count=count
+            ),
+        }
+
+        # Formas de pago codificadas como enteros
+        payment_names, payment_codes = np.unique(
+            np.array([r.forma_pago or 'Sin especificar' for r in records], dtype=object),
+            return_inverse=True
+        )
+        columns['forma_pago'] = payment_codes.astype(np.int32)
+        columns['formas_pago'] = list(payment_names)
+
+        return columns
+
+    @staticmethod
+    def parse_period(args, today=None):
+        """Interpretar argumentos de /reporte: semana, mes, anterior (mes pasado) o desde..hasta"""
+        today = today or date.today()
+
+        if not args or args[0].lower() == 'semana':
+            return today - timedelta(days=6), today
+        if args[0].lower() == 'mes':
+            return today.replace(day=1), today
+        if args[0].lower() == 'anterior':
+            end = today.replace(day=1) - timedelta(days=1)
+            return end.replace(day=1), end
+
+        text = ' '.join(args).replace('..', ' ').split()
+        if len(text) != 2:
+            raise ValueError("Formato de periodo no válido")
+
+        start = datetime.strptime(text[0], '%Y-%m-%d').date()
+        end = datetime.strptime(text[1], '%Y-%m-%d').date()
+        if start > end:
+            raise ValueError("La fecha inicial es posterior a la final")
+        return start, end
+
+    def generate(self, start_date, end_date):
+        """Generar el reporte de un periodo (inclusive), usando caché si está cerrado"""
+        key = (start_date.isoformat(), end_date.isoformat())
+        if key in self._cache:
+            return self._cache[key]
+
+        records = self.sheets_manager.get_records_by_date_range(start_date, end_date)
+        report = self._aggregate(records, start_date, end_date)
+
+        # Un periodo que terminó antes de hoy ya no cambia. Los periodos vacíos
+        # no se guardan: pueden venir de un error de lectura transitorio.
+        if end_date < date.today() and records:
+            self._cache[key] = report
+
+        return report
+
+    @staticmethod
+    def generate_across(engines, start_date, end_date):
+        """Generar en paralelo el reporte de varias propiedades ({nombre: motor}) y combinarlos"""
+        with ThreadPoolExecutor(max_workers=len(engines) or 1, thread_name_prefix='reporte') as executor:
+            futures = {
+                name: executor.submit(engine.generate, start_date, end_date)
+                for name, engine in engines.items()
+            }
+            reports = {name: future.result() for name, future in futures.items()}
+        
+        return ReportEngine.merge(reports)
+    
+    @staticmethod
+    def merge(reports):
+        """Combinar reportes del mismo periodo ({nombre: reporte}) en uno solo"""
+        first = next(iter(reports.values()))
+        merged = {
+            'start': first['start'],
+            'end': first['end'],
+            'days': first['days'],
+            'total_clients': 0,
+            'total_revenue_cents': 0,
+            'revenue_by_day': {},
+            'average_stay_hours': 0.0,
+            'stays': 0,
+            'occupancy': {},
+            'payment_mix': {},
+            'properties': {}
+        }
+        
+        stay_hours = 0.0
+        for name, report in reports.items():
+            merged['total_clients'] += report['total_clients']
+            merged['total_revenue_cents'] += report['total_revenue_cents']
+            merged['stays'] += report['stays']
+            stay_hours += report['average_stay_hours'] * report['stays']
+            
+            for day, revenue in report['revenue_by_day'].items():
+                merged['revenue_by_day'][day] = merged['revenue_by_day'].get(day, 0) + revenue
+            
+            for method, mix in report['payment_mix'].items():
+                total = merged['payment_mix'].setdefault(method, {'count': 0, 'revenue_cents': 0})
+                total['count'] += mix['count']
+                total['revenue_cents'] += mix['revenue_cents']
+            
+            # Las habitaciones se repiten entre propiedades: la ocupación se resume por propiedad
+            rates = list(report['occupancy'].values())
+            merged['properties'][name] = {
+                'total_clients': report['total_clients'],
+                'total_revenue_cents': report['total_revenue_cents'],
+                'occupancy': sum(rates) / len(rates) if rates else 0.0
+            }
+        
+        if merged['stays']:
+            merged['average_stay_hours'] = stay_hours / merged['stays']
+        merged['revenue_by_day'] = dict(sorted(merged['revenue_by_day'].items()))
+        
+        return merged
+    
+    def _aggregate(self, records, start_date, end_date):
+        """Calcular ingresos, ocupación, estancia promedio y formas de pago"""
+        start_day = date_to_day(start_date)
+        end_day = date_to_day(end_date)
+        days = end_day - start_day + 1
+
+        report = {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'days': days,
+            'total_clients': len(records),
+            'total_revenue_cents': 0,
+            'revenue_by_day': {},
+            'average_stay_hours': 0.0,
+            'stays': 0,  # Estancias con horas válidas (base del promedio)
+            'occupancy': {},
+            'payment_mix': {}
+        }
+
+        rooms = sorted(int(room) for room in self.sheets_manager.hotel.rooms if room.isdigit())
+        report['occupancy'] = {room: 0.0 for room in rooms}
+
+        if not records:
+            return report
+
+        columns = self.build_columns(records)
+        precio = columns['precio']
+
+        report['total_revenue_cents'] = int(precio.sum())
+
+        # Ingresos por día del periodo
+        revenue_by_day = np.bincount(columns['dia'] - start_day, weights=precio, minlength=days)
+        report['revenue_by_day'] = {
+            day_to_date(start_day + i).isoformat(): int(total)
+            for i, total in enumerate(revenue_by_day) if total
+        }
+
+        # Estancias con horas válidas
+        ingreso = columns['ingreso']
+        salida = columns['salida']
+        valid = (ingreso >= 0) & (salida > ingreso)
+        report['stays'] = int(valid.sum())
+        if valid.any():
+            report['average_stay_hours'] = float((salida[valid] - ingreso[valid]).mean() / 3600)
+
+        # Ocupación: horas ocupadas dentro del periodo / horas del periodo
+        period_start = time_to_epoch(start_day, '00:00')
+        period_end = time_to_epoch(end_day + 1, '00:00')
+        occupied = np.clip(salida, period_start, period_end) - np.clip(ingreso, period_start, period_end)
+        occupied = np.where(valid, occupied, 0)
+
+        if rooms:
+            seconds_by_room = np.bincount(
+                columns['habitacion'], weights=occupied, minlength=rooms[-1] + 1
+            )
+            period_seconds = period_end - period_start
+            report['occupancy'] = {
+                room: float(seconds_by_room[room] / period_seconds) for room in rooms
+            }
+
+        # Distribución de formas de pago
+        codes = columns['forma_pago']
+        names = columns['formas_pago']
+        counts = np.bincount(codes, minlength=len(names))
+        revenue = np.bincount(codes, weights=precio, minlength=len(names))
+        report['payment_mix'] = {
+            name: {'count': int(counts[i]), 'revenue_cents': int(revenue[i])}
+            for i, name in enumerate(names)
+        }
+
+        return report
@@ -1,18 +1,87 @@
 import gspread
+from gspread.urls import DRIVE_FILES_API_V3_URL
 from google.oauth2.service_account import Credentials
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from itertools import groupby, islice
+import csv
+import io
+import json
 import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
 from config import Config
+from utils import events
+from utils.events import EventFeed
+from utils.local_store import LocalStore
+from utils.properties import Property
+from utils.records import Registro, date_to_day, format_soles
+from utils.sheets_scheduler import SheetsScheduler
 
 logger = logging.getLogger(__name__)
 
+# Exportación CSV de una hoja (una sola petición HTTP, respuesta en streaming)
+SHEETS_CSV_EXPORT_URL = "https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export"
+
+# Fila inicial del rango devuelto por append_rows, ej: 'Registros-2026-10'!A5:N7
+_UPDATED_RANGE_RE = re.compile(r'!\$?[A-Z]+\$?(\d+)')
+
+# Registros por bloque al importar hojas cerradas al almacén local
+IMPORT_CHUNK_ROWS = 5000
+
+# Filas por llamada a append_rows al replicar (cargas masivas)
+APPEND_CHUNK_ROWS = 5000
+
+# Horas que se guarda la foto de un registro aún no confirmado
+PENDING_PHOTO_HOURS = 24
+
+# Permiso en la tabla estado: un solo proceso replica cada base local (el bot
+# o importar_historico.py); vence si no se renueva en REPLICATION_LEASE_SECONDS
+REPLICATION_LEASE = 'replicador'
+REPLICATION_LEASE_SECONDS = 120
+
+# Columnas que el bot cambia en filas ya replicadas (salida y foto); el resto
+# de la fila pertenece a la hoja y puede haberse editado a mano
+LOCAL_UPDATE_COLUMNS = ('Hora Salida Real', 'Foto DNI', 'ID Foto')
+
 class SheetsManager:
-    """Manejador para Google Sheets"""
+    """Manejador de registros: SQLite local como sistema de registro y Google Sheets como réplica"""
+    
+    # Encabezados de cada hoja de registros (las filas replicadas ocupan A:N)
+    HEADERS = list(Registro.SHEET_COLUMNS)
     
-    def __init__(self):
-        self.gc = None
-        self.worksheet = None
-        self._authenticate()
+    def __init__(self, hotel=None, scheduler=None, client=None, replicate=True):
+        self.hotel = hotel or Property.default()  # Propiedad cuya hoja de cálculo se administra
+        self.gc = client  # Cliente gspread (uno en memoria para pruebas: utils/fake_gspread.py)
+        self.spreadsheet = None
+        self.worksheet = None  # Partición del mes actual
+        self._partitions = {}  # nombre de hoja -> worksheet
+        self._legacy_worksheet = None  # Hoja única anterior a las particiones
+        self._checked_headers = set()  # Hojas con la columna 'Hora Salida Real' verificada
+        self._revision = None  # Versión del archivo en Drive ya reflejada localmente
+        self._revision_checked_at = 0.0
+        # Cuota, lecturas agrupadas y escrituras en lote; la cuota es de la cuenta
+        # de servicio, así que las propiedades pueden compartir el planificador
+        self.scheduler = scheduler or SheetsScheduler()
+        self.store = LocalStore(self.hotel.db_path)  # Sistema de registro local
+        self.events = EventFeed()  # Altas, salidas y ediciones, para vistas derivadas
+        
+        # Replicación en segundo plano hacia Google Sheets
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._replicator = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Alta del registro y llegada de su foto (subida en segundo plano)
+        self._photo_lock = threading.Lock()
+        
+        if self.gc is None:
+            self._authenticate()
+        if replicate:
+            self._start_replicator()
     
     def _authenticate(self):
         """Autenticación con Google Sheets"""
@@ -20,7 +89,9 @@ class SheetsManager:
             # Definir el alcance
             scope = [
                 "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive.file"
+                "https://www.googleapis.com/auth/drive.file",
+                # Para consultar la versión del archivo sin descargar la hoja
+                "https://www.googleapis.com/auth/drive.metadata.readonly"
             ]
             
             # Autenticar usando el archivo de credenciales
@@ -29,116 +100,646 @@ class SheetsManager:
                 scopes=scope
             )
             
-            # Crear cliente de gspread
+            # Crear cliente de gspread (sin peticiones HTTP: la hoja se abre
+            # desde el hilo de replicación y el bot atiende con el almacén local)
             self.gc = gspread.authorize(creds)
             
-            # Abrir la hoja de cálculo
-            spreadsheet = self.gc.open_by_key(Config.GOOGLE_SHEETS_SPREADSHEET_ID)
-            
-            # Obtener o crear la hoja de trabajo
-            try:
-                self.worksheet = spreadsheet.worksheet(Config.GOOGLE_SHEETS_WORKSHEET_NAME)
-            except gspread.WorksheetNotFound:
-                # Crear nueva hoja si no existe
-                self.worksheet = spreadsheet.add_worksheet(
-                    title=Config.GOOGLE_SHEETS_WORKSHEET_NAME,
-                    rows=1000,
-                    cols=12
-                )
-                self._create_headers()
-            
-            logger.info("Autenticación con Google Sheets exitosa")
-            
         except Exception as e:
             logger.error(f"Error al autenticar con Google Sheets: {str(e)}")
             raise
     
-    def _create_headers(self):
+    def _connect(self):
+        """Abrir la hoja de cálculo y preparar las particiones"""
+        try:
+            # Abrir la hoja de cálculo
+            self.spreadsheet = self.scheduler.call(
+                lambda: self.gc.open_by_key(self.hotel.spreadsheet_id)
+            )
+            
+            # Cargar particiones existentes y preparar la del mes actual y la siguiente
+            self._load_partitions()
+            self.worksheet = self._get_partition(date.today())
+            self._ensure_next_partition()
+        except Exception:
+            self.spreadsheet = None
+            raise
+    
+    def _create_headers(self, worksheet=None):
         """Crear encabezados en la hoja de cálculo"""
-        headers = [
-            'Fecha',
-            'Hora Ingreso',
-            'Hora Salida Estimada',
-            'Habitación',
-            'DNI',
-            'Nombre',
-            'Nacionalidad',
-            'Duración',
-            'Precio',
-            'Forma de Pago',
-            'Observaciones',
-            'Registrado por'
-        ]
+        worksheet = worksheet or self.worksheet
         
         try:
-            self.worksheet.update('A1:L1', [headers])
-            logger.info("Encabezados creados en Google Sheets")
+            self.scheduler.call(lambda: worksheet.update(
+                f"A1:{self._last_column()}1", [self.HEADERS]
+            ))
+            # Las claves internas (ID Registro, ID Foto) no son para el personal: columnas ocultas
+            for header in Registro.HIDDEN_COLUMNS:
+                column = self.HEADERS.index(header)
+                self.scheduler.call(lambda: worksheet.hide_columns(column, column + 1))
+            logger.info(f"Encabezados creados en Google Sheets: {worksheet.title}")
         except Exception as e:
             logger.error(f"Error al crear encabezados: {str(e)}")
     
+    def _last_column(self):
+        """Letra de la última columna de registros"""
+        return chr(ord('A') + len(self.HEADERS) - 1)
+    
+    def _column_letter(self, header):
+        """Letra de la columna de un encabezado"""
+        return chr(ord('A') + self.HEADERS.index(header))
+    
+    def _ensure_headers(self, worksheet, header_row=None):
+        """Agregar las columnas nuevas ('Hora Salida Real', 'ID Registro', 'Foto DNI', ...) a hojas creadas antes"""
+        if worksheet.title in self._checked_headers:
+            return
+        
+        if header_row is None:
+            header_row = self.scheduler.call(lambda: worksheet.row_values(1))
+        
+        if list(header_row[:len(self.HEADERS)]) != self.HEADERS:
+            if worksheet.col_count < len(self.HEADERS):
+                self.scheduler.call(lambda: worksheet.add_cols(len(self.HEADERS) - worksheet.col_count))
+            self._create_headers(worksheet)
+        
+        self._checked_headers.add(worksheet.title)
+    
+    # ------------------------------------------------------------------
+    # Particiones mensuales
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _to_date(value):
+        """Convertir 'YYYY-MM-DD', date o datetime a date"""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    
+    @staticmethod
+    def _month_start(day):
+        """Primer día del mes de una fecha"""
+        return day.replace(day=1)
+    
+    @staticmethod
+    def _next_month(month):
+        """Primer día del mes siguiente"""
+        if month.month == 12:
+            return month.replace(year=month.year + 1, month=1, day=1)
+        return month.replace(month=month.month + 1, day=1)
+    
+    def _partition_name(self, day):
+        """Nombre de la partición mensual, ej: Registros-2026-10"""
+        return f"{Config.GOOGLE_SHEETS_WORKSHEET_NAME}-{day:%Y-%m}"
+    
+    def _partition_month(self, name):
+        """Primer día del mes de una partición a partir de su nombre"""
+        return self._to_date(f"{name[-7:]}-01")
+    
+    def _is_closed(self, month):
+        """Un mes anterior al actual ya no recibe registros y es inmutable"""
+        return month < self._month_start(date.today())
+    
+    def _load_partitions(self):
+        """Cargar las particiones existentes con una sola consulta de metadatos"""
+        prefix = f"{Config.GOOGLE_SHEETS_WORKSHEET_NAME}-"
+        
+        for worksheet in self.scheduler.call(self.spreadsheet.worksheets):
+            if worksheet.title == Config.GOOGLE_SHEETS_WORKSHEET_NAME:
+                self._legacy_worksheet = worksheet
+            elif worksheet.title.startswith(prefix):
+                self._partitions[worksheet.title] = worksheet
+        
+        logger.info(f"Particiones mensuales encontradas: {len(self._partitions)}")
+    
+    def _get_partition(self, day, create=True):
+        """Obtener (o crear) la hoja del mes correspondiente a una fecha"""
+        name = self._partition_name(day)
+        
+        if name in self._partitions or not create:
+            return self._partitions.get(name)
+        
+        try:
+            worksheet = self.scheduler.call(lambda: self.spreadsheet.add_worksheet(
+                title=name,
+                rows=Config.GOOGLE_SHEETS_PARTITION_ROWS,
+                cols=len(self.HEADERS)
+            ))
+            self._create_headers(worksheet)
+            self._checked_headers.add(name)
+            if self._is_closed(day):
+                # Hoja nueva de un mes pasado (importación histórica): su contenido
+                # sale del almacén local, no hace falta copiarla de vuelta
+                self.store.set_state(f"importada:{name}", datetime.now().isoformat())
+            logger.info(f"Partición mensual creada: {name}")
+        except gspread.exceptions.APIError:
+            # Otra instancia pudo haberla creado al mismo tiempo
+            worksheet = self.scheduler.call(lambda: self.spreadsheet.worksheet(name))
+        
+        self._partitions[name] = worksheet
+        return worksheet
+    
+    def _get_worksheet(self, name):
+        """Obtener la hoja donde vive un registro (partición o la hoja única anterior)"""
+        if self._legacy_worksheet and name == self._legacy_worksheet.title:
+            return self._legacy_worksheet
+        return self._get_partition(self._partition_month(name))
+    
+    def _ensure_next_partition(self):
+        """Crear por adelantado la partición del mes siguiente"""
+        try:
+            next_month = self._next_month(self._month_start(date.today()))
+            self._get_partition(next_month)
+        except Exception as e:
+            logger.warning(f"No se pudo crear la partición del mes siguiente: {str(e)}")
+    
+    def _new_revision(self):
+        """Versión nueva de la hoja en Drive desde la última sincronización, o None.
+        
+        Consulta solo los metadatos del archivo (version, modifiedTime), como
+        máximo una vez cada GOOGLE_SHEETS_REVISION_CHECK_SECONDS, para detectar
+        ediciones hechas a mano en Google Sheets sin descargar los datos. La
+        versión se da por reflejada (self._revision) solo después de conciliar.
+        """
+        now = time.monotonic()
+        if self._revision is not None and \
+                now - self._revision_checked_at < Config.GOOGLE_SHEETS_REVISION_CHECK_SECONDS:
+            return None
+        self._revision_checked_at = now
+        
+        metadata = self.scheduler.read(('revision', self.spreadsheet.id), lambda: self.gc.request(
+            'get',
+            f"{DRIVE_FILES_API_V3_URL}/{self.spreadsheet.id}",
+            params={'fields': 'version,modifiedTime', 'supportsAllDrives': True}
+        ).json())
+        
+        revision = metadata.get('version')
+        if revision == self._revision:
+            return None
+        
+        if self._revision is not None:
+            logger.info(
+                f"Cambios detectados en Google Sheets (versión {self._revision} -> {revision}, "
+                f"modificado {metadata.get('modifiedTime')})"
+            )
+        return revision
+    
+    # ------------------------------------------------------------------
+    # Lectura en streaming (exportación CSV)
+    # ------------------------------------------------------------------
+    
+    def _open_csv_export(self, worksheet):
+        """Abrir la exportación CSV de una hoja como respuesta en streaming"""
+        response = self.gc.session.get(
+            SHEETS_CSV_EXPORT_URL.format(spreadsheet_id=self.spreadsheet.id),
+            params={'format': 'csv', 'gid': worksheet.id},
+            stream=True
+        )
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+    
+    def _stream_worksheet_rows(self, worksheet):
+        """Generar las filas de una hoja leyendo su exportación CSV en streaming"""
+        response = self.scheduler.call(lambda: self._open_csv_export(worksheet))
+        
+        try:
+            # Decodificar gzip al vuelo y respetar saltos de línea dentro de celdas
+            response.raw.decode_content = True
+            text = io.TextIOWrapper(response.raw, encoding='utf-8', newline='')
+            yield from csv.reader(text)
+        finally:
+            response.close()
+    
+    def _stream_worksheet_records(self, worksheet):
+        """Generar registros tipados de una hoja sin cargarla completa en memoria"""
+        rows = self._stream_worksheet_rows(worksheet)
+        header = next(rows, None)
+        if not header:
+            return
+        
+        index = Registro.column_index(header)
+        for fila, row in enumerate(rows, start=2):
+            registro = Registro.from_row(row, index, fila=fila, hoja=worksheet.title)
+            if registro is not None:
+                yield registro
+    
+    # ------------------------------------------------------------------
+    # Replicación con Google Sheets
+    # ------------------------------------------------------------------
+    
+    def _start_replicator(self):
+        """Iniciar el hilo que replica el almacén local en Google Sheets"""
+        self._replicator = threading.Thread(
+            target=self._replication_loop,
+            name=f'sheets-replicator-{self.hotel.key}',
+            daemon=True
+        )
+        self._replicator.start()
+    
+    def _replication_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_with_sheets()
+            except Exception as e:
+                logger.warning(f"Replicación con Google Sheets pendiente: {str(e)}")
+            
+            self._wake.wait(Config.SHEETS_REPLICATION_SECONDS)
+            self._wake.clear()
+    
+    def stop(self):
+        """Detener la replicación en segundo plano y liberar el permiso de réplica"""
+        self._stop.set()
+        self._wake.set()
+        with self._sync_lock:
+            self.store.release_lease(REPLICATION_LEASE, self._owner)
+    
+    def acquire_replication(self):
+        """Tomar o renovar el permiso de réplica; devuelve el otro proceso que lo tiene, o None.
+        
+        Dos procesos replicando la misma base (el bot y una importación)
+        enviarían las mismas filas pendientes dos veces.
+        """
+        return self.store.acquire_lease(REPLICATION_LEASE, self._owner, REPLICATION_LEASE_SECONDS)
+    
+    def sync_with_sheets(self):
+        """Enviar cambios locales a Sheets y traer las ediciones hechas a mano.
+        
+        Devuelve False sin sincronizar si otro proceso replica la misma base.
+        """
+        with self._sync_lock:
+            holder = self.acquire_replication()
+            if holder:
+                logger.warning(f"Otro proceso ({holder}) replica {self.hotel.db_path}: sincronización omitida")
+                return False
+            
+            if not self.spreadsheet:
+                self._connect()
+                logger.info("Conexión con Google Sheets establecida")
+            
+            self._import_closed_partitions()
+            
+            # Reflejar la hoja antes de enviar: un registro que llegó a Sheets
+            # sin marcarse como replicado se vincula por su ID Registro en vez
+            # de enviarse otra vez. Las actualizaciones se escriben por número
+            # de fila, así que antes se consulta la versión sin esperar el
+            # intervalo: una fila borrada a mano desplaza las de abajo
+            if self.store.has_pending_updates():
+                self._revision_checked_at = 0.0
+            revision = self._new_revision()
+            if revision is not None:
+                self._reconcile_open_partitions()
+                # Si la conciliación falla, la misma versión se vuelve a procesar
+                self._revision = revision
+            
+            self._push_pending()
+        return True
+    
+    def _import_closed_partitions(self):
+        """Copiar una sola vez al almacén local las hojas inmutables (meses cerrados)"""
+        worksheets = [self._legacy_worksheet] if self._legacy_worksheet else []
+        worksheets.extend(
+            worksheet for name, worksheet in sorted(self._partitions.items())
+            if self._is_closed(self._partition_month(name))
+        )
+        
+        for worksheet in worksheets:
+            key = f"importada:{worksheet.title}"
+            if self.store.get_state(key):
+                continue
+            
+            # Las hojas abiertas se reflejan fila por fila; si el mes se cerró
+            # después, se vuelve a copiar completa desde la exportación CSV
+            with self.events.lock:
+                if self.events.has_subscribers():
+                    self.events.publish_many(
+                        events.ELIMINADO, self.store.get_replicated(worksheet.title), origen=events.ORIGEN_SHEETS
+                    )
+                self.store.clear_replicated(worksheet.title)
+            
+            total = 0
+            records = self._stream_worksheet_records(worksheet)
+            while True:
+                chunk = list(islice(records, IMPORT_CHUNK_ROWS))
+                if not chunk:
+                    break
+                with self.events.lock:
+                    self.store.insert_replicated(chunk)
+                    self.events.publish_many(events.AGREGADO, chunk, origen=events.ORIGEN_SHEETS)
+                total += len(chunk)
+            
+            self.store.set_state(key, datetime.now().isoformat())
+            logger.info(f"Hoja {worksheet.title} importada al almacén local: {total} registros")
+    
+    @staticmethod
+    def _first_updated_row(response):
+        """Fila inicial escrita por append_rows"""
+        updated_range = (response or {}).get('updates', {}).get('updatedRange', '')
+        match = _UPDATED_RANGE_RE.search(updated_range)
+        return int(match.group(1)) if match else None
+    
+    def _push_pending(self):
+        """Replicar en Sheets los registros nuevos y modificados localmente"""
+        for hoja, group in groupby(self.store.pending_inserts(), key=lambda item: item[0].hoja):
+            worksheet = self._get_worksheet(hoja)
+            self._ensure_headers(worksheet)
+            
+            while True:
+                items = list(islice(group, APPEND_CHUNK_ROWS))
+                if not items:
+                    break
+                
+                self.acquire_replication()  # Renovar el permiso en cargas largas
+                try:
+                    response, start = self.scheduler.append_rows(
+                        worksheet, [registro.to_row() for registro, _ in items]
+                    )
+                except Exception:
+                    # Las filas pudieron llegar aunque la respuesta fuera un error:
+                    # antes de reenviarlas se relee la hoja y las que ya están se
+                    # vinculan por su ID Registro
+                    self._revision_checked_at = 0.0
+                    raise
+                
+                # La respuesta puede cubrir filas de otros hilos agrupadas en el mismo lote
+                first_row = self._first_updated_row(response)
+                for offset, (registro, seen) in enumerate(items, start=start):
+                    fila = first_row + offset if first_row else None
+                    self.store.mark_replicated(registro.id, seen, fila=fila)
+                
+                logger.info(f"{len(items)} registros replicados en {hoja}")
+        
+        for hoja, items in groupby(self.store.pending_updates(), key=lambda item: item[0].hoja):
+            items = list(items)
+            worksheet = self._get_worksheet(hoja)
+            self._ensure_headers(worksheet)
+            # Solo las celdas que cambia el bot: si la fila se desplazó después de
+            # conciliar, no se pisa el resto de la fila de otro registro
+            updates = []
+            for registro, _ in items:
+                values = registro.to_dict()
+                updates.extend(
+                    {'range': f"{self._column_letter(column)}{registro.fila}", 'values': [[values[column]]]}
+                    for column in LOCAL_UPDATE_COLUMNS if values[column]
+                )
+            if updates:
+                self.scheduler.update_cells(worksheet, updates)
+            
+            for registro, seen in items:
+                self.store.mark_replicated(registro.id, seen)
+            
+            logger.info(f"{len(items)} registros actualizados en {hoja}")
+    
+    def _reconcile_open_partitions(self):
+        """Reflejar en el almacén local las ediciones manuales del mes en curso"""
+        for name, worksheet in sorted(self._partitions.items()):
+            if self._is_closed(self._partition_month(name)):
+                continue
+            
+            values = self.scheduler.read(
+                ('values', worksheet.spreadsheet.id, worksheet.id), worksheet.get_all_values
+            )
+            if values:
+                self._ensure_headers(worksheet, values[0])
+            with self.events.lock:
+                added, edited, removed, duplicates = self.store.mirror_partition(
+                    name, Registro.from_values(values, hoja=name)
+                )
+                
+                for registro in added:
+                    self.events.publish(events.AGREGADO, registro, origen=events.ORIGEN_SHEETS)
+                for anterior, registro in edited:
+                    self.events.publish(events.EDITADO, registro, anterior=anterior, origen=events.ORIGEN_SHEETS)
+                for registro in removed:
+                    self.events.publish(events.ELIMINADO, registro, origen=events.ORIGEN_SHEETS)
+            
+            if added or edited or removed:
+                logger.info(
+                    f"Cambios desde Google Sheets en {name}: {len(added)} nuevos, "
+                    f"{len(edited)} editados, {len(removed)} eliminados"
+                )
+            if duplicates:
+                self._delete_duplicate_rows(worksheet, duplicates)
+    
+    def _delete_duplicate_rows(self, worksheet, duplicates):
+        """Eliminar de la hoja, en una sola petición, las filas repetidas (mismo ID Registro)"""
+        for registro in duplicates:
+            logger.warning(
+                f"Fila {registro.fila} de {worksheet.title} duplicada (ID Registro {registro.id_registro}, "
+                f"DNI {registro.dni or 'N/A'}): se elimina"
+            )
+        
+        # De abajo hacia arriba, para que cada eliminación no desplace las siguientes
+        rows = sorted({registro.fila for registro in duplicates}, reverse=True)
+        body = {'requests': [
+            {'deleteDimension': {'range': {
+                'sheetId': worksheet.id, 'dimension': 'ROWS', 'startIndex': fila - 1, 'endIndex': fila
+            }}}
+            for fila in rows
+        ]}
+        # Borrar filas no es idempotente: un 5xx no se reintenta, la próxima
+        # conciliación vuelve a encontrar los duplicados que queden
+        self.scheduler.call(lambda: self.spreadsheet.batch_update(body), idempotent=False)
+        self.store.shift_rows(worksheet.title, rows)
+        logger.info(f"{len(rows)} filas duplicadas eliminadas de {worksheet.title}")
+    
+    # ------------------------------------------------------------------
+    # Operaciones de registro
+    # ------------------------------------------------------------------
+    
     def save_client_data(self, client_data):
-        """Guardar datos del cliente en Google Sheets"""
+        """Guardar datos del cliente (localmente; se replica en Google Sheets en segundo plano)"""
         try:
-            # Preparar los datos para insertar
-            row_data = [
-                client_data.get('fecha', ''),
-                client_data.get('hora_ingreso', ''),
-                client_data.get('hora_salida_estimada', ''),
-                client_data.get('habitacion', ''),
-                client_data.get('dni', ''),
-                client_data.get('nombre', ''),
-                client_data.get('nacionalidad', ''),
-                client_data.get('duracion', ''),
-                client_data.get('precio', ''),
-                client_data.get('forma_pago', ''),
-                client_data.get('observaciones', ''),
-                client_data.get('registrado_por', '')
-            ]
+            if not client_data.get('fecha'):
+                client_data = dict(client_data, fecha=date.today().isoformat())
             
-            # Insertar fila al final
-            self.worksheet.append_row(row_data)
+            registro = Registro.from_client_data(client_data)
+            if registro is None:
+                raise ValueError(f"Fecha de registro no válida: {client_data.get('fecha')}")
+            
+            # Cada registro va a la partición del mes de su fecha
+            hoja = self._partition_name(self._to_date(client_data['fecha']))
+            # La clave de la sesión (id_registro) hace idempotente la confirmación
+            with self._photo_lock, self.events.lock:
+                self._apply_pending_photo(registro)
+                _, created = self.store.insert(registro, hoja)
+                if created:
+                    self.events.publish(events.AGREGADO, registro)
+            if not created:
+                logger.info(f"Registro {registro.id_registro} ya guardado, se ignora la confirmación repetida")
+                return True
+            self._wake.set()
             
             logger.info(f"Datos del cliente guardados: DNI {client_data.get('dni', 'N/A')}")
             return True
             
         except Exception as e:
-            logger.error(f"Error al guardar datos en Google Sheets: {str(e)}")
+            logger.error(f"Error al guardar datos del cliente: {str(e)}")
+            return False
+    
+    def _apply_pending_photo(self, registro):
+        """Completar el registro con la foto que terminó de subirse antes de confirmarlo"""
+        if not registro.id_registro:
+            return
+        
+        pending = self.store.pop_state(f"foto:{registro.id_registro}")
+        if pending:
+            registro.foto_url, registro.foto_drive_id = json.loads(pending)[:2]
+    
+    def attach_photo(self, id_registro, foto_url, foto_drive_id):
+        """Vincular al registro de una sesión la foto del DNI ya subida a Drive.
+        
+        La subida termina en segundo plano: si el registro ya se guardó, la
+        fila se actualiza en la siguiente réplica; si aún no se confirmó, el
+        enlace queda guardado (con la hora) y se agrega al confirmarlo. Si el
+        registro se cancela o nunca se confirma, discard_pending_photo y
+        expire_pending_photos lo descartan.
+        """
+        try:
+            with self._photo_lock:
+                if self.store.set_foto(id_registro, foto_url, foto_drive_id):
+                    self._wake.set()
+                    logger.info(f"Foto vinculada al registro {id_registro}")
+                else:
+                    self.store.set_state(f"foto:{id_registro}", json.dumps(
+                        [foto_url, foto_drive_id, datetime.now().isoformat(timespec='seconds')]
+                    ))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error al vincular foto al registro: {str(e)}")
             return False
     
+    def discard_pending_photo(self, id_registro):
+        """Descartar la foto de un registro cancelado; devuelve el ID del archivo en Drive o None"""
+        if not id_registro:
+            return None
+        
+        with self._photo_lock:
+            pending = self.store.pop_state(f"foto:{id_registro}")
+        if not pending:
+            return None
+        
+        foto_drive_id = json.loads(pending)[1]
+        logger.info(f"Foto {foto_drive_id} del registro cancelado {id_registro} descartada")
+        return foto_drive_id
+    
+    def expire_pending_photos(self, max_age_hours=PENDING_PHOTO_HOURS):
+        """Descartar las fotos de registros que no se confirmaron en max_age_hours.
+        
+        Devuelve [(id_registro, foto_drive_id)] de las fotos descartadas.
+        """
+        cutoff = datetime.now() - timedelta(hours=max_age_hours)
+        expired = []
+        with self._photo_lock:
+            for key, value in self.store.get_states('foto:'):
+                pending = json.loads(value)
+                # Los enlaces guardados sin hora (versiones anteriores) ya vencieron
+                saved_at = datetime.fromisoformat(pending[2]) if len(pending) > 2 else datetime.min
+                if saved_at < cutoff:
+                    self.store.pop_state(key)
+                    expired.append((key.partition(':')[2], pending[1]))
+        
+        for id_registro, foto_drive_id in expired:
+            logger.warning(
+                f"Registro {id_registro} sin confirmar desde hace {max_age_hours} h: "
+                f"foto {foto_drive_id} descartada"
+            )
+        return expired
+    
+    def photo_in_use(self, foto_drive_id):
+        """Si un registro (o una sesión aún sin confirmar) usa la foto; la misma foto puede reutilizarse"""
+        if self.store.has_foto(foto_drive_id):
+            return True
+        return any(json.loads(value)[1] == foto_drive_id for _, value in self.store.get_states('foto:'))
+    
+    def save_records(self, registros, checkpoint=None):
+        """Guardar en bloque registros ya validados (importación histórica).
+        
+        Cada registro va a la partición del mes de su fecha; el proceso con el
+        permiso de réplica los envía a Sheets con append_rows por bloques.
+        checkpoint=(clave, valor) se guarda en la misma transacción.
+        """
+        for registro in registros:
+            registro.hoja = self._partition_name(self._to_date(registro.fecha))
+        
+        with self.events.lock:
+            self.store.insert_many(registros, state=checkpoint)
+            self.events.publish_many(events.AGREGADO, registros)
+        self.acquire_replication()  # La importación mantiene el permiso mientras carga
+        self._wake.set()
+    
+    def subscribe(self, callback, tipos=None, replay=False):
+        """Suscribirse a los cambios de registros (utils/events.py).
+        
+        Con replay=True, antes de recibir cambios nuevos el suscriptor recibe
+        todos los registros del almacén local (el reflejo de la hoja) como
+        eventos, para reconstruir su estado al arrancar. En el primer arranque
+        el almacén se llena desde Sheets en segundo plano y esas filas llegan
+        también como eventos AGREGADO.
+        """
+        if replay:
+            return self.events.replay(callback, self.store.iter_range(), tipos)
+        return self.events.subscribe(callback, tipos)
+    
+    def unsubscribe(self, callback):
+        """Cancelar una suscripción a los cambios de registros"""
+        self.events.unsubscribe(callback)
+    
     def get_client_history(self, dni):
         """Obtener historial de un cliente por DNI"""
         try:
-            # Buscar registros del cliente
-            records = self.worksheet.get_all_records()
-            client_records = [record for record in records if record.get('DNI') == dni]
-            
-            return client_records
+            return self.store.find_by_dni(dni)
             
         except Exception as e:
             logger.error(f"Error al obtener historial del cliente: {str(e)}")
             return []
     
+    def get_api_metrics(self):
+        """Métricas del planificador: llamadas, lecturas agrupadas, esperas por cuota y lotes"""
+        return self.scheduler.get_metrics()
+    
+    def get_records_by_date_range(self, start_date, end_date):
+        """Obtener registros entre dos fechas (inclusive)"""
+        try:
+            return self.store.get_range(date_to_day(start_date), date_to_day(end_date))
+            
+        except Exception as e:
+            logger.error(f"Error al obtener registros por rango de fechas: {str(e)}")
+            return []
+    
+    def iter_records(self, start_date=None, end_date=None):
+        """Recorrer registros por bloques, con memoria constante (para reportes largos)"""
+        start = date_to_day(start_date) if start_date else None
+        end = date_to_day(end_date) if end_date else None
+        return self.store.iter_range(start, end)
+    
+    def _is_occupying(self, record, today, now):
+        """Una estancia ocupa la habitación hasta que se registra su salida real"""
+        if record.salida_real is not None:
+            return False
+        # Las estancias de ayer solo siguen activas si su salida estimada no pasó (ej: noche)
+        return record.dia == today or (record.salida_estimada or 0) > now
+    
     def get_room_availability(self):
         """Obtener disponibilidad de habitaciones"""
         try:
-            # Obtener registros de hoy
-            today = datetime.now().strftime('%Y-%m-%d')
-            records = self.worksheet.get_all_records()
-            
-            # Filtrar registros de hoy
-            today_records = [
-                record for record in records 
-                if record.get('Fecha') == today
-            ]
+            # Obtener registros de hoy y de ayer (estancias de noche)
+            today = date_to_day(datetime.now())
+            now = int(time.time())
+            recent_records = self.store.get_range(today - 1, today)
             
-            # Obtener habitaciones ocupadas
-            occupied_rooms = [
-                record.get('Habitación') for record in today_records
-                if record.get('Habitación')
-            ]
+            # Obtener habitaciones ocupadas (las salidas liberan la habitación al instante)
+            occupied_rooms = list(dict.fromkeys(
+                record.habitacion_label for record in recent_records
+                if record.habitacion_label and self._is_occupying(record, today, now)
+            ))
             
             # Calcular habitaciones disponibles
-            all_rooms = set(Config.HABITACIONES)
+            all_rooms = set(self.hotel.rooms)
             available_rooms = all_rooms - set(occupied_rooms)
             
             return {
@@ -149,7 +750,7 @@ class SheetsManager:
         except Exception as e:
             logger.error(f"Error al obtener disponibilidad de habitaciones: {str(e)}")
             return {
-                'available': Config.HABITACIONES,
+                'available': self.hotel.rooms,
                 'occupied': []
             }
     
@@ -159,27 +760,18 @@ class SheetsManager:
             if not date:
                 date = datetime.now().strftime('%Y-%m-%d')
             
-            records = self.worksheet.get_all_records()
-            daily_records = [
-                record for record in records 
-                if record.get('Fecha') == date
-            ]
+            day = date_to_day(date)
+            daily_records = self.store.get_range(day, day)
             
-            # Calcular estadísticas
+            # Calcular estadísticas (el precio ya viene en céntimos)
             total_clients = len(daily_records)
-            total_revenue = 0
-            
-            for record in daily_records:
-                precio_str = record.get('Precio', '0')
-                # Extraer número del precio (ej: S/30 -> 30)
-                precio_num = ''.join(filter(str.isdigit, precio_str))
-                if precio_num:
-                    total_revenue += int(precio_num)
+            total_cents = sum(record.precio_cents for record in daily_records)
             
             return {
                 'date': date,
                 'total_clients': total_clients,
-                'total_revenue': total_revenue,
+                'total_revenue': format_soles(total_cents),
+                'total_revenue_cents': total_cents,
                 'records': daily_records
             }
             
@@ -188,26 +780,60 @@ class SheetsManager:
             return {
                 'date': date or datetime.now().strftime('%Y-%m-%d'),
                 'total_clients': 0,
-                'total_revenue': 0,
+                'total_revenue': '0',
+                'total_revenue_cents': 0,
                 'records': []
             }
     
-    def update_client_checkout(self, dni, checkout_time):
-        """Actualizar hora de salida de un cliente"""
+    def _checkout(self, open_records, checkout_at=None):
+        """Registrar la salida real de la estancia más reciente.
+        
+        La salida es el momento indicado (epoch), por defecto ahora, al minuto:
+        /salida se usa al salir el cliente, aunque sea días después del ingreso.
+        La fila se ubica por el índice (hoja, fila) del almacén local; el
+        replicador escribe la columna 'Hora Salida Real' con batch_update.
+        """
+        if not open_records:
+            return None
+        
+        record = open_records[0]
+        checkout_at = int(time.time() if checkout_at is None else checkout_at)
+        record.salida_real = checkout_at - checkout_at % 60
+        with self.events.lock:
+            self.store.set_salida_real(record.id, record.salida_real)
+            self.events.publish(events.SALIDA, record)
+        self._wake.set()
+        return record
+    
+    def update_client_checkout(self, dni, checkout_at=None):
+        """Registrar la salida de un cliente (checkout_at: epoch, por defecto ahora)"""
         try:
-            # Buscar la fila del cliente
-            records = self.worksheet.get_all_records()
+            # Un cliente activo ingresó hoy o ayer
+            since = date_to_day(date.today() - timedelta(days=1))
+            record = self._checkout(self.store.find_open_by_dni(dni, since), checkout_at)
             
-            for i, record in enumerate(records, start=2):  # Empezar desde fila 2
-                if record.get('DNI') == dni and not record.get('Hora Salida Real'):
-                    # Actualizar hora de salida real
-                    col_index = len(record) + 1  # Nueva columna
-                    self.worksheet.update_cell(i, col_index, checkout_time)
-                    logger.info(f"Hora de salida actualizada para DNI {dni}")
-                    return True
+            if not record:
+                return None
             
-            return False
+            logger.info(f"Hora de salida actualizada para DNI {dni}")
+            return record
+            
+        except Exception as e:
+            logger.error(f"Error al actualizar hora de salida: {str(e)}")
+            return None
+    
+    def update_room_checkout(self, room, checkout_at=None):
+        """Registrar la salida de la estancia activa de una habitación (checkout_at: epoch, por defecto ahora)"""
+        try:
+            since = date_to_day(date.today() - timedelta(days=1))
+            record = self._checkout(self.store.find_open_by_room(room, since), checkout_at)
+            
+            if not record:
+                return None
+            
+            logger.info(f"Hora de salida actualizada para habitación {room}")
+            return record
             
         except Exception as e:
             logger.error(f"Error al actualizar hora de salida: {str(e)}")
-            return False 
\ No newline at end of file
+            return None
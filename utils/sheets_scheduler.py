@@ -0,0 +1,236 @@
+import logging
+import random
+import threading
+import time
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Códigos HTTP que indican cuota agotada o sobrecarga temporal. Un 429 rechaza
+# la petición sin aplicarla; un 500/503 puede llegar después de aplicarla, así
+# que solo se reintenta en llamadas idempotentes
+RETRYABLE_STATUS = (429, 500, 503)
+QUOTA_STATUS = 429
+
+
+class _PendingCall:
+    """Resultado compartido de una llamada en curso"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.items = []
+        self.result = None
+        self.error = None
+
+
+class SheetsScheduler:
+    """Planificador de llamadas a la API de Google Sheets.
+
+    - Lecturas idénticas concurrentes se agrupan en una sola petición (single-flight).
+    - Escrituras cercanas en el tiempo se envían juntas: filas nuevas con
+      append_rows y celdas con batch_update.
+    - Un token bucket limita las peticiones por minuto y los errores 429 se
+      reintentan con backoff exponencial; los 500/503 solo en lecturas y
+      batch_update de rangos fijos (append_rows devuelve el error).
+    """
+
+    def __init__(self, requests_per_minute=None, write_batch_seconds=None, max_retries=5):
+        self.requests_per_minute = requests_per_minute or Config.GOOGLE_SHEETS_REQUESTS_PER_MINUTE
+        self.write_batch_seconds = (
+            Config.GOOGLE_SHEETS_WRITE_BATCH_SECONDS
+            if write_batch_seconds is None else write_batch_seconds
+        )
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._inflight = {}  # clave de lectura -> _PendingCall
+        self._write_batches = {}  # (archivo, hoja, tipo) -> _PendingCall
+
+        # Token bucket: capacidad de un minuto, recarga continua
+        self._capacity = float(self.requests_per_minute)
+        self._tokens = self._capacity
+        self._refill_per_second = self.requests_per_minute / 60.0
+        self._last_refill = time.monotonic()
+
+        self.metrics = {
+            'api_calls': 0,
+            'coalesced_reads': 0,
+            'deferred_calls': 0,
+            'deferred_seconds': 0.0,
+            'retries_429': 0,
+            'batched_writes': 0,
+            'write_batches': 0
+        }
+
+    def _count(self, metric, amount=1):
+        with self._lock:
+            self.metrics[metric] += amount
+
+    def get_metrics(self):
+        """Copia de las métricas acumuladas"""
+        with self._lock:
+            return dict(self.metrics)
+
+    # ------------------------------------------------------------------
+    # Límite de cuota
+    # ------------------------------------------------------------------
+
+    def _acquire(self):
+        """Esperar hasta tener un token disponible"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity,
+                    self._tokens + (now - self._last_refill) * self._refill_per_second
+                )
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if waited:
+                        self.metrics['deferred_calls'] += 1
+                        self.metrics['deferred_seconds'] += waited
+                    return
+
+                wait = (1 - self._tokens) / self._refill_per_second
+
+            time.sleep(wait)
+            waited += wait
+
+    @staticmethod
+    def _status_code(error):
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None)
+
+    def call(self, func, idempotent=True):
+        """Ejecutar una llamada a la API respetando la cuota y reintentando los 429.
+
+        Los 500/503 se reintentan solo si la llamada es idempotente: una que no
+        lo es (append_rows) pudo aplicarse aunque la respuesta fuera un error.
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            self._count('api_calls')
+            try:
+                return func()
+            except Exception as e:
+                # APIError de gspread o HTTPError de requests (exportación CSV)
+                status = self._status_code(e)
+                retryable = status == QUOTA_STATUS or (idempotent and status in RETRYABLE_STATUS)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                delay = min(2 ** attempt, 32) + random.uniform(0, 1)
+                if status == 429:
+                    self._count('retries_429')
+                logger.warning(
+                    f"Google Sheets respondió {status}, reintentando en {delay:.1f}s "
+                    f"(intento {attempt + 1}/{self.max_retries})"
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    # ------------------------------------------------------------------
+    # Lecturas agrupadas
+    # ------------------------------------------------------------------
+
+    def read(self, key, func):
+        """Ejecutar una lectura; las lecturas concurrentes con la misma clave comparten el resultado"""
+        with self._lock:
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = _PendingCall()
+                self._inflight[key] = pending
+            else:
+                self.metrics['coalesced_reads'] += 1
+
+        if not leader:
+            pending.event.wait()
+            if pending.error:
+                raise pending.error
+            return pending.result
+
+        try:
+            pending.result = self.call(func)
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.event.set()
+
+    # ------------------------------------------------------------------
+    # Escrituras en lote
+    # ------------------------------------------------------------------
+
+    def _submit_write(self, worksheet, kind, items, flush, idempotent=True):
+        """Encolar escrituras; el primer hilo espera la ventana y envía el lote completo.
+
+        Devuelve la respuesta del lote y la posición de los items de quien llama
+        dentro de él. El planificador se comparte entre propiedades y los ids de
+        hoja (gid) solo son únicos dentro de un archivo, así que la clave incluye
+        el id del archivo.
+        """
+        key = (worksheet.spreadsheet.id, worksheet.id, kind)
+
+        with self._lock:
+            batch = self._write_batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = _PendingCall()
+                self._write_batches[key] = batch
+            start = len(batch.items)
+            batch.items.extend(items)
+
+        if leader:
+            if self.write_batch_seconds:
+                time.sleep(self.write_batch_seconds)
+
+            with self._lock:
+                self._write_batches.pop(key, None)
+
+            try:
+                batch.result = self.call(lambda: flush(batch.items), idempotent=idempotent)
+                with self._lock:
+                    self.metrics['write_batches'] += 1
+                    self.metrics['batched_writes'] += len(batch.items)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.event.set()
+        else:
+            batch.event.wait()
+
+        if batch.error:
+            raise batch.error
+        return batch.result, start
+
+    def append_rows(self, worksheet, rows):
+        """Agregar filas al final de la hoja, agrupadas con otras escrituras cercanas.
+
+        Devuelve (respuesta, desplazamiento): la respuesta describe el append
+        combinado y las filas de quien llama empiezan desplazamiento filas
+        después de la primera fila escrita.
+
+        Un 500/503 no se reintenta (las filas pudieron agregarse): el error se
+        devuelve para que quien llama compruebe la hoja antes de reenviarlas.
+        """
+        return self._submit_write(
+            worksheet, 'append', rows,
+            lambda items: worksheet.append_rows(items, value_input_option='RAW'),
+            idempotent=False
+        )
+
+    def update_cells(self, worksheet, updates):
+        """Actualizar rangos ({'range': 'A1', 'values': [[...]]}) con un solo batch_update"""
+        result, _ = self._submit_write(
+            worksheet, 'update', updates,
+            lambda items: worksheet.batch_update(items, value_input_option='RAW')
+        )
+        return result
@@ -0,0 +1,337 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PhotoUploadQueue:
+    """Cola de subida de fotos de DNI a Google Drive, con respaldo en disco.
+
+    submit() guarda la foto y sus datos en el directorio de cola y devuelve de
+    inmediato; un hilo en segundo plano la sube con DriveManager y entrega el
+    resultado a on_uploaded(id_registro, enlace, file_id), que la vincula a la
+    fila del registro. La foto se borra del disco solo cuando quedó vinculada:
+    si el bot se detiene antes, recover() la vuelve a encolar al arrancar.
+
+    Si la subida falla por un error pasajero (sin conexión, 429, 5xx), el hilo
+    de reintentos la vuelve a encolar con espera exponencial
+    (DRIVE_RETRY_BASE_SECONDS hasta DRIVE_RETRY_MAX_SECONDS). En cuanto una
+    subida vuelve a funcionar, las fotos en espera se reintentan de inmediato.
+    Si Drive la rechaza por otro motivo, o tras DRIVE_RETRY_MAX_ATTEMPTS
+    intentos, la foto se aparta en failed/ (failed_jobs() la informa una vez).
+    """
+
+    def __init__(self, drive_manager, spool_dir, on_uploaded=None, workers=None):
+        self.drive_manager = drive_manager
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.failed_dir = self.spool_dir / 'failed'
+        self.on_uploaded = on_uploaded
+        # DriveManager usa una conexión por hilo: las fotos se suben en paralelo
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.DRIVE_UPLOAD_WORKERS,
+            thread_name_prefix=f'drive-upload-{drive_manager.hotel.key}'
+        )
+        self._lock = threading.Lock()
+        self._queued = set()  # Trabajos encolados o en curso
+
+        # Reintentos programados (job_id -> momento, en time.time()) y su hilo
+        self._retry_at = {}
+        self._offline = False
+        self._retry_wakeup = threading.Condition(self._lock)
+        self._stopped = False
+        self._replay_thread = threading.Thread(
+            target=self._replay_loop, name=f'drive-replay-{drive_manager.hotel.key}', daemon=True
+        )
+        self._replay_thread.start()
+
+    # ------------------------------------------------------------------
+    # Directorio de cola
+    # ------------------------------------------------------------------
+
+    def _image_path(self, job_id):
+        return self.spool_dir / f"{job_id}.jpg"
+
+    def _meta_path(self, job_id):
+        return self.spool_dir / f"{job_id}.json"
+
+    @staticmethod
+    def _write_file(path, data):
+        """Escribir de forma atómica: un corte nunca deja un archivo a medias"""
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _write_meta(self, job_id, meta):
+        self._write_file(self._meta_path(job_id), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def _remove(self, job_id):
+        for path in (self._image_path(job_id), self._meta_path(job_id)):
+            path.unlink(missing_ok=True)
+
+    def _fail(self, job_id, meta, reason):
+        """Apartar una foto que no se pudo subir en failed/, con el motivo, para revisarla a mano"""
+        try:
+            if meta is None:
+                meta = json.loads(self._meta_path(job_id).read_text(encoding='utf-8'))
+            meta['error'] = reason
+            meta['failed'] = time.time()
+            # Si se devuelve a la cola a mano, vuelve a empezar y se informa otra vez
+            meta['attempts'] = 0
+            meta['reported'] = False
+            self.failed_dir.mkdir(exist_ok=True)
+            image_path = self._image_path(job_id)
+            if image_path.exists():
+                os.replace(image_path, self.failed_dir / image_path.name)
+            self._write_file(
+                self.failed_dir / self._meta_path(job_id).name,
+                json.dumps(meta, ensure_ascii=False).encode('utf-8')
+            )
+            self._meta_path(job_id).unlink(missing_ok=True)
+            logger.error(f"Foto {job_id} apartada en {self.failed_dir}: {reason}")
+        except Exception as e:
+            logger.error(f"Error al apartar foto {job_id}: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Encolar
+    # ------------------------------------------------------------------
+
+    def submit(self, image_bytes, dni, client_name=None, id_registro=None):
+        """Guardar la foto en la cola y subirla en segundo plano; devuelve el ID del trabajo"""
+        job_id = f"{id_registro or 'foto'}-{uuid.uuid4().hex[:8]}"
+
+        # La foto primero y los datos después: el .json marca el trabajo como completo
+        self._write_file(self._image_path(job_id), bytes(image_bytes))
+        self._write_meta(job_id, {
+            'dni': dni,
+            'client_name': client_name,
+            'id_registro': id_registro,
+            'created': time.time(),
+        })
+
+        self._enqueue(job_id)
+        return job_id
+
+    def recover(self):
+        """Volver a encolar las fotos que quedaron en disco (bot detenido o subida fallida)"""
+        recovered = 0
+        for meta_path in sorted(self.spool_dir.glob('*.json')):
+            self._enqueue(meta_path.stem)
+            recovered += 1
+
+        # Fotos sin .json: el bot se detuvo mientras se encolaban
+        for image_path in self.spool_dir.glob('*.jpg'):
+            if not self._meta_path(image_path.stem).exists():
+                image_path.unlink(missing_ok=True)
+
+        if recovered:
+            logger.info(f"{recovered} fotos pendientes de subir a Google Drive encoladas")
+        return recovered
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        self._executor.submit(self._process, job_id)
+
+    # ------------------------------------------------------------------
+    # Subida
+    # ------------------------------------------------------------------
+
+    def _process(self, job_id):
+        retry_at = None
+        offline = False  # Solo si Drive no aceptó la subida, no si falló el vínculo
+        try:
+            meta = json.loads(self._meta_path(job_id).read_text(encoding='utf-8'))
+
+            # Un reintento después de subir no vuelve a subir: solo vincula
+            result = meta.get('result')
+            if result is None:
+                image_bytes = self._image_path(job_id).read_bytes()
+                try:
+                    result = self.drive_manager.upload_dni_photo(
+                        image_bytes, meta.get('dni') or 'unknown', meta.get('client_name'),
+                        raise_errors=True
+                    )
+                except Exception as e:
+                    # Solo los errores pasajeros se reintentan; un rechazo de
+                    # Drive (permisos, carpeta, imagen inválida) no se resuelve solo
+                    if not self.drive_manager.is_transient_error(e):
+                        self._fail(job_id, meta, f"Drive rechazó la foto: {str(e)}")
+                        return
+                    offline = True
+                    retry_at = self._schedule_retry(job_id, meta, "no subida")
+                    return
+                meta['result'] = result
+                self._write_meta(job_id, meta)
+                if not result.get('reused'):
+                    self._back_online()
+
+            if self.on_uploaded and meta.get('id_registro'):
+                linked = self.on_uploaded(meta['id_registro'], result['web_view_link'], result['file_id'])
+                if linked is False:
+                    retry_at = self._schedule_retry(job_id, meta, "subida pero no vinculada")
+                    return
+
+            self._remove(job_id)
+
+        except Exception as e:
+            logger.error(f"Error al procesar foto en cola {job_id}: {str(e)}")
+            if self._meta_path(job_id).exists():
+                retry_at = self._schedule_retry(job_id, None, "con error")
+        finally:
+            with self._retry_wakeup:
+                self._queued.discard(job_id)
+                # Recién ahora: un reintento inmediato no debe encontrarla todavía en curso
+                if retry_at is not None:
+                    if offline:
+                        self._offline = True
+                    self._retry_at[job_id] = retry_at
+                    self._retry_wakeup.notify()
+
+    # ------------------------------------------------------------------
+    # Reintentos
+    # ------------------------------------------------------------------
+
+    def _schedule_retry(self, job_id, meta, reason):
+        """Anotar en disco el próximo intento, con espera exponencial (y variación aleatoria).
+
+        Devuelve el momento del reintento, o None si se agotaron los intentos
+        (DRIVE_RETRY_MAX_ATTEMPTS) y la foto se apartó en failed/.
+        """
+        try:
+            if meta is None:
+                meta = json.loads(self._meta_path(job_id).read_text(encoding='utf-8'))
+            meta['attempts'] = meta.get('attempts', 0) + 1
+            if meta['attempts'] >= Config.DRIVE_RETRY_MAX_ATTEMPTS:
+                self._fail(job_id, meta, f"{reason} después de {meta['attempts']} intentos")
+                return None
+            delay = min(
+                Config.DRIVE_RETRY_MAX_SECONDS,
+                Config.DRIVE_RETRY_BASE_SECONDS * 2 ** (meta['attempts'] - 1)
+            ) * random.uniform(0.8, 1.2)
+            meta['next_retry'] = time.time() + delay
+            self._write_meta(job_id, meta)
+        except Exception as e:
+            logger.error(f"Error al programar reintento de foto {job_id}: {str(e)}")
+            delay = Config.DRIVE_RETRY_MAX_SECONDS
+            meta = {'next_retry': time.time() + delay, 'attempts': 0}
+
+        logger.warning(
+            f"Foto {job_id} {reason} (intento {meta.get('attempts')}), "
+            f"se reintenta en {delay:.0f} s"
+        )
+        return meta['next_retry']
+
+    def _back_online(self):
+        """Una subida funcionó: reintentar ya las fotos que esperaban"""
+        with self._retry_wakeup:
+            if not self._offline:
+                return
+            self._offline = False
+            if self._retry_at:
+                logger.info(f"Google Drive disponible de nuevo, reintentando {len(self._retry_at)} fotos")
+                now = time.time()
+                for job_id in self._retry_at:
+                    self._retry_at[job_id] = now
+                self._retry_wakeup.notify()
+
+    def _replay_loop(self):
+        """Hilo de reintentos: encolar cada foto cuando llega su momento"""
+        while True:
+            with self._retry_wakeup:
+                while not self._stopped:
+                    now = time.time()
+                    due = [job_id for job_id, at in self._retry_at.items() if at <= now]
+                    if due:
+                        break
+                    timeout = min(self._retry_at.values()) - now if self._retry_at else None
+                    self._retry_wakeup.wait(timeout)
+                if self._stopped:
+                    return
+                for job_id in due:
+                    del self._retry_at[job_id]
+
+            for job_id in due:
+                self._enqueue(job_id)
+
+    def failed_jobs(self, unreported=False):
+        """Datos de las fotos apartadas en failed/ (solo las aún no informadas con unreported=True)"""
+        jobs = []
+        for meta_path in sorted(self.failed_dir.glob('*.json')):
+            try:
+                meta = json.loads(meta_path.read_text(encoding='utf-8'))
+            except Exception as e:
+                logger.error(f"Error al leer foto apartada {meta_path.name}: {str(e)}")
+                continue
+            if unreported and meta.get('reported'):
+                continue
+            meta['job_id'] = meta_path.stem
+            jobs.append(meta)
+        return jobs
+
+    def mark_reported(self, job_ids):
+        """Anotar que ya se avisó de estas fotos apartadas"""
+        for job_id in job_ids:
+            meta_path = self.failed_dir / f"{job_id}.json"
+            try:
+                meta = json.loads(meta_path.read_text(encoding='utf-8'))
+                meta['reported'] = True
+                self._write_file(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            except Exception as e:
+                logger.error(f"Error al marcar foto apartada {job_id}: {str(e)}")
+
+    def retrying_count(self):
+        """Fotos que esperan un reintento"""
+        with self._lock:
+            return len(self._retry_at)
+
+    def is_offline(self):
+        """Si la última subida a Drive falló (y ninguna funcionó desde entonces)"""
+        with self._lock:
+            return self._offline
+
+    def next_retry_in(self):
+        """Segundos hasta el próximo reintento, o None si no hay ninguno programado"""
+        with self._lock:
+            if not self._retry_at:
+                return None
+            return max(0.0, min(self._retry_at.values()) - time.time())
+
+    def run_task(self, fn, *args, **kwargs):
+        """Ejecutar otra tarea de Drive en los hilos de la cola, fuera del hilo del bot"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def pending_count(self):
+        """Fotos en disco que aún no se subieron o vincularon"""
+        return sum(1 for _ in self.spool_dir.glob('*.json'))
+
+    def wait(self, timeout=None):
+        """Esperar a que terminen los trabajos encolados; devuelve True si terminaron"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._queued:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def stop(self):
+        """Detener la cola; lo pendiente queda en disco para el próximo arranque"""
+        with self._retry_wakeup:
+            self._stopped = True
+            self._retry_wakeup.notify()
+        self._executor.shutdown(wait=False)